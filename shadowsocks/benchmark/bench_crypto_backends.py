@@ -0,0 +1,58 @@
+'''Throughput of the crypto backends.
+
+Encrypts and decrypts full-size chunks with every backend available for
+every supported cipher and reports MB/s.
+
+Usage: python -m benchmark.bench_crypto_backends [megabytes]
+'''
+
+import sys
+import time
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.cipher.AEAD.backend import available_backends
+
+
+def bench(cipher_name: str, backend: str, total_size: int):
+    cipher_parameters = supported_cipher_parameters[cipher_name].with_backend(backend)
+    salt = b's' * cipher_parameters.salt_size
+
+    encrypt_cipher = cipher_parameters.cipher(cipher_parameters)
+    encrypt_cipher.init_key('password', salt)
+    decrypt_cipher = cipher_parameters.cipher(cipher_parameters)
+    decrypt_cipher.init_key('password', salt)
+
+    data = b'x' * total_size
+    output = memoryview(bytearray(encrypt_cipher.encrypted_size(total_size)))
+
+    start_time = time.perf_counter()
+    n_encrypted = encrypt_cipher.encrypt_into(data, output)
+    encrypt_time = time.perf_counter() - start_time
+
+    header_size = 2 + cipher_parameters.tag_size
+    start_time = time.perf_counter()
+    offset = 0
+    while offset < n_encrypted:
+        chunk_size = decrypt_cipher.decrypt_chunk_size(output[offset: offset + header_size])
+        decrypt_cipher.increase_nonce()
+        offset += header_size
+        payload_size = chunk_size + cipher_parameters.tag_size
+        decrypt_cipher.decrypt_chunk_payload(output[offset: offset + payload_size])
+        offset += payload_size
+    decrypt_time = time.perf_counter() - start_time
+
+    return total_size / encrypt_time / 1e6, total_size / decrypt_time / 1e6
+
+
+def main():
+    total_size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 64 * 1024 * 1024
+
+    print(f'{"cipher":<30}{"backend":<16}{"encrypt MB/s":>14}{"decrypt MB/s":>14}')
+    for cipher_name, cipher_parameters in supported_cipher_parameters.items():
+        for backend in available_backends(cipher_parameters.cipher.algorithm, cipher_parameters):
+            encrypt_speed, decrypt_speed = bench(cipher_name, backend.name, total_size)
+            print(f'{cipher_name:<30}{backend.name:<16}{encrypt_speed:>14.1f}{decrypt_speed:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+'''End-to-end benchmark of `Connection` and `SSL_Connection`.
+
+Runs an in-process Shadowsocks server, the threaded `LoopbackRelayServer` or
+the package's asyncio `Server` with `--server package`, and an echo target
+(plain TCP, and TLS with a throwaway self-signed certificate for
+`SSL_Connection`), then for
+every entry of `supported_cipher_parameters` measures:
+
+* bulk echo throughput and client CPU seconds per GB,
+* round-trip latency percentiles of small messages,
+* connection setup rate, up to the first echoed byte.
+
+The client is single threaded, so its CPU time is measured with
+`time.thread_time` and excludes the stand-in servers. Results are printed, and
+written as JSON with `--output` so runs of different versions can be compared
+with `--baseline`. `--trace N` traces 1 in N connections and prints the
+per-stage latency breakdown. `--session-cache` resumes TLS sessions of
+`SSL_Connection` from a `TLS_SessionCache`, which mostly shows in the setup
+rate.
+
+Usage: python -m benchmark.bench_e2e [--megabytes N] [--messages N] [--setups N] [--server loopback|package]
+                                     [--ciphers NAME ...] [--session-cache] [--output FILE] [--baseline FILE]
+'''
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from typing import Any, Callable, Dict, List, Optional
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.cipher.AEAD.backend import select_backend
+from shadowsocks.connection.Connection import Connection
+from shadowsocks.connection.SSL_Connection import SSL_Connection
+from shadowsocks.connection.TLS_SessionCache import TLS_SessionCache
+from shadowsocks.server import Server
+from shadowsocks.utils.Tracing import Tracer, TraceReporter, set_tracer
+
+from test.loopback import EchoServer, LoopbackRelayServer, TLS_HOSTNAME, create_tls_contexts
+
+PASSWORD = 'password'
+# Bulk data is echoed in blocks, which stay below the socket buffers of the path.
+BLOCK_SIZE = 64 * 1024
+SMALL_MESSAGE = b'x' * 64
+
+
+class PackageServer:
+    '''The package's asyncio `Server` running on an event loop in a daemon thread.'''
+
+    def __init__(self, password: str, cipher_name: str):
+        self.addr = '127.0.0.1'
+        self.server = Server(password, cipher_name, self.addr, 0)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self._loop).result()
+        self.port = self.server.listen_port
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self.server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class Client:
+    '''Uniform blocking send/recv over `Connection` and `SSL_Connection`.'''
+
+    def __init__(self,
+                 relay_server: Any,
+                 echo_server: EchoServer,
+                 cipher_name: str,
+                 ssl_context: Optional[ssl.SSLContext],
+                 session_cache: Optional[TLS_SessionCache] = None):
+
+        self.connection = Connection(relay_server.addr, relay_server.port, PASSWORD, cipher_name,
+                                     echo_server.addr, echo_server.port)
+        self.tls: Optional[SSL_Connection] = None
+        if ssl_context is not None:
+            self.tls = SSL_Connection(self.connection, TLS_HOSTNAME, ssl_context, session_cache)
+        else:
+            self.connection.settimeout(None)
+
+    def send(self, data: bytes):
+        (self.tls or self.connection).send(data)
+
+    def recv_exactly(self, length: int):
+        received = 0
+        while received < length:
+            data = (self.tls or self.connection).recv(length - received)
+            if not data: raise ConnectionError('Connection closed by the server.')
+            received += len(data)
+
+    def close(self):
+        self.connection.close()
+
+
+def bench_bulk(new_client: Callable[[], Client], total_size: int) -> Dict[str, float]:
+    client = new_client()
+    block = b'x' * BLOCK_SIZE
+    n_blocks = max(1, total_size // BLOCK_SIZE)
+
+    start_time, start_cpu = time.perf_counter(), time.thread_time()
+    for _ in range(n_blocks):
+        client.send(block)
+        client.recv_exactly(BLOCK_SIZE)
+    elapsed, cpu = time.perf_counter() - start_time, time.thread_time() - start_cpu
+    client.close()
+
+    # Every byte is encrypted once and decrypted once by the client.
+    n_bytes = n_blocks * BLOCK_SIZE
+    return {
+        'throughput_MBps': n_bytes / elapsed / 1e6,
+        'cpu_seconds_per_GB': cpu / (n_bytes / 1e9),
+    }
+
+
+def bench_latency(new_client: Callable[[], Client], n_messages: int) -> Dict[str, float]:
+    client = new_client()
+    latencies = []
+    for _ in range(n_messages):
+        start_time = time.perf_counter()
+        client.send(SMALL_MESSAGE)
+        client.recv_exactly(len(SMALL_MESSAGE))
+        latencies.append((time.perf_counter() - start_time) * 1e6)
+    client.close()
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        'p50': percentiles[49],
+        'p90': percentiles[89],
+        'p99': percentiles[98],
+        'max': max(latencies),
+    }
+
+
+def bench_setup(new_client: Callable[[], Client], n_setups: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(n_setups):
+        client = new_client()
+        client.send(b'x')
+        client.recv_exactly(1)
+        client.close()
+    return n_setups / (time.perf_counter() - start_time)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        tls_contexts = create_tls_contexts(directory)
+        if tls_contexts is None:
+            print('cryptography is not installed, skipping SSL_Connection', file=sys.stderr)
+
+        echo_servers = {'Connection': (EchoServer(), None)}
+        if tls_contexts is not None:
+            server_context, client_context = tls_contexts
+            echo_servers['SSL_Connection'] = (EchoServer(server_context), client_context)
+
+        session_cache = TLS_SessionCache() if options.session_cache else None
+
+        for cipher_name in options.ciphers:
+            cipher_parameters = supported_cipher_parameters[cipher_name]
+            relay_server = (PackageServer if options.server == 'package' else LoopbackRelayServer)(PASSWORD, cipher_name)
+
+            for connection_type, (echo_server, client_context) in echo_servers.items():
+                def new_client() -> Client:
+                    return Client(relay_server, echo_server, cipher_name, client_context, session_cache)
+
+                # Warm up caches and connections before measuring.
+                bench_bulk(new_client, BLOCK_SIZE * 16)
+
+                result = {
+                    'connection': connection_type,
+                    'cipher': cipher_name,
+                    'backend': select_backend(cipher_parameters.cipher.algorithm, cipher_parameters).name,
+                    **bench_bulk(new_client, options.megabytes * 1024 * 1024),
+                    'latency_us': bench_latency(new_client, options.messages),
+                    'setups_per_second': bench_setup(new_client, options.setups),
+                }
+                results.append(result)
+                print(f'{connection_type:<16}{cipher_name:<30}'
+                      f'{result["throughput_MBps"]:>10.1f} MB/s'
+                      f'{result["cpu_seconds_per_GB"]:>10.2f} CPU s/GB'
+                      f'{result["latency_us"]["p50"]:>10.0f} us p50'
+                      f'{result["latency_us"]["p99"]:>10.0f} us p99'
+                      f'{result["setups_per_second"]:>10.0f} setups/s', flush=True)
+
+            relay_server.close()
+
+        for echo_server, _ in echo_servers.values(): echo_server.close()
+
+    return {
+        'benchmark': 'e2e',
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            'server': options.server,
+            'megabytes': options.megabytes,
+            'messages': options.messages,
+            'setups': options.setups,
+            'session_cache': options.session_cache,
+            'block_size': BLOCK_SIZE,
+            'message_size': len(SMALL_MESSAGE),
+        },
+        'results': results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]):
+    '''Print the ratio of every throughput and setup rate against `baseline`, above 1 is faster.'''
+    baseline_results = {(result['connection'], result['cipher']): result for result in baseline['results']}
+    for result in report['results']:
+        base = baseline_results.get((result['connection'], result['cipher']))
+        if base is None: continue
+        print(f'{result["connection"]:<16}{result["cipher"]:<30}'
+              f'{result["throughput_MBps"] / base["throughput_MBps"]:>8.2f}x throughput'
+              f'{base["latency_us"]["p50"] / result["latency_us"]["p50"]:>8.2f}x p50 latency'
+              f'{result["setups_per_second"] / base["setups_per_second"]:>8.2f}x setup rate')
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmark.bench_e2e',
+                                     description='End-to-end benchmark against a loopback Shadowsocks server.')
+    parser.add_argument('--megabytes', type=int, default=64, help='Bulk echo size per run (default: 64)')
+    parser.add_argument('--messages', type=int, default=2000, help='Round trips for latency (default: 2000)')
+    parser.add_argument('--setups', type=int, default=200, help='Connections for setup rate (default: 200)')
+    parser.add_argument('--ciphers', nargs='+', default=list(supported_cipher_parameters.keys()),
+                        choices=list(supported_cipher_parameters.keys()))
+    parser.add_argument('--server', choices=['loopback', 'package'], default='loopback',
+                        help='Shadowsocks server to measure against (default: loopback)')
+    parser.add_argument('--trace', type=int, metavar='N', help='Trace 1 in N connections and print a stage breakdown')
+    parser.add_argument('--session-cache', action='store_true', help='Resume TLS sessions of SSL_Connection')
+    parser.add_argument('--output', help='Write the JSON report to this file, - for stdout')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare with')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(args)
+    reporter = TraceReporter()
+    if options.trace:
+        set_tracer(Tracer(reporter, sample_rate=options.trace))
+
+    report = run(options)
+    if options.trace:
+        set_tracer(None)
+        report['trace'] = reporter.report()
+        print(reporter.format())
+
+    if options.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
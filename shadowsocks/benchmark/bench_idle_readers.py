@@ -0,0 +1,72 @@
+'''CPU usage of idle blocked readers.
+
+Opens N connections to a stand-in server that completes the handshake and
+then stays silent, and blocks one thread per connection in `Connection.recv`
+with a timeout. Reports process CPU time against wall time.
+
+Usage: python -m benchmark.bench_idle_readers [n_readers] [wait_seconds]
+'''
+
+import socket
+import sys
+import threading
+import time
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.connection.Connection import Connection
+
+CIPHER_NAME = 'AEAD_AES_128_GCM'
+
+
+def silent_server(listener: socket.socket, clients: list):
+    salt = b'\x00' * supported_cipher_parameters[CIPHER_NAME].salt_size
+    while True:
+        try:
+            client, _ = listener.accept()
+        except OSError:
+            return
+        client.sendall(salt)
+        clients.append(client)
+
+
+def blocked_reader(connection: Connection, wait_seconds: float):
+    connection.settimeout(wait_seconds)
+    try:
+        connection.recv(1024)
+    except socket.timeout:
+        pass
+
+
+def main():
+    n_readers = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    wait_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    listener = socket.create_server(('127.0.0.1', 0), backlog=n_readers)
+    clients = []
+    threading.Thread(target=silent_server, args=(listener, clients), daemon=True).start()
+
+    addr, port = listener.getsockname()
+    connections = [Connection(addr, port, 'password', CIPHER_NAME, 'example.com', 80)
+                   for _ in range(n_readers)]
+
+    threads = [threading.Thread(target=blocked_reader, args=(connection, wait_seconds))
+               for connection in connections]
+
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    wall_time = time.perf_counter() - start_wall_time
+    cpu_time = time.process_time() - start_cpu_time
+
+    print(f'readers:   {n_readers}')
+    print(f'wall time: {wall_time:.3f} s')
+    print(f'cpu time:  {cpu_time:.3f} s')
+    print(f'cpu usage: {cpu_time / wall_time * 100:.1f} %')
+
+    for connection in connections: connection.close()
+    listener.close()
+
+
+if __name__ == '__main__':
+    main()
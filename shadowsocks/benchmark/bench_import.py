@@ -0,0 +1,115 @@
+'''Import time of the package entry points.
+
+Imports every module in a fresh interpreter with `python -X importtime`, keeps
+the best of `--repeat` runs, and prints the cumulative import time with the
+slowest imports it pulled in. Also checks that no crypto library is loaded
+before a cipher is used. `--max-ms` fails the run if a module is slower, so it
+can guard startup time in CI; `--output` and `--baseline` compare runs as in
+`bench_e2e`.
+
+Usage: python -m benchmark.bench_import [--repeat N] [--top N] [--max-ms MS]
+                                        [--output FILE] [--baseline FILE] [module ...]
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from typing import Any, Dict, List, Tuple
+
+DEFAULT_MODULES = [
+    'shadowsocks.cipher.CipherParamerters',
+    'shadowsocks.connection.Connection',
+    'shadowsocks.connection.SSL_Connection',
+    'shadowsocks.local',
+    'shadowsocks.server',
+]
+# Loaded by the first cipher, never by importing the package.
+LAZY_MODULES = ('Crypto', 'cryptography')
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module: str) -> Tuple[Dict[str, int], List[str]]:
+    '''Import `module` in a new interpreter.
+
+    Returns:
+        ({imported module: cumulative microseconds}, eagerly loaded `LAZY_MODULES`)
+    '''
+    check = (f'import sys, {module}, json; '
+             f'print(json.dumps(sorted({{name.split(".")[0] for name in sys.modules}} & {set(LAZY_MODULES)!r})))')
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', check],
+                             capture_output=True, text=True, check=True, cwd=PACKAGE_ROOT)
+
+    times: Dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times, json.loads(process.stdout)
+
+
+def bench_module(module: str, repeat: int, top: int) -> Dict[str, Any]:
+    runs = [import_times(module) for _ in range(repeat)]
+    times, eager_modules = min(runs, key=lambda run: run[0][module])
+    slowest = sorted((name for name in times if name != module), key=lambda name: -times[name])
+    return {
+        'module': module,
+        'import_ms': times[module] / 1e3,
+        'slowest': {name: times[name] / 1e3 for name in slowest[:top]},
+        'eager_crypto_modules': eager_modules,
+    }
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmark.bench_import',
+                                     description='Import time of the package entry points.')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='Modules to import (default: entry points)')
+    parser.add_argument('--repeat', type=int, default=5, help='Imports per module, the fastest is kept (default: 5)')
+    parser.add_argument('--top', type=int, default=5, help='Slowest nested imports listed per module (default: 5)')
+    parser.add_argument('--max-ms', type=float, help='Exit with an error if a module takes longer to import')
+    parser.add_argument('--output', help='Write the JSON report to this file, - for stdout')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare with')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(args)
+
+    results = []
+    for module in options.modules:
+        result = bench_module(module, options.repeat, options.top)
+        results.append(result)
+        print(f'{module:<42}{result["import_ms"]:>10.1f} ms'
+              + (f'  eagerly loads {", ".join(result["eager_crypto_modules"])}' if result['eager_crypto_modules'] else ''))
+        for name, import_ms in result['slowest'].items():
+            print(f'    {name:<38}{import_ms:>10.1f} ms')
+
+    report = {'benchmark': 'import', 'python': sys.version.split()[0], 'results': results}
+    if options.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = {result['module']: result for result in json.load(f)['results']}
+        for result in results:
+            base = baseline.get(result['module'])
+            if base is None: continue
+            print(f'{result["module"]:<42}{base["import_ms"] / result["import_ms"]:>8.2f}x faster')
+
+    too_slow = [result['module'] for result in results
+                if options.max_ms is not None and result['import_ms'] > options.max_ms]
+    eager = [result['module'] for result in results if result['eager_crypto_modules']]
+    if too_slow: print(f'Slower than {options.max_ms} ms: {", ".join(too_slow)}', file=sys.stderr)
+    if eager: print(f'Crypto libraries imported eagerly by: {", ".join(eager)}', file=sys.stderr)
+    if too_slow or eager: sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''Session key derivation and connection setup rate.
+
+Measures `AEAD_CipherBase.init_key` per second with a cold and a warm master
+key cache, and complete `Connection` setups per second against a loopback
+server.
+
+Usage: python -m benchmark.bench_key_derivation [n_iterations]
+'''
+
+import os
+import sys
+import time
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.cipher.AEAD.AEAD_CipherBase import master_key
+from shadowsocks.connection.Connection import Connection
+
+from test.loopback import LoopbackEchoServer
+
+
+def bench_init_key(cipher_name: str, n_iterations: int, warm_cache: bool) -> float:
+    cipher_parameters = supported_cipher_parameters[cipher_name]
+    cipher = cipher_parameters.cipher(cipher_parameters)
+    salts = [os.urandom(cipher_parameters.salt_size) for _ in range(n_iterations)]
+
+    master_key.cache_clear()
+    start_time = time.perf_counter()
+    for salt in salts:
+        if not warm_cache: master_key.cache_clear()
+        cipher.init_key('password', salt)
+    return n_iterations / (time.perf_counter() - start_time)
+
+
+def bench_connection_setup(cipher_name: str, n_iterations: int) -> float:
+    server = LoopbackEchoServer('password', cipher_name)
+
+    start_time = time.perf_counter()
+    for _ in range(n_iterations):
+        Connection(server.addr, server.port, 'password', cipher_name, 'example.com', 80).close()
+    setups_per_second = n_iterations / (time.perf_counter() - start_time)
+
+    server.close()
+    return setups_per_second
+
+
+def main():
+    n_iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print(f'{"cipher":<30}{"init_key cold /s":>18}{"init_key warm /s":>18}{"setups /s":>12}')
+    for cipher_name in supported_cipher_parameters:
+        cold = bench_init_key(cipher_name, n_iterations, warm_cache=False)
+        warm = bench_init_key(cipher_name, n_iterations, warm_cache=True)
+        setups = bench_connection_setup(cipher_name, n_iterations // 4)
+        print(f'{cipher_name:<30}{cold:>18.0f}{warm:>18.0f}{setups:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
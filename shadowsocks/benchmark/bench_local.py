@@ -0,0 +1,96 @@
+'''Throughput and latency of the local SOCKS5 server.
+
+Runs `LocalServer` against a loopback stand-in Shadowsocks echo server and
+drives it with concurrent SOCKS5 clients: bulk echo throughput, round-trip
+latency of small messages, and memory per idle client.
+
+Usage: python -m benchmark.bench_local [n_clients] [megabytes_per_client]
+'''
+
+import asyncio
+import statistics
+import sys
+import time
+import tracemalloc
+
+from shadowsocks.local import LocalServer
+
+from test.loopback import LoopbackEchoServer
+
+CIPHER_NAME = 'AEAD_AES_128_GCM'
+TARGET = b'\x03\x0bexample.com\x00\x50'
+
+
+async def socks5_connect(port: int):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'\x05\x01\x00' + b'\x05\x01\x00' + TARGET)
+    await reader.readexactly(2 + 10)
+    return reader, writer
+
+
+async def bulk_client(port: int, total_size: int):
+    reader, writer = await socks5_connect(port)
+    block = b'x' * (64 * 1024)
+
+    async def send():
+        for _ in range(total_size // len(block)):
+            writer.write(block)
+            await writer.drain()
+
+    sender = asyncio.create_task(send())
+    await reader.readexactly(total_size // len(block) * len(block))
+    await sender
+    writer.close()
+
+
+async def latency_client(port: int, n_messages: int):
+    reader, writer = await socks5_connect(port)
+    latencies = []
+    for _ in range(n_messages):
+        start_time = time.perf_counter()
+        writer.write(b'ping')
+        await reader.readexactly(4)
+        latencies.append(time.perf_counter() - start_time)
+    writer.close()
+    return latencies
+
+
+async def main_async(n_clients: int, total_size: int):
+    ss_server = LoopbackEchoServer('password', CIPHER_NAME)
+    local_server = LocalServer(ss_server.addr, ss_server.port, 'password', CIPHER_NAME, listen_port=0)
+    await local_server.start()
+    port = local_server.listen_port
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[bulk_client(port, total_size) for _ in range(n_clients)])
+    elapsed = time.perf_counter() - start_time
+    print(f'bulk:    {n_clients} clients, {n_clients * total_size / elapsed / 1e6:.1f} MB/s echoed')
+
+    latencies = await latency_client(port, 1000)
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f'latency: p50 {quantiles[49] * 1e6:.0f} us, p99 {quantiles[98] * 1e6:.0f} us')
+
+    tracemalloc.start()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    idle = [await socks5_connect(port) for _ in range(n_clients)]
+    await asyncio.sleep(0.5)
+    memory_after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Includes the client side streams and the in-process stand-in server.
+    print(f'memory:  {(memory_after - memory_before) / n_clients / 1024:.1f} kB Python heap per idle client')
+
+    for _, writer in idle: writer.close()
+    await asyncio.sleep(0.5)
+
+    local_server.close()
+    ss_server.close()
+
+
+def main():
+    n_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    total_size = int(float(sys.argv[2]) * 1024 * 1024) if len(sys.argv) > 2 else 4 * 1024 * 1024
+    asyncio.run(main_async(n_clients, total_size))
+
+
+if __name__ == '__main__':
+    main()
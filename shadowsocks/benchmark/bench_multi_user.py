@@ -0,0 +1,147 @@
+'''User identification cost of the multi-user server.
+
+For each user count, `--clients` clients of random users, each with its own
+address, connect `--handshakes` times in random order after one warm-up
+connection each. Every handshake is identified by `UserTable` and by naive
+trials of `init_key` with every password in a fixed order. Prints the mean time
+and key trials per handshake, the time to build the table, and the cost of a
+client of no user, which still tries every key. `--output` and `--baseline`
+compare runs as in `bench_e2e`.
+
+Usage: python -m benchmark.bench_multi_user [--users N ...] [--clients N] [--handshakes N]
+                                            [--cipher NAME] [--output FILE] [--baseline FILE]
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from typing import Any, Dict, List, Tuple
+
+from shadowsocks.cipher.CipherParamerters import CipherParamerters, supported_cipher_parameters
+from shadowsocks.utils.UserTable import UserTable
+
+# (client address, user name, salt, encrypted length of the first chunk)
+Handshake = Tuple[str, str, bytes, bytes]
+
+
+def first_chunks(params: CipherParamerters, passwords: Dict[str, str], clients: List[Tuple[str, str]]) -> List[Handshake]:
+    handshakes = []
+    for client_addr, name in clients:
+        salt = os.urandom(params.salt_size)
+        cipher = params.cipher(params)
+        cipher.init_key(passwords[name], salt)
+        handshakes.append((client_addr, name, salt, cipher.encrypt_chunk(b'hello')[:2 + params.tag_size]))
+    return handshakes
+
+
+def naive_identify(cipher: Any, passwords: Dict[str, str], salt: bytes, header: bytes) -> Tuple[str, int]:
+    '''Try the password of every user in turn.'''
+    n_trials = 0
+    for name, password in passwords.items():
+        n_trials += 1
+        cipher.init_key(password, salt)
+        try:
+            cipher.decrypt_chunk_size(header)
+            return name, n_trials
+        except ValueError:
+            pass
+    raise ValueError('No user key authenticates the chunk.')
+
+
+async def bench(params: CipherParamerters, n_users: int, n_clients: int, n_handshakes: int) -> Dict[str, Any]:
+    passwords = {f'user{i}': os.urandom(12).hex() for i in range(n_users)}
+    names = list(passwords)
+    clients = [(f'10.0.{i // 256}.{i % 256}', random.choice(names)) for i in range(n_clients)]
+    warm_up = first_chunks(params, passwords, clients)
+    handshakes = first_chunks(params, passwords, [random.choice(clients) for _ in range(n_handshakes)])
+    cipher = params.cipher(params)
+
+    start_time = time.perf_counter()
+    users = UserTable(passwords, params)
+    build_seconds = time.perf_counter() - start_time
+
+    for client_addr, _, salt, header in warm_up: await users.identify(cipher, salt, header, client_addr)
+    trials = users.n_trials
+    start_time = time.perf_counter()
+    for client_addr, name, salt, header in handshakes:
+        assert (await users.identify(cipher, salt, header, client_addr))[0] == name
+    table_seconds = time.perf_counter() - start_time
+    table_trials = users.n_trials - trials
+
+    naive_trials = 0
+    start_time = time.perf_counter()
+    for _, name, salt, header in handshakes:
+        found, n_trials = naive_identify(cipher, passwords, salt, header)
+        assert found == name
+        naive_trials += n_trials
+    naive_seconds = time.perf_counter() - start_time
+
+    unknown = first_chunks(params, {'': 'unknown'}, [('10.1.0.0', '')])[0]
+    start_time = time.perf_counter()
+    try:
+        await users.identify(cipher, unknown[2], unknown[3], unknown[0])
+    except ValueError:
+        pass
+    unknown_seconds = time.perf_counter() - start_time
+
+    return {
+        'users': n_users,
+        'clients': n_clients,
+        'handshakes': n_handshakes,
+        'build_ms': build_seconds * 1e3,
+        'table_us': table_seconds / n_handshakes * 1e6,
+        'table_trials': table_trials / n_handshakes,
+        'naive_us': naive_seconds / n_handshakes * 1e6,
+        'naive_trials': naive_trials / n_handshakes,
+        'unknown_us': unknown_seconds * 1e6,
+    }
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmark.bench_multi_user',
+                                     description='User identification cost of the multi-user server.')
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 100, 1000, 10000], help='User counts (default: 10 100 1000 10000)')
+    parser.add_argument('--clients', type=int, default=100, help='Client addresses connecting (default: 100)')
+    parser.add_argument('--handshakes', type=int, default=200, help='Timed handshakes per user count (default: 200)')
+    parser.add_argument('--cipher', default='AEAD_CHACHA20_IETF_POLY1305', choices=list(supported_cipher_parameters.keys()))
+    parser.add_argument('--output', help='Write the JSON report to this file, - for stdout')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare with')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(args)
+    params = supported_cipher_parameters[options.cipher]
+
+    print(f'{"users":>8}{"build ms":>10}{"table us":>10}{"trials":>8}{"naive us":>12}{"trials":>9}{"unknown us":>12}')
+    results = []
+    for n_users in options.users:
+        result = asyncio.run(bench(params, n_users, options.clients, options.handshakes))
+        results.append(result)
+        print(f'{n_users:>8}{result["build_ms"]:>10.1f}{result["table_us"]:>10.1f}{result["table_trials"]:>8.2f}'
+              f'{result["naive_us"]:>12.1f}{result["naive_trials"]:>9.1f}{result["unknown_us"]:>12.0f}')
+
+    report = {'benchmark': 'multi_user', 'cipher': options.cipher, 'python': sys.version.split()[0], 'results': results}
+    if options.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = {result['users']: result for result in json.load(f)['results']}
+        for result in results:
+            base = baseline.get(result['users'])
+            if base is None: continue
+            print(f'{result["users"]:>8} users{base["table_us"] / result["table_us"]:>8.2f}x faster')
+
+
+if __name__ == '__main__':
+    main()
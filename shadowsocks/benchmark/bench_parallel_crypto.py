@@ -0,0 +1,71 @@
+'''Sequential versus parallel chunk crypto.
+
+Encrypts a large buffer with `AEAD_CipherBase.encrypt_into` and decodes it with
+`AEAD_StreamDecoder.decode_all`, once sequentially and once with thread pools
+of increasing size, for every available backend.
+
+Usage: python -m benchmark.bench_parallel_crypto [megabytes] [cipher_name]
+'''
+
+import os
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.cipher.AEAD.backend import available_backends
+from shadowsocks.message.AEAD import AEAD_StreamDecoder
+from shadowsocks.utils.RingBuffer import RingBuffer
+
+
+def bench(cipher_name: str, backend: Optional[str], total_size: int, n_workers: Optional[int]):
+    cipher_parameters = supported_cipher_parameters[cipher_name].with_backend(backend)
+    salt = b's' * cipher_parameters.salt_size
+    executor = ThreadPoolExecutor(n_workers) if n_workers else None
+
+    cipher = cipher_parameters.cipher(cipher_parameters)
+    cipher.init_key('password', salt)
+    data = b'x' * total_size
+    output = memoryview(bytearray(cipher.encrypted_size(total_size)))
+
+    start_time = time.perf_counter()
+    cipher.encrypt_into(data, output, executor)
+    encrypt_time = time.perf_counter() - start_time
+
+    buffer = RingBuffer(len(output) + len(salt))
+    buffer.write(salt)
+    buffer.write(output)
+    decoder = AEAD_StreamDecoder(cipher_parameters, 
+                                 cipher_parameters.cipher(cipher_parameters), 
+                                 'password')
+
+    start_time = time.perf_counter()
+    decoder.decode_all(buffer, executor)
+    decrypt_time = time.perf_counter() - start_time
+
+    if executor: executor.shutdown()
+    return total_size / encrypt_time / 1e6, total_size / decrypt_time / 1e6
+
+
+def main():
+    total_size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 256 * 1024 * 1024
+    cipher_name = sys.argv[2] if len(sys.argv) > 2 else 'AEAD_AES_256_GCM'
+    cipher_parameters = supported_cipher_parameters[cipher_name]
+
+    worker_counts = [None] + sorted({2, 4, os.cpu_count() or 1})
+    # Warm up allocator and page cache before measuring.
+    bench(cipher_name, None, total_size, None)
+
+    print(f'{cipher_name}, {total_size // (1024 * 1024)} MB')
+    print(f'{"backend":<16}{"workers":>10}{"encrypt MB/s":>14}{"decrypt MB/s":>14}')
+    for backend in available_backends(cipher_parameters.cipher.algorithm, cipher_parameters):
+        for n_workers in worker_counts:
+            encrypt_speed, decrypt_speed = bench(cipher_name, backend.name, total_size, n_workers)
+            workers = str(n_workers) if n_workers else 'serial'
+            print(f'{backend.name:<16}{workers:>10}{encrypt_speed:>14.1f}{decrypt_speed:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
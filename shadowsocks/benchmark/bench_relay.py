@@ -0,0 +1,89 @@
+'''`relay` versus a hand-written pump loop.
+
+Bridges one end of a socket pair to a `Connection` through a loopback
+Shadowsocks echo server, writes a payload into the other end and reads the
+echo back. The naive pump is the usual pair of threads doing `recv(4096)` then
+`send` in each direction.
+
+Usage: python -m benchmark.bench_relay [megabytes] [cipher_name]
+'''
+
+import socket
+import sys
+import threading
+import time
+
+from shadowsocks.connection.Connection import Connection
+from shadowsocks.connection.relay import relay
+
+from test.loopback import LoopbackEchoServer
+
+NAIVE_BUFFER_SIZE = 4096
+
+
+def naive_pump(local_sock: socket.socket, conn: Connection):
+    def uplink():
+        while True:
+            data = local_sock.recv(NAIVE_BUFFER_SIZE)
+            if not data:
+                conn.shutdown_write()
+                return
+            conn.send(data)
+
+    def downlink():
+        while True:
+            data = conn.recv(NAIVE_BUFFER_SIZE)
+            if not data:
+                local_sock.shutdown(socket.SHUT_WR)
+                return
+            local_sock.sendall(data)
+
+    conn.settimeout(None)
+    threads = [threading.Thread(target=uplink), threading.Thread(target=downlink)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+
+
+def bench(server: LoopbackEchoServer, cipher_name: str, pump, total_size: int) -> float:
+    conn = Connection(server.addr, server.port, 'password', cipher_name, 'example.com', 80)
+    app_sock, local_sock = socket.socketpair()
+    data = b'x' * total_size
+
+    start_time = time.perf_counter()
+    pump_thread = threading.Thread(target=pump, args=(local_sock, conn))
+    pump_thread.start()
+    sender = threading.Thread(target=lambda: (app_sock.sendall(data), app_sock.shutdown(socket.SHUT_WR)))
+    sender.start()
+
+    n_received = 0
+    while True:
+        received = app_sock.recv(256 * 1024)
+        if not received: break
+        n_received += len(received)
+    elapsed = time.perf_counter() - start_time
+
+    sender.join()
+    pump_thread.join()
+    assert n_received == total_size
+    app_sock.close()
+    local_sock.close()
+    conn.close()
+    return total_size / elapsed / 1e6
+
+
+def main():
+    total_size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 64 * 1024 * 1024
+    cipher_name = sys.argv[2] if len(sys.argv) > 2 else 'AEAD_AES_128_GCM'
+    server = LoopbackEchoServer('password', cipher_name)
+
+    print(f'{cipher_name}, {total_size // (1024 * 1024)} MB echoed')
+    print(f'{"pump":<12}{"MB/s":>10}')
+    for name, pump in [('naive', naive_pump), ('relay', relay)]:
+        # Warm up once before measuring.
+        bench(server, cipher_name, pump, total_size // 8)
+        print(f'{name:<12}{bench(server, cipher_name, pump, total_size):>10.1f}')
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+'''Throughput and memory of the salt replay filter.
+
+Adds `--salts` random salts to a `ReplayFilter`, rotating it several times
+when `--salts` exceeds `--capacity`, then looks up as many remembered and
+unseen salts. Prints adds and lookups per second, the fixed memory of the
+filter next to that of a `set` holding the same remembered salts, and the
+measured false positive rate. `--output` and `--baseline` compare runs as in
+`bench_e2e`.
+
+Usage: python -m benchmark.bench_replay_filter [--salts N] [--capacity N] [--false-positive-rate P]
+                                               [--salt-size N] [--output FILE] [--baseline FILE]
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from typing import Any, Dict
+
+from shadowsocks.utils.ReplayFilter import ReplayFilter
+
+
+def set_memory_bytes(n_salts: int, salt_size: int) -> int:
+    '''Memory of a `set` of `n_salts` bytes objects of `salt_size` bytes.'''
+    salts = {os.urandom(salt_size) for _ in range(min(n_salts, 100000))}
+    per_salt = sys.getsizeof(next(iter(salts)))
+    table = sys.getsizeof(salts) * n_salts / len(salts)
+    return int(per_salt * n_salts + table)
+
+
+def bench(n_salts: int, capacity: int, false_positive_rate: float, salt_size: int) -> Dict[str, Any]:
+    replay_filter = ReplayFilter(capacity, false_positive_rate)
+    salts = [os.urandom(salt_size) for _ in range(n_salts)]
+
+    start_time = time.perf_counter()
+    for salt in salts: replay_filter.add(salt)
+    add_seconds = time.perf_counter() - start_time
+
+    # The salts of the current filter are always remembered.
+    remembered = salts[-min(n_salts, capacity):]
+    unseen = [os.urandom(salt_size) for _ in range(len(remembered))]
+
+    start_time = time.perf_counter()
+    n_found = sum(salt in replay_filter for salt in remembered)
+    hit_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    n_false_positives = sum(salt in replay_filter for salt in unseen)
+    miss_seconds = time.perf_counter() - start_time
+    assert n_found == len(remembered)
+
+    return {
+        'salts': n_salts,
+        'capacity': capacity,
+        'false_positive_rate': false_positive_rate,
+        'n_hashes': replay_filter.n_hashes,
+        'rotations': replay_filter.n_rotations,
+        'adds_per_second': n_salts / add_seconds,
+        'hit_lookups_per_second': len(remembered) / hit_seconds,
+        'miss_lookups_per_second': len(unseen) / miss_seconds,
+        'measured_false_positive_rate': n_false_positives / len(unseen),
+        'filter_bytes': replay_filter.memory_bytes,
+        'set_bytes': set_memory_bytes(min(n_salts, 2 * capacity), salt_size),
+    }
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmark.bench_replay_filter',
+                                     description='Throughput and memory of the salt replay filter.')
+    parser.add_argument('--salts', type=int, default=2000000, help='Salts added (default: 2000000)')
+    parser.add_argument('--capacity', type=int, default=1000000, help='Salts per filter (default: 1000000)')
+    parser.add_argument('--false-positive-rate', type=float, default=1e-6, help='Target false positive rate (default: 1e-6)')
+    parser.add_argument('--salt-size', type=int, default=32, help='Salt size in bytes (default: 32)')
+    parser.add_argument('--output', help='Write the JSON report to this file, - for stdout')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare with')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(args)
+
+    result = bench(options.salts, options.capacity, options.false_positive_rate, options.salt_size)
+    print(f'{result["salts"]} salts, capacity {result["capacity"]}, {result["n_hashes"]} hashes, '
+          f'{result["rotations"]} rotations')
+    print(f'{"add":<24}{result["adds_per_second"]:>12,.0f} /s')
+    print(f'{"lookup, remembered":<24}{result["hit_lookups_per_second"]:>12,.0f} /s')
+    print(f'{"lookup, unseen":<24}{result["miss_lookups_per_second"]:>12,.0f} /s')
+    print(f'{"filter memory":<24}{result["filter_bytes"] / 2**20:>12.1f} MiB')
+    print(f'{"set of the same salts":<24}{result["set_bytes"] / 2**20:>12.1f} MiB')
+    print(f'{"false positive rate":<24}{result["measured_false_positive_rate"]:>12.2e}'
+          f' (target {result["false_positive_rate"]:.0e})')
+
+    report = {'benchmark': 'replay_filter', 'python': sys.version.split()[0], 'results': [result]}
+    if options.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            base = json.load(f)['results'][0]
+        for key in ('adds_per_second', 'hit_lookups_per_second', 'miss_lookups_per_second'):
+            print(f'{key:<24}{result[key] / base[key]:>8.2f}x faster')
+
+
+if __name__ == '__main__':
+    main()
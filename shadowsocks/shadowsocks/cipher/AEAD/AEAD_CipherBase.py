@@ -1,39 +1,61 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Optional
 if TYPE_CHECKING:
+    from concurrent.futures import Executor
     # Avoid cyclic imports caused by importing type
     from ..CipherParamerters import CipherParamerters
 
 import struct
-from abc import ABC, abstractmethod
+from abc import ABC
+from functools import lru_cache
 from hashlib import md5
 
 from ..key_gen import *
+from .backend import BackendBase, select_backend
+
+# Number of chunks encrypted by one task in parallel mode.
+PARALLEL_CHUNKS_PER_TASK = 4
+
+
+@lru_cache(maxsize=1024)
+def master_key(password: str, key_size: int) -> bytes:
+    '''Derive the master key of `password`, cached per (password, key size).'''
+    key, _ = EVP_BytesToKey(
+        data = password.encode(),
+        salt = b'',
+        round = 1,
+        hash_func = md5,
+        key_length = key_size,
+        iv_length = 0
+    )
+    return key
 
 
 class AEAD_CipherBase(ABC):
+    # One of `AEAD_ALGORITHM`, set by subclasses.
+    algorithm = ''
+
     def __init__(self, cipher_parameters: CipherParamerters):
         self.cipher_parameters = cipher_parameters
+        self.backend_type = select_backend(self.algorithm, cipher_parameters)
 
         self.key: Optional[bytes] = None
         self.key_initiated = False
+        self.backend: Optional[BackendBase] = None
         self._nonce = bytearray(cipher_parameters.nonce_size)
 
     def init_key(self, password: str, session_salt: bytes):
-        mainKey, _ = EVP_BytesToKey(
-            data = password.encode(),
-            salt = b'',
-            round = 1,
-            hash_func = md5,
-            key_length = self.cipher_parameters.key_size,
-            iv_length = 0
-        )
+        self.init_subkey(master_key(password, self.cipher_parameters.key_size), session_salt)
+
+    def init_subkey(self, main_key: bytes, session_salt: bytes):
+        '''Derive session subkey from an already derived master key.'''
         self.key = HKDF_SHA1(
-            ikm = mainKey, 
+            ikm = main_key, 
             salt = session_salt,
             info = b'ss-subkey',
             key_length = self.cipher_parameters.key_size
         )
+        self.backend = self.backend_type(self.algorithm, self.key, self.cipher_parameters)
         self.key_initiated = True
 
     @property
@@ -45,6 +67,16 @@ class AEAD_CipherBase(ABC):
             self._nonce[i] = (v + 1) & 0xff
             if self._nonce[i]: break
 
+    def nonce_at(self, offset: int) -> bytes:
+        '''Return the nonce after `offset` increments, without changing the current nonce.'''
+        nonce_size = len(self._nonce)
+        counter = int.from_bytes(self._nonce, 'little') + offset
+        return (counter & ((1 << (8 * nonce_size)) - 1)).to_bytes(nonce_size, 'little')
+
+    def advance_nonce(self, offset: int):
+        '''Increase nonce `offset` times.'''
+        self._nonce[:] = self.nonce_at(offset)
+
     def encrypt_chunk(self, chunk: bytes) -> bytes:
         if len(chunk) > self.cipher_parameters.chunk_size: 
             raise ValueError('The given chunk is too large.')
@@ -57,6 +89,86 @@ class AEAD_CipherBase(ABC):
         self.increase_nonce()
 
         return encrypted_chunk_size + encrypted_payload
+
+    def encrypt_chunk_into(self, chunk: bytes, output: memoryview) -> int:
+        '''Encrypt `chunk` into the beginning of `output`.
+
+        Returns:
+            Number of bytes written.
+        '''
+        if len(chunk) > self.cipher_parameters.chunk_size: 
+            raise ValueError('The given chunk is too large.')
+
+        chunk_size_bytes = struct.pack('!H', len(chunk))
+
+        offset = self._encrypt_into(chunk_size_bytes, output)
+        self.increase_nonce()
+        offset += self._encrypt_into(chunk, output[offset:])
+        self.increase_nonce()
+
+        return offset
+
+    def encrypted_size(self, length: int) -> int:
+        '''Return size of the chunks encrypted from `length` bytes of plaintext.'''
+        n_chunks = -(-length // self.cipher_parameters.chunk_size)
+        return length + n_chunks * (2 + 2 * self.cipher_parameters.tag_size)
+
+    def encrypt_into(self, 
+                     data: bytes, 
+                     output: memoryview, 
+                     executor: Optional[Executor] = None) -> int:
+        '''Split `data` into chunks and encrypt them consecutively into `output`.
+
+        `output` should hold at least `encrypted_size(len(data))` bytes.
+
+        Keyword Arguments:
+            executor -- If given, chunks are encrypted by tasks submitted to it. (default: {None})
+
+        Returns:
+            Number of bytes written.
+        '''
+        chunk_size = self.cipher_parameters.chunk_size
+        data = memoryview(data)
+
+        if executor is not None and len(data) > chunk_size:
+            return self._encrypt_into_parallel(data, output, executor)
+
+        offset = 0
+        for chunk_start_idx in range(0, len(data), chunk_size):
+            chunk = data[chunk_start_idx: chunk_start_idx + chunk_size]
+            offset += self.encrypt_chunk_into(chunk, output[offset:])
+
+        return offset
+
+    def _encrypt_into_parallel(self, data: memoryview, output: memoryview, executor: Executor) -> int:
+        '''Encrypt chunks concurrently, the nonce of every chunk is known from its index.'''
+        backend = self.backend
+        assert backend is not None
+
+        chunk_size = self.cipher_parameters.chunk_size
+        encrypted_chunk_size = chunk_size + 2 + 2 * self.cipher_parameters.tag_size
+        n_chunks = -(-len(data) // chunk_size)
+
+        def encrypt_chunks(first_chunk_idx: int, last_chunk_idx: int):
+            for chunk_idx in range(first_chunk_idx, last_chunk_idx):
+                chunk = data[chunk_idx * chunk_size: (chunk_idx + 1) * chunk_size]
+                chunk_size_bytes = struct.pack('!H', len(chunk))
+
+                # Every chunk but the last one is full, so offsets are known in advance.
+                offset = chunk_idx * encrypted_chunk_size
+                offset += backend.encrypt_into(self.nonce_at(2 * chunk_idx), 
+                                               chunk_size_bytes, 
+                                               output[offset:])
+                backend.encrypt_into(self.nonce_at(2 * chunk_idx + 1), chunk, output[offset:])
+
+        futures = [executor.submit(encrypt_chunks, 
+                                   chunk_idx, 
+                                   min(n_chunks, chunk_idx + PARALLEL_CHUNKS_PER_TASK))
+                   for chunk_idx in range(0, n_chunks, PARALLEL_CHUNKS_PER_TASK)]
+        for future in futures: future.result()
+
+        self.advance_nonce(2 * n_chunks)
+        return self.encrypted_size(len(data))
     
     def decrypt_chunk(self, payload: bytes) -> bytes:
         chunk_size_bytes = payload[: 2 + self.cipher_parameters.tag_size]
@@ -68,22 +180,35 @@ class AEAD_CipherBase(ABC):
         self.increase_nonce()
 
         chunk_bytes = payload[2 + self.cipher_parameters.tag_size:]
+        return self.decrypt_chunk_payload(chunk_bytes)
+        
+    def decrypt_chunk_payload(self, chunk_bytes: bytes) -> bytes:
+        '''Decrypt the payload segment of a chunk whose size segment was already decrypted.'''
         chunk = self._decrypt(chunk_bytes)
         self.increase_nonce()
 
         return chunk
-        
+
     def decrypt_chunk_size(self, chunk_size_bytes: bytes) -> int:
         if len(chunk_size_bytes) != (2 + self.cipher_parameters.tag_size):
             raise ValueError('The given `chunk_size` segment size mismatch.')
         return struct.unpack('!H', self._decrypt(chunk_size_bytes))[0]
 
-    @abstractmethod
     def _encrypt(self, data: bytes) -> bytes:
         '''Encrypt `data` and generate authenticate tag'''
-        pass
+        assert self.backend is not None
+        return self.backend.encrypt(self._nonce, data)
+
+    def _encrypt_into(self, data: bytes, output: memoryview) -> int:
+        '''Encrypt `data` and write ciphertext followed by authenticate tag into `output`.
+
+        Returns:
+            Number of bytes written.
+        '''
+        assert self.backend is not None
+        return self.backend.encrypt_into(self._nonce, data, output)
 
-    @abstractmethod
     def _decrypt(self, data_and_auth_tag: bytes) -> bytes:
         '''Decrypt `data` and verify authenticate tag'''
-        pass
\ No newline at end of file
+        assert self.backend is not None
+        return self.backend.decrypt(self._nonce, data_and_auth_tag)
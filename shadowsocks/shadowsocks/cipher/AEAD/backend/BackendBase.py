@@ -0,0 +1,57 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    # Avoid cyclic imports caused by importing type
+    from ...CipherParamerters import CipherParamerters
+
+from abc import ABC, abstractmethod
+
+
+class AEAD_ALGORITHM:
+    AES_GCM           = 'AES_GCM'
+    CHACHA20_POLY1305 = 'CHACHA20_POLY1305'
+
+
+class BackendBase(ABC):
+    '''Key-scheduled AEAD primitive, one instance per session key.'''
+
+    # Name used to select this backend through `CipherParamerters.backend`.
+    name = ''
+
+    def __init__(self, 
+                 algorithm: str,
+                 key: bytes, 
+                 cipher_parameters: CipherParamerters):
+        
+        self.algorithm = algorithm
+        self.key = key
+        self.cipher_parameters = cipher_parameters
+
+    @classmethod
+    @abstractmethod
+    def supports(cls, algorithm: str, cipher_parameters: CipherParamerters) -> bool:
+        '''Whether the backend is installed and implements `algorithm` with the given parameters.'''
+        pass
+
+    @abstractmethod
+    def encrypt(self, nonce: bytes, data: bytes) -> bytes:
+        '''Return ciphertext followed by authenticate tag.'''
+        pass
+
+    @abstractmethod
+    def encrypt_into(self, nonce: bytes, data: bytes, output: memoryview) -> int:
+        '''Write ciphertext followed by authenticate tag into `output`.
+
+        Returns:
+            Number of bytes written.
+        '''
+        pass
+
+    @abstractmethod
+    def decrypt(self, nonce: bytes, encrypted: bytes) -> bytes:
+        '''Verify authenticate tag and return plaintext.
+
+        Raises:
+            ValueError -- If the authenticate tag mismatch.
+        '''
+        pass
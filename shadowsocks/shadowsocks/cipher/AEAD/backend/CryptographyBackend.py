@@ -0,0 +1,76 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    # Avoid cyclic imports caused by importing type
+    from ...CipherParamerters import CipherParamerters
+
+import importlib.util
+
+from functools import lru_cache
+
+from .BackendBase import BackendBase, AEAD_ALGORITHM
+
+# Checked without importing, `cryptography` is only loaded by the first cipher using it.
+cryptography_available = importlib.util.find_spec('cryptography') is not None
+
+
+@lru_cache(maxsize=None)
+def _import_cryptography():
+    '''Return (AESGCM, ChaCha20Poly1305, InvalidTag), None if `cryptography` fails to import.'''
+    try:
+        from cryptography.exceptions import InvalidTag
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    except ImportError:
+        return None
+    return AESGCM, ChaCha20Poly1305, InvalidTag
+
+
+class CryptographyBackend(BackendBase):
+    '''`cryptography` (OpenSSL) backend.
+
+    The key is scheduled once per session. Only 12 bytes nonces and 16 bytes
+    tags are supported.
+    '''
+    
+    name = 'cryptography'
+
+    def __init__(self, 
+                 algorithm: str,
+                 key: bytes, 
+                 cipher_parameters: CipherParamerters):
+        
+        super(CryptographyBackend, self).__init__(algorithm, key, cipher_parameters)
+
+        AESGCM, ChaCha20Poly1305, self._invalid_tag = _import_cryptography()
+        if algorithm == AEAD_ALGORITHM.AES_GCM:
+            self._cipher = AESGCM(key)
+        else:
+            self._cipher = ChaCha20Poly1305(key)
+        
+        self._has_encrypt_into = hasattr(self._cipher, 'encrypt_into')
+
+    @classmethod
+    def supports(cls, algorithm: str, cipher_parameters: CipherParamerters) -> bool:
+        return (cryptography_available
+                and _import_cryptography() is not None
+                and algorithm in (AEAD_ALGORITHM.AES_GCM, AEAD_ALGORITHM.CHACHA20_POLY1305)
+                and cipher_parameters.nonce_size == 12
+                and cipher_parameters.tag_size == 16)
+
+    def encrypt(self, nonce: bytes, data: bytes) -> bytes:
+        return self._cipher.encrypt(nonce, data, None)
+
+    def encrypt_into(self, nonce: bytes, data: bytes, output: memoryview) -> int:
+        encrypted_length = len(data) + self.cipher_parameters.tag_size
+
+        if self._has_encrypt_into:
+            return self._cipher.encrypt_into(nonce, data, None, output[:encrypted_length])
+
+        output[:encrypted_length] = self._cipher.encrypt(nonce, data, None)
+        return encrypted_length
+
+    def decrypt(self, nonce: bytes, encrypted: bytes) -> bytes:
+        try:
+            return self._cipher.decrypt(nonce, encrypted, None)
+        except self._invalid_tag:
+            raise ValueError('MAC check failed')
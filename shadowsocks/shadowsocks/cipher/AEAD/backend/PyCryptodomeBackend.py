@@ -0,0 +1,63 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    # Avoid cyclic imports caused by importing type
+    from ...CipherParamerters import CipherParamerters
+
+from .BackendBase import BackendBase, AEAD_ALGORITHM
+
+
+class PyCryptodomeBackend(BackendBase):
+    '''pycryptodome backend.
+
+    pycryptodome cipher objects are single-use, so a new one is created for
+    every operation. Supports both 8 and 12 bytes ChaCha20-Poly1305 nonces.
+    '''
+    
+    name = 'pycryptodome'
+
+    def __init__(self, 
+                 algorithm: str,
+                 key: bytes, 
+                 cipher_parameters: CipherParamerters):
+        
+        super(PyCryptodomeBackend, self).__init__(algorithm, key, cipher_parameters)
+
+        # Imported on first use, loading pycryptodome dominates the import time of the package.
+        if algorithm == AEAD_ALGORITHM.AES_GCM:
+            from Crypto.Cipher import AES
+            self._AES = AES
+            self._new = self._new_aes_gcm
+        else:
+            from Crypto.Cipher import ChaCha20_Poly1305
+            self._ChaCha20_Poly1305 = ChaCha20_Poly1305
+            self._new = self._new_chacha20_poly1305
+
+    @classmethod
+    def supports(cls, algorithm: str, cipher_parameters: CipherParamerters) -> bool:
+        return algorithm in (AEAD_ALGORITHM.AES_GCM, AEAD_ALGORITHM.CHACHA20_POLY1305)
+
+    def _new_aes_gcm(self, nonce: bytes):
+        return self._AES.new(self.key, self._AES.MODE_GCM, nonce=nonce, mac_len=self.cipher_parameters.tag_size)
+
+    def _new_chacha20_poly1305(self, nonce: bytes):
+        return self._ChaCha20_Poly1305.new(key=self.key, nonce=nonce)
+
+    def encrypt(self, nonce: bytes, data: bytes) -> bytes:
+        ciphertext, auth_tag = self._new(nonce).encrypt_and_digest(data)
+        return ciphertext + auth_tag
+
+    def encrypt_into(self, nonce: bytes, data: bytes, output: memoryview) -> int:
+        data_length = len(data)
+        tag_size = self.cipher_parameters.tag_size
+
+        cipher = self._new(nonce)
+        cipher.encrypt(data, output=output[:data_length])
+        output[data_length: data_length + tag_size] = cipher.digest()
+        return data_length + tag_size
+
+    def decrypt(self, nonce: bytes, encrypted: bytes) -> bytes:
+        tag_size = self.cipher_parameters.tag_size
+
+        ciphertext, auth_tag = encrypted[:-tag_size], encrypted[-tag_size:]
+        return self._new(nonce).decrypt_and_verify(ciphertext, auth_tag)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Type
+if TYPE_CHECKING:
+    # Avoid cyclic imports caused by importing type
+    from ...CipherParamerters import CipherParamerters
+
+from .BackendBase import BackendBase, AEAD_ALGORITHM
+from .CryptographyBackend import CryptographyBackend
+from .PyCryptodomeBackend import PyCryptodomeBackend
+
+# In order of preference when no backend is requested.
+registered_backends: List[Type[BackendBase]] = [
+    CryptographyBackend,
+    PyCryptodomeBackend,
+]
+
+def available_backends(algorithm: str, cipher_parameters: CipherParamerters) -> List[Type[BackendBase]]:
+    '''Return backends able to run `algorithm` with `cipher_parameters`, in order of preference.'''
+    return [backend for backend in registered_backends 
+            if backend.supports(algorithm, cipher_parameters)]
+
+def select_backend(algorithm: str, cipher_parameters: CipherParamerters) -> Type[BackendBase]:
+    '''Return the backend requested by `cipher_parameters.backend`, or the preferred one if None.
+
+    Raises:
+        ValueError -- If the requested backend is unknown or does not support the cipher.
+    '''
+    candidates = available_backends(algorithm, cipher_parameters)
+    
+    if cipher_parameters.backend is None:
+        if not candidates: 
+            raise ValueError(f'No crypto backend available for {algorithm}')
+        return candidates[0]
+
+    for backend in candidates:
+        if backend.name == cipher_parameters.backend: 
+            return backend
+    
+    raise ValueError(f'Crypto backend "{cipher_parameters.backend}" not available for {algorithm}, '
+                     f'should be one of {[backend.name for backend in candidates]}')
+
+__all__ = [
+    'AEAD_ALGORITHM',
+    'BackendBase',
+    'CryptographyBackend',
+    'PyCryptodomeBackend',
+    'registered_backends',
+    'available_backends',
+    'select_backend',
+]
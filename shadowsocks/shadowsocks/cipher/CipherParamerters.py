@@ -1,8 +1,13 @@
-from .CipherBase import CipherBase
-from .AEAD.AEAD_AES_GCM import AEAD_AES_GCM
-from .AEAD.AEAD_CHACHA20_POLY1305 import AEAD_CHACHA20_POLY1305
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    # Cipher classes are imported by `CipherRegistry` on first lookup
+    from .CipherBase import CipherBase
 
-from typing import Type
+import copy
+import importlib
+
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple, Type
 from enum import Enum
 
 class CIPHER_TYPE(Enum):
@@ -20,6 +25,9 @@ class CipherParamerters:
                  salt_size: int = -1,
                  nonce_size: int = -1,
                  chunk_size: int = -1,
+
+                 # Crypto backend name, None for the preferred available one.
+                 backend: Optional[str] = None,
                  
                  ):
 
@@ -33,53 +41,112 @@ class CipherParamerters:
         self.nonce_size = nonce_size
         self.chunk_size = chunk_size
 
+        self.backend = backend
+
+    def with_backend(self, backend: Optional[str]) -> 'CipherParamerters':
+        '''Return a copy of the parameters using crypto backend `backend`.'''
+        cipher_parameters = copy.copy(self)
+        cipher_parameters.backend = backend
+        return cipher_parameters
+
+
+class CipherRegistry(Mapping[str, CipherParamerters]):
+    '''Mapping of cipher name to `CipherParamerters`, importing a cipher class on first lookup.
+
+    Names can be listed and tested with `in` without importing any cipher
+    implementation or crypto library, which keeps the package cheap to import.
+    '''
+
+    def __init__(self):
+        # name -> (cipher class path relative to this package, parameters)
+        self._specs: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._loaded: Dict[str, CipherParamerters] = {}
+
+    def register(self, name: str, cipher: str, **parameters: Any):
+        '''Register cipher `name`.
+
+        Arguments:
+            name -- Cipher name, e.g. AEAD_AES_128_GCM.
+            cipher -- Dotted path of the cipher class relative to this package, e.g. .AEAD.AEAD_AES_GCM.AEAD_AES_GCM.
+            parameters -- Keyword arguments of `CipherParamerters` besides `cipher`.
+        '''
+        self._specs[name] = (cipher, parameters)
+        self._loaded.pop(name, None)
+
+    def __getitem__(self, name: str) -> CipherParamerters:
+        cipher_parameters = self._loaded.get(name)
+        if cipher_parameters is not None: return cipher_parameters
+
+        cipher_path, parameters = self._specs[name]
+        module_name, class_name = cipher_path.rsplit('.', 1)
+        cipher = getattr(importlib.import_module(module_name, __package__), class_name)
+        # Concurrent first lookups all return the instance stored first.
+        return self._loaded.setdefault(name, CipherParamerters(cipher=cipher, **parameters))
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._specs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+
+supported_cipher_parameters = CipherRegistry()
+
+supported_cipher_parameters.register(
+    'AEAD_AES_128_GCM',
+    cipher_type     = CIPHER_TYPE.AEAD,
+    cipher          = '.AEAD.AEAD_AES_GCM.AEAD_AES_GCM',
+    key_size        = 16,
+    tag_size        = 16,
+    salt_size       = 16,
+    nonce_size      = 12,
+    chunk_size      = 0x3fff
+)
+
+supported_cipher_parameters.register(
+    'AEAD_AES_192_GCM',
+    cipher_type     = CIPHER_TYPE.AEAD,
+    cipher          = '.AEAD.AEAD_AES_GCM.AEAD_AES_GCM',
+    key_size        = 24,
+    tag_size        = 16,
+    salt_size       = 24,
+    nonce_size      = 12,
+    chunk_size      = 0x3fff
+)
+
+supported_cipher_parameters.register(
+    'AEAD_AES_256_GCM',
+    cipher_type     = CIPHER_TYPE.AEAD,
+    cipher          = '.AEAD.AEAD_AES_GCM.AEAD_AES_GCM',
+    key_size        = 32,
+    tag_size        = 16,
+    salt_size       = 32,
+    nonce_size      = 12,
+    chunk_size      = 0x3fff
+)
+
+supported_cipher_parameters.register(
+    'AEAD_CHACHA20_IETF_POLY1305',
+    cipher_type     = CIPHER_TYPE.AEAD,
+    cipher          = '.AEAD.AEAD_CHACHA20_POLY1305.AEAD_CHACHA20_POLY1305',
+    key_size        = 32,
+    tag_size        = 16,
+    salt_size       = 32,
+    nonce_size      = 12,
+    chunk_size      = 0x3fff
+)
 
-supported_cipher_parameters = {
-    'AEAD_AES_128_GCM': CipherParamerters(
-        cipher_type     = CIPHER_TYPE.AEAD,
-        cipher          = AEAD_AES_GCM,
-        key_size        = 16,
-        tag_size        = 16,
-        salt_size       = 16,
-        nonce_size      = 12,
-        chunk_size      = 0x3fff
-    ),
-    'AEAD_AES_192_GCM': CipherParamerters(
-        cipher_type     = CIPHER_TYPE.AEAD,
-        cipher          = AEAD_AES_GCM,
-        key_size        = 24,
-        tag_size        = 16,
-        salt_size       = 24,
-        nonce_size      = 12,
-        chunk_size      = 0x3fff
-    ),
-    'AEAD_AES_256_GCM': CipherParamerters(
-        cipher_type     = CIPHER_TYPE.AEAD,
-        cipher          = AEAD_AES_GCM,
-        key_size        = 32,
-        tag_size        = 16,
-        salt_size       = 32,
-        nonce_size      = 12,
-        chunk_size      = 0x3fff
-    ),
-    'AEAD_CHACHA20_IETF_POLY1305': CipherParamerters(
-        cipher_type     = CIPHER_TYPE.AEAD,
-        cipher          = AEAD_CHACHA20_POLY1305,
-        key_size        = 32,
-        tag_size        = 16,
-        salt_size       = 32,
-        nonce_size      = 12,
-        chunk_size      = 0x3fff
-    ),
-    
-    # deprecated
-    'AEAD_CHACHA20_POLY1305': CipherParamerters(
-        cipher_type     = CIPHER_TYPE.AEAD,
-        cipher          = AEAD_CHACHA20_POLY1305,
-        key_size        = 32,
-        tag_size        = 16,
-        salt_size       = 32,
-        nonce_size      = 8,
-        chunk_size      = 0x3fff
-    ),
-}
\ No newline at end of file
+# deprecated
+supported_cipher_parameters.register(
+    'AEAD_CHACHA20_POLY1305',
+    cipher_type     = CIPHER_TYPE.AEAD,
+    cipher          = '.AEAD.AEAD_CHACHA20_POLY1305.AEAD_CHACHA20_POLY1305',
+    key_size        = 32,
+    tag_size        = 16,
+    salt_size       = 32,
+    nonce_size      = 8,
+    chunk_size      = 0x3fff
+)
@@ -1,9 +1,11 @@
+from __future__ import annotations
 import warnings
 import hmac
 import hashlib
-from typing import Callable, Tuple, Protocol
-from typing_extensions import Buffer
-from _hashlib import HASH
+from typing import TYPE_CHECKING, Callable, Tuple, Protocol
+if TYPE_CHECKING:
+    from typing_extensions import Buffer
+    from _hashlib import HASH
 
 class HashFunc(Protocol):
     def __call__(
@@ -47,9 +49,8 @@ def HKDF_extract(ikm: bytes,
                  salt: bytes = b''):
     # https://datatracker.ietf.org/doc/html/rfc5869#section-2.2
 
-    hash_length = hash_func().digest_size
-    if len(salt) == 0: salt = b'0' * hash_length
-    return hmac.new(salt, ikm, hash_func).digest()
+    if len(salt) == 0: salt = b'0' * hash_func().digest_size
+    return hmac.digest(salt, ikm, hash_func)
 
 
 def HKDF_expand(key: bytes, 
@@ -62,7 +63,8 @@ def HKDF_expand(key: bytes,
     N = (key_length - 1) // hash_length + 1
     T = [b'']
     for i in range(1, N+1):
-        T.append(hmac.new(key, T[-1] + info + i.to_bytes(1, 'big'), hash_func).digest())
+        # One-shot `hmac.digest` skips building an HMAC object per block.
+        T.append(hmac.digest(key, T[-1] + info + bytes((i, )), hash_func))
 
     T_concat = b''.join(T)
     return T_concat[:key_length]
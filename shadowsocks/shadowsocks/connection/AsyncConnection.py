@@ -0,0 +1,238 @@
+import asyncio
+import os
+import time
+
+from typing import Callable, Optional
+
+from ..cipher.CipherParamerters import CipherParamerters, supported_cipher_parameters
+from ..message.MessageBase import MessageBase
+from ..message.AEAD import *
+from ..utils.happy_eyeballs import CONNECTION_ATTEMPT_DELAY
+from ..utils.PerfCounters import registry
+from ..utils.RingBuffer import RingBuffer
+from ..utils.socks_addr import Host, encode_address
+
+RECV_SIZE = 64 * 1024
+
+
+class AsyncConnection:
+    '''asyncio counterpart of `Connection`.
+
+    Mirrors `asyncio.StreamReader`/`asyncio.StreamWriter` semantics: `send` only
+    queues encrypted data on the transport, `drain` waits until the transport
+    write buffer falls below its high-water mark, and `recv` is a coroutine.
+
+    Use `open_connection` to create an instance. Performance counters are kept
+    in `perf` like `Connection`, writes count as send calls and stream reads as
+    receive calls.
+    '''
+
+    def __init__(self,
+                 reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter,
+                 password: str,
+                 cipher_parameters: CipherParamerters):
+
+        self.reader = reader
+        self.writer = writer
+        self.password = password
+        self.cipher_parameters = cipher_parameters
+
+        # Allocated on first use, so idle tunnels hold no buffer memory.
+        self.recv_buffer = RingBuffer(0)
+        self.decryted_buffer = RingBuffer(0)
+        self.eof = False
+        self.perf = registry.new_counters()
+
+        self.uplink_cipher = self.cipher_parameters.cipher(self.cipher_parameters)
+        self.downlink_cipher = self.cipher_parameters.cipher(self.cipher_parameters)
+        self.downlink_decoder = AEAD_StreamDecoder(self.cipher_parameters,
+                                                   self.downlink_cipher,
+                                                   self.password)
+
+    def start_uplink(self, salt: Optional[bytes] = None):
+        '''Key the uplink cipher and queue its salt, which starts every stream.
+
+        Keyword Arguments:
+            salt -- Salt of the stream, None for a random one. (default: {None})
+        '''
+        uplink_salt = salt or os.urandom(self.cipher_parameters.salt_size)
+        self.uplink_cipher.init_key(self.password, uplink_salt)
+        self._send_message(AEAD_SaltMessage(self.cipher_parameters, uplink_salt))
+
+    def _send_target_addr(self, target_addr: Host, target_port: int):
+        self._send_message(AEAD_AddressMessage(self.cipher_parameters,
+                                               header=encode_address(target_addr, target_port)))
+
+    def _send_message(self, message: MessageBase):
+        '''Encrypt and queue `message` on the transport.'''
+        message.encrypt(self.uplink_cipher)
+        self.writer.write(message.serialize_encrypted())
+        self.perf.send_syscalls += 1
+
+    def send(self, data: bytes):
+        '''Queue plaintext data. Call `drain` to apply backpressure.'''
+
+        perf = self.perf
+        start_time = time.perf_counter_ns()
+        encrypted = bytearray(self.uplink_cipher.encrypted_size(len(data)))
+        self.uplink_cipher.encrypt_into(data, memoryview(encrypted))
+        perf.crypto_ns += time.perf_counter_ns() - start_time
+
+        self.writer.write(encrypted)
+        perf.send_syscalls += 1
+        perf.uplink_bytes += len(data)
+        perf.uplink_chunks += -(-len(data) // self.cipher_parameters.chunk_size)
+
+    async def drain(self):
+        '''Wait until it is appropriate to resume sending.'''
+        await self.writer.drain()
+
+    async def recv(self, buffer_size: int) -> bytes:
+        '''Receive data for at most `buffer_size` bytes.
+
+        Waits until at least one byte is available. Returns b'' on EOF.
+        '''
+
+        perf = self.perf
+        while not self.decryted_buffer and not self.eof:
+            start_time = time.perf_counter_ns()
+            try:
+                chunks = self.downlink_decoder.decode_all(self.recv_buffer)
+            except ValueError:
+                perf.mac_failures += 1
+                raise
+            finally:
+                perf.crypto_ns += time.perf_counter_ns() - start_time
+
+            for chunk in chunks:
+                perf.downlink_bytes += len(chunk)
+                self.decryted_buffer.write(chunk)
+            perf.downlink_chunks += len(chunks)
+            if self.decryted_buffer: break
+
+            received = await self.reader.read(RECV_SIZE)
+            perf.recv_syscalls += 1
+            if received:
+                self.recv_buffer.write(received)
+                perf.recv_buffer_high_water = max(perf.recv_buffer_high_water, len(self.recv_buffer))
+            else:
+                self.eof = True
+
+        return self.decryted_buffer.read(buffer_size)
+
+    async def readexactly(self, length: int) -> bytes:
+        '''Receive exactly `length` bytes.
+
+        Raises:
+            asyncio.IncompleteReadError -- If EOF is reached before `length` bytes.
+        '''
+        received = bytearray()
+        while len(received) < length:
+            data = await self.recv(length - len(received))
+            if not data:
+                raise asyncio.IncompleteReadError(bytes(received), length)
+            received += data
+        return bytes(received)
+
+    def write_eof(self):
+        '''Close the write end after flushing queued data.'''
+        if self.writer.can_write_eof():
+            self.writer.write_eof()
+
+    def at_eof(self) -> bool:
+        return self.eof and not self.decryted_buffer
+
+    def close(self):
+        self.writer.close()
+        registry.retire(self.perf)
+
+    async def wait_closed(self):
+        await self.writer.wait_closed()
+
+
+async def open_connection(SS_addr: str,
+                          SS_port: int,
+                          password: str,
+                          cipher_name: str,
+                          target_addr: Host,
+                          target_port: int,
+                          crypto_backend: Optional[str] = None,
+                          **kwargs) -> AsyncConnection:
+    '''Open a tunnel to `target_addr`:`target_port` through a Shadowsocks server.
+
+    Extra keyword arguments are passed to `asyncio.open_connection`, which races
+    the server addresses with Happy Eyeballs unless `happy_eyeballs_delay` is given.
+    '''
+
+    if cipher_name not in supported_cipher_parameters:
+        raise ValueError(f'cipher_name "{cipher_name}" not supported, should be one of {list(supported_cipher_parameters.keys())}')
+
+    cipher_parameters = supported_cipher_parameters[cipher_name]
+    if crypto_backend is not None:
+        cipher_parameters = cipher_parameters.with_backend(crypto_backend)
+
+    kwargs.setdefault('happy_eyeballs_delay', CONNECTION_ATTEMPT_DELAY)
+
+    handshake_start_time = time.perf_counter_ns()
+    reader, writer = await asyncio.open_connection(SS_addr, SS_port, **kwargs)
+    connection = AsyncConnection(reader,
+                                 writer,
+                                 password,
+                                 cipher_parameters)
+
+    connection.start_uplink()
+    connection._send_target_addr(target_addr, target_port)
+    connection.perf.handshake_ns += time.perf_counter_ns() - handshake_start_time
+    connection.perf.handshakes += 1
+    return connection
+
+
+async def relay(reader: asyncio.StreamReader,
+                writer: asyncio.StreamWriter,
+                tunnel: AsyncConnection,
+                buffer_size: int = RECV_SIZE,
+                on_send: Optional[Callable[[int], None]] = None,
+                on_recv: Optional[Callable[[int], None]] = None):
+    '''Copy data between a plaintext stream and `tunnel` in both directions until both reach EOF.
+
+    Data read from `reader` is sent through `tunnel`, data received from `tunnel`
+    is written to `writer`. Each direction waits for its destination to drain
+    before reading more. EOF from one side is forwarded as `write_eof` to the
+    other while the opposite direction keeps running.
+
+    Keyword Arguments:
+        buffer_size -- Plaintext bytes read per step. (default: {RECV_SIZE})
+        on_send -- Called with the size of every block sent through `tunnel`. (default: {None})
+        on_recv -- Called with the size of every block received from `tunnel`. (default: {None})
+    '''
+    await asyncio.gather(_relay_to_tunnel(reader, tunnel, buffer_size, on_send),
+                         _relay_from_tunnel(tunnel, writer, buffer_size, on_recv))
+
+
+async def _relay_to_tunnel(reader: asyncio.StreamReader,
+                           tunnel: AsyncConnection,
+                           buffer_size: int,
+                           on_send: Optional[Callable[[int], None]]):
+    while True:
+        data = await reader.read(buffer_size)
+        if not data:
+            tunnel.write_eof()
+            return
+        if on_send is not None: on_send(len(data))
+        tunnel.send(data)
+        await tunnel.drain()
+
+
+async def _relay_from_tunnel(tunnel: AsyncConnection,
+                             writer: asyncio.StreamWriter,
+                             buffer_size: int,
+                             on_recv: Optional[Callable[[int], None]]):
+    while True:
+        data = await tunnel.recv(buffer_size)
+        if not data:
+            if writer.can_write_eof(): writer.write_eof()
+            return
+        if on_recv is not None: on_recv(len(data))
+        writer.write(data)
+        await writer.drain()
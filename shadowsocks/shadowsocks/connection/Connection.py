@@ -1,15 +1,29 @@
+from __future__ import annotations
+import os
 import socket
-import Crypto.Random
+import selectors
 import time
 
-from typing import Tuple, Union, Type, Optional
+from collections import deque
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
 
 from ..cipher.CipherParamerters import supported_cipher_parameters
 from ..message.MessageBase import MessageBase
 from ..message.AEAD import *
-from ..utils.ByteBuffer import ByteBuffer
-from ..utils.socks_addr import determine_addr_type
+from ..utils.DNSCache import AddrInfo, DNSCache, dns_cache as default_dns_cache
+from ..utils.happy_eyeballs import happy_eyeballs_connect
+from ..utils.PerfCounters import registry
+from ..utils.RingBuffer import RingBuffer
+from ..utils.socks_addr import Host, encode_address
 from ..utils.TimeoutChecker import TimeoutChecker, Timeout
+from ..utils.Tracing import Tracer, get_tracer
+
+# Number of chunks encrypted into the uplink buffer before it is flushed.
+SEND_BATCH_CHUNKS = 64
+# Upper bound of buffers passed to one `sendmsg` call, within common IOV_MAX.
+MAX_IOVEC = 1024
 
 
 class Connection:
@@ -18,143 +32,330 @@ class Connection:
                  SS_port: int,
                  password: str,
                  cipher_name: str,
-                 target_addr: str, 
-                 target_port: int,
+                 target_addr: Optional[Host] = None, 
+                 target_port: Optional[int] = None,
+                 crypto_backend: Optional[str] = None,
+                 lazy_connect: bool = False,
+                 fast_open: bool = False,
+                 dns_cache: Optional[DNSCache] = None,
                  ):
+        '''Connect to Shadowsocks server and open a tunnel to the target.
+
+        If `target_addr` is None, only the salt is sent. Call `connect_target` before
+        sending data, which lets the connection be prepared ahead of time.
+
+        With `lazy_connect`, the salt and target address are held back and sent in one
+        write with the first `send`, saving packets and a round trip for request/response
+        traffic. `recv` and `shutdown_write` send them first if nothing was sent yet.
+        `fast_open` implies `lazy_connect` and also defers the TCP connect to that write,
+        done with TCP Fast Open so the data rides in the SYN where the OS supports it.
+        If Fast Open is unavailable or the first address refuses, all addresses are
+        raced as without it. A first address slower than `CONNECTION_ATTEMPT_DELAY`
+        keeps racing with the others. Either may replace `connection`.
+
+        The server address is resolved through `dns_cache`, the process-wide
+        `DNSCache.dns_cache` if None, and connected with Happy Eyeballs, racing
+        the resolved addresses so a dead address family does not stall the connect.
+
+        Performance counters are kept in `perf` and aggregated by `PerfCounters.registry`.
+        If a `Tracer` is installed with `Tracing.set_tracer` and samples this connection,
+        its stages emit spans.
+        '''
         
         if cipher_name not in supported_cipher_parameters: 
             raise ValueError(f'cipher_name "{cipher_name}" not supported, should be one of {list(supported_cipher_parameters.keys())}')
         
         self.cipher_parameters = supported_cipher_parameters[cipher_name]
+        if crypto_backend is not None:
+            self.cipher_parameters = self.cipher_parameters.with_backend(crypto_backend)
         self.password = password
         
-        self.recv_buffer = ByteBuffer()
-        self.decryted_buffer = ByteBuffer()
+        self.recv_buffer = RingBuffer()
+        self.decryted_buffer = RingBuffer()
+        self._send_buffer: Optional[memoryview] = None
+        self._bulk_executor: Optional[Executor] = None
         self.eof = False
-        self.timeout = 0
+        self.timeout: Optional[Timeout] = 0
+        self.perf = registry.new_counters()
+
+        # Encrypted handshake messages not written yet in lazy connect mode.
+        self._pending_handshake: Optional[List[bytes]] = [] if lazy_connect or fast_open else None
+        # Server address the first write connects to with TCP Fast Open.
+        self._fast_open_address: Optional[Tuple] = None
+        # (SS_addr, SS_port, resolved addresses, DNS cache) to race if Fast Open fails.
+        self._fast_open_fallback: Optional[Tuple[str, int, List[AddrInfo], DNSCache]] = None
 
         self.uplink_cipher = self.cipher_parameters.cipher(self.cipher_parameters)
         self.downlink_cipher = self.cipher_parameters.cipher(self.cipher_parameters)
-
-        self._init_socket(SS_addr, SS_port)
+        self.downlink_decoder = AEAD_StreamDecoder(self.cipher_parameters, 
+                                                   self.downlink_cipher, 
+                                                   self.password)
+
+        # Set when this connection is sampled by the installed tracer.
+        self.tracer: Optional[Tracer] = None
+        self.trace_id = 0
+        tracer = get_tracer()
+        if tracer is not None:
+            self.trace_id = tracer.instrument(self)
+            if self.trace_id: self.tracer = tracer
+
+        handshake_start_time = time.perf_counter_ns()
+        self._init_socket(SS_addr, SS_port, fast_open, dns_cache or default_dns_cache)
         self._init_uplink_cipher()
-        self._send_target_addr(target_addr, target_port)
+        if target_addr is not None:
+            assert target_port is not None
+            self.connect_target(target_addr, target_port)
+        self.perf.handshake_ns += time.perf_counter_ns() - handshake_start_time
+        self.perf.handshakes += 1
         
         
-    def _init_socket(self, SS_addr: str, SS_port: int):
-        self.connection = socket.create_connection((SS_addr, SS_port))
+    def _init_socket(self, SS_addr: str, SS_port: int, fast_open: bool, dns_cache: DNSCache):
+        self._selector = selectors.DefaultSelector()
+        self._write_selector = selectors.DefaultSelector()
+
+        addresses = dns_cache.resolve(SS_addr, SS_port)
+        if fast_open and hasattr(socket, 'MSG_FASTOPEN'):
+            family, type, proto, _, address = addresses[0]
+            self._set_socket(socket.socket(family, type, proto))
+            self._fast_open_address = address
+            self._fast_open_fallback = (SS_addr, SS_port, addresses, dns_cache)
+        else:
+            self._set_socket(self._connect(SS_addr, SS_port, addresses, dns_cache))
+
+    @staticmethod
+    def _connect(SS_addr: str,
+                 SS_port: int,
+                 addresses: List[AddrInfo],
+                 dns_cache: DNSCache,
+                 in_progress: Optional[Tuple[socket.socket, tuple]] = None) -> socket.socket:
+        try:
+            return happy_eyeballs_connect(addresses, in_progress=in_progress)
+        except OSError:
+            # The server may have moved, resolve again next time.
+            dns_cache.invalidate(SS_addr, SS_port)
+            raise
+
+    def _set_socket(self, sock: socket.socket):
+        '''Use `sock` to talk to the server, closing the previous socket if any.'''
+        if getattr(self, 'connection', None) is sock:
+            sock.setblocking(False)
+            return
+        if hasattr(self, 'connection'):
+            self._selector.unregister(self.connection)
+            self._write_selector.unregister(self.connection)
+            self.connection.close()
+
+        self.connection = sock
         self.connection.setblocking(False)
+        self._selector.register(self.connection, selectors.EVENT_READ)
+        self._write_selector.register(self.connection, selectors.EVENT_WRITE)
 
     def _init_uplink_cipher(self, salt: Optional[bytes] = None):
-        uplink_salt = salt or Crypto.Random.get_random_bytes(self.cipher_parameters.salt_size)
+        uplink_salt = salt or os.urandom(self.cipher_parameters.salt_size)
         self.uplink_cipher.init_key(self.password, uplink_salt)
         self._send_message(AEAD_SaltMessage(self.cipher_parameters, uplink_salt))
 
-    def _init_downlink_cipher(self, salt: bytes):
-        self.downlink_cipher.init_key(self.password, salt)
+    def connect_target(self, target_addr: Host, target_port: int):
+        '''Send target address, must be called once before sending data.
 
-    def _send_target_addr(self, target_addr: str, target_port: int):
-        addr_type = determine_addr_type(target_addr)
+        `target_addr` is a domain or IP string, an `ipaddress` address or an encoded domain.
+        '''
+        self._send_target_addr(target_addr, target_port)
 
-        self._send_message(AEAD_AddressMessage(self.cipher_parameters, 
-                                               addr_type,
-                                               target_addr,
-                                               target_port))
+    def _send_target_addr(self, target_addr: Host, target_port: int):
+        self._send_message(AEAD_AddressMessage(self.cipher_parameters,
+                                               header=encode_address(target_addr, target_port)))
 
     def _send_message(self, message: MessageBase):
         '''Encrypt and write `message` to socket.'''
         message.encrypt(self.uplink_cipher)
-        self.connection.send(message.serialize_encrypted())
+        if self._pending_handshake is not None:
+            self._pending_handshake.append(message.serialize_encrypted())
+        else:
+            self._send_all([message.serialize_encrypted()])
 
-    def _recv_message(self, message_type: Type[MessageBase], blocking: bool = True) -> Optional[MessageBase]:
-        '''Read and decrypt message from socket
+    @property
+    def handshake_pending(self) -> bool:
+        '''Whether the lazily connected handshake still waits for the first write.'''
+        return self._pending_handshake is not None
 
-        Arguments:
-            message_type -- Type of message to receive, data are loaded into it.
+    def _send_handshake(self, buffers: Sequence[bytes] = ()):
+        '''Write the pending handshake followed by `buffers`, connecting with TCP Fast Open if enabled.'''
+        buffers = [*self._pending_handshake, *buffers]
+        self._pending_handshake = None
 
-        Keyword Arguments:
-            blocking -- block until message received complete or socket EOF. (default: {True})
+        if self._fast_open_address is not None:
+            data = b''.join(buffers)
+            buffers = [memoryview(data)[self._fast_open(data):]]
+
+        self._send_all(buffers)
+
+    def _fast_open(self, data: bytes) -> int:
+        '''Connect with TCP Fast Open, sending `data` in the SYN if the server's cookie is known.
+
+        Races all addresses with Happy Eyeballs instead if Fast Open is not supported
+        (e.g. EOPNOTSUPP when disabled for clients) or the first address refuses.
+        Without a cookie, the SYN to the first address is the first attempt of the
+        race, the other addresses start after `CONNECTION_ATTEMPT_DELAY` and the
+        first to accept wins. Keeping the first attempt lets a slow server still
+        accept it and hand out its cookie for the next connections.
+
+        Raises:
+            OSError -- If no address accepts.
 
         Returns:
-            An `message_type` instance if loaded successfully.
+            Number of bytes of `data` sent.
         '''
-        while True:
-            if not self.eof: self._recv()
+        address, self._fast_open_address = self._fast_open_address, None
+        fallback, self._fast_open_fallback = self._fast_open_fallback, None
+        assert fallback is not None
+
+        start_time = time.perf_counter_ns()
+        try:
+            n_sent = self.connection.sendto(data, socket.MSG_FASTOPEN, address)
+        except BlockingIOError:
+            # No cookie yet: a plain SYN went out, `data` is sent once connected.
+            n_sent = 0
+            self._set_socket(self._connect(*fallback, in_progress=(self.connection, address)))
+        except OSError:
+            n_sent = 0
+            self._set_socket(self._connect(*fallback))
+        self.perf.send_syscalls += 1
+        self.perf.io_ns += time.perf_counter_ns() - start_time
+        return n_sent
+
+    def flush_handshake(self):
+        '''Write the pending handshake now, if any, e.g. when the server must speak first.'''
+        if self._pending_handshake is not None: self._send_handshake()
+
+    def _send_all(self, buffers: Sequence[bytes]):
+        '''Write all `buffers` to socket with as few vectored writes as possible.
+
+        Partial writes are resumed and the socket is waited for writability on EAGAIN,
+        so this returns only after every byte is handed to the OS. A timeout of 0 waits
+        as long as needed, a write cannot be left half done.
 
-            max_payload_size = (2 + self.cipher_parameters.chunk_size + 
-                                self.cipher_parameters.tag_size * 2)
-            payload_bytes = self.recv_buffer.as_bytes(max_payload_size)
-            message, n_consumed_bytes = message_type.try_load(self.downlink_cipher,
-                                                              self.cipher_parameters, 
-                                                              payload_bytes)
-            
-            if message:
-                if not (message_type is AEAD_SaltMessage):
-                    message.decrypt(self.downlink_cipher)
-                
-                self.recv_buffer.read(n_consumed_bytes)
-                return message
-            elif not blocking or self.eof:
-                return None
+        Raises:
+            socket.timeout -- If the socket stayed unwritable past `timeout`, the
+                              stream is then broken and the connection should be closed.
+        '''
+        pending = deque(memoryview(buffer).cast('B') for buffer in buffers if len(buffer))
+        timeout_checker = TimeoutChecker(self.timeout if self.timeout != 0 else None)
+        use_sendmsg = hasattr(self.connection, 'sendmsg')
+        perf = self.perf
+
+        while pending:
+            start_time = time.perf_counter_ns()
+            try:
+                if use_sendmsg:
+                    n_sent = self.connection.sendmsg(list(pending)[:MAX_IOVEC])
+                else:
+                    n_sent = self.connection.send(pending[0])
+            except BlockingIOError:
+                n_sent = None
+            perf.send_syscalls += 1
+            perf.io_ns += time.perf_counter_ns() - start_time
+
+            if n_sent is None:
+                if not self._write_selector.select(timeout_checker.remaining()):
+                    raise socket.timeout('send timed out')
+                continue
+
+            while n_sent:
+                if n_sent >= len(pending[0]):
+                    n_sent -= len(pending.popleft())
+                else:
+                    pending[0] = pending[0][n_sent:]
+                    n_sent = 0
+
+    def wait_readable(self, timeout: Optional[Timeout] = None) -> bool:
+        '''Block until the socket is readable, for layers reading through `recv` in non-blocking mode.
+
+        Keyword Arguments:
+            timeout -- Seconds to wait at most, None to wait forever. (default: {None})
+
+        Returns:
+            Whether the socket became readable before timeout expired.
+        '''
+        return len(self._selector.select(timeout)) != 0
 
     def _recv(self):
         '''Read all available data from OS buffer'''
+        perf = self.perf
+        start_time = time.perf_counter_ns()
+
         while True:
+            perf.recv_syscalls += 1
             try:
-                received = self.connection.recv(1024)
+                n_received = self.recv_buffer.recv_into(self.connection)
                 
-                if len(received) == 0: 
+                if n_received == 0: 
                     self.eof = True
-                    return
-                
-                self.recv_buffer.write(received)
+                    break
 
             except BlockingIOError:
                 # No currently available data in OS buffer
                 break
 
-    def send(self, data: bytes):
-        '''Send plaintext data.'''
-
-        chunk_size = self.cipher_parameters.chunk_size
-        for chunk_start_idx in range(0, len(data), chunk_size):
-            chunk = data[chunk_start_idx: chunk_start_idx + chunk_size]
-            self._send_message(AEAD_PayloadMessage(
-                self.cipher_parameters,
-                chunk
-            ))
-    
-    def _try_init_downlink_cipher(self, timeout_checker: TimeoutChecker) -> bool:
-        '''Try receive salt message and init downlink cipher.
+        perf.io_ns += time.perf_counter_ns() - start_time
+        perf.recv_buffer_high_water = max(perf.recv_buffer_high_water, len(self.recv_buffer))
 
-        Arguments:
-            timeout -- Receive salt timeout.
+    def send(self, data: bytes):
+        '''Send plaintext data.
 
         Raises:
-            socket.timeout -- If timeout expired.
+            socket.timeout -- If the server did not take the data within `timeout`.
+        '''
+
+        batch_size = self.cipher_parameters.chunk_size * SEND_BATCH_CHUNKS
+        data = memoryview(data).cast('B')
+        # Grown to the largest batch sent so far, connections of small writes keep a small buffer.
+        buffer_size = self.uplink_cipher.encrypted_size(min(len(data), batch_size))
+        if self._send_buffer is None or len(self._send_buffer) < buffer_size:
+            self._send_buffer = memoryview(bytearray(buffer_size))
+        for batch_start_idx in range(0, len(data), batch_size):
+            batch = data[batch_start_idx: batch_start_idx + batch_size]
+            n_encrypted = self.encrypt_into(batch, self._send_buffer)
+            if self._pending_handshake is not None:
+                self._send_handshake([self._send_buffer[:n_encrypted]])
+            else:
+                self._send_all([self._send_buffer[:n_encrypted]])
+
+    def encrypt_into(self, data: bytes, output: memoryview) -> int:
+        '''Encrypt plaintext `data` into `output` without sending it.
+
+        For callers driving the socket themselves, the result must be written to
+        `connection` in order and completely.
 
         Returns:
-            Whether cipher initiated successfully.
+            Number of bytes written to `output`, `uplink_cipher.encrypted_size(len(data))`.
         '''
-
-        blocking = self.timeout != 0
-            
-        while True:
-            message = self._recv_message(AEAD_SaltMessage, blocking=False)
-            if isinstance(message, AEAD_SaltMessage):
-                self._init_downlink_cipher(message.salt)
-                return True
-            
-            if not blocking:
-                return False
-            elif timeout_checker.timeout_expired():
-                raise socket.timeout
+        perf = self.perf
+        start_time = time.perf_counter_ns()
+        n_encrypted = self.uplink_cipher.encrypt_into(data, output, self._bulk_executor)
+        perf.crypto_ns += time.perf_counter_ns() - start_time
+
+        perf.uplink_bytes += len(data)
+        perf.uplink_chunks += -(-len(data) // self.cipher_parameters.chunk_size)
+        return n_encrypted
     
-    def settimeout(self, timeout: Timeout):
+    def set_bulk_mode(self, executor: Optional[Executor]):
+        '''Spread chunk encryption and decryption of large transfers across `executor`.
+
+        The crypto backends release the GIL, so a `ThreadPoolExecutor` lets several
+        cores work on one tunnel. The executor is not shut down by `close`.
+
+        Arguments:
+            executor -- Executor running the chunk crypto, None to disable bulk mode.
+        '''
+
+        self._bulk_executor = executor
+
+    def settimeout(self, timeout: Optional[Timeout]):
         '''Set socket timeout.
 
         Arguments:
-            timeout -- 0 for non-blocking, non-negtive numeric for timeout in seconds.
+            timeout -- 0 for non-blocking, None for blocking, non-negtive numeric for timeout in seconds.
         '''
 
         self.timeout = timeout
@@ -169,24 +370,66 @@ class Connection:
             The received data.
         '''
 
+        if self._pending_handshake is not None: self._send_handshake()
+
         timeout_checker = TimeoutChecker(self.timeout)
         blocking = self.timeout != 0
 
-        if (not self.downlink_cipher.key_initiated 
-            and not self._try_init_downlink_cipher(timeout_checker)):
-            # Non-blocking mode and salt not received.
-            return b''
+        while not self.decryted_buffer:
+            if not self.eof: self._recv()
+            self._decode()
 
-        while not self.decryted_buffer and not self.eof:
-            if timeout_checker.timeout_expired():
+            if self.decryted_buffer or self.eof or not blocking: break
+            if not self.wait_readable(timeout_checker.remaining()):
                 raise socket.timeout()
 
-            message = self._recv_message(AEAD_PayloadMessage, blocking=False)
-            if isinstance(message, AEAD_PayloadMessage): 
-                self.decryted_buffer.write(message.chunk)
-            if not blocking: break
-
         return self.decryted_buffer.read(buffer_size)
+
+    def _decode(self):
+        '''Decrypt every complete chunk of `recv_buffer` into `decryted_buffer`.'''
+        perf = self.perf
+        start_time = time.perf_counter_ns()
+        try:
+            chunks = self.downlink_decoder.decode_all(self.recv_buffer, self._bulk_executor)
+        except ValueError:
+            perf.mac_failures += 1
+            raise
+        finally:
+            perf.crypto_ns += time.perf_counter_ns() - start_time
+
+        for chunk in chunks:
+            perf.downlink_bytes += len(chunk)
+            self.decryted_buffer.write(chunk)
+        perf.downlink_chunks += len(chunks)
+        perf.decrypted_buffer_high_water = max(perf.decrypted_buffer_high_water, len(self.decryted_buffer))
             
+    def at_eof(self) -> bool:
+        '''Return whether the server closed the tunnel and all received data was read.'''
+        return self.eof and not self.decryted_buffer
+
+    def is_alive(self) -> bool:
+        '''Return whether the server has not closed or reset the connection, without reading from it.
+
+        Data the server already sent, such as its salt, is left for `recv`.
+        '''
+        if self.eof: return False
+        try:
+            return len(self.connection.recv(1, socket.MSG_PEEK)) != 0
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    def fileno(self) -> int:
+        return self.connection.fileno()
+
+    def shutdown_write(self):
+        '''Close the write end, the server then closes the write end to the target.'''
+        self.flush_handshake()
+        self.connection.shutdown(socket.SHUT_WR)
+
     def close(self):
-        self.connection.close()
\ No newline at end of file
+        self._selector.close()
+        self._write_selector.close()
+        self.connection.close()
+        registry.retire(self.perf)
\ No newline at end of file
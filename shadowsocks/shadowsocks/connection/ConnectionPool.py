@@ -0,0 +1,158 @@
+import threading
+import time
+
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from .Connection import Connection
+
+
+class ConnectionPool:
+    '''Pool of connections to one Shadowsocks server, prepared ahead of use.
+
+    Idle connections already have the TCP handshake done, the uplink cipher
+    initiated and the salt sent, so `acquire` only has to send the target
+    address. A connection is handed out once and never returned to the pool,
+    because a tunnel is bound to its target.
+    '''
+
+    def __init__(self,
+                 SS_addr: str,
+                 SS_port: int,
+                 password: str,
+                 cipher_name: str,
+                 max_size: int = 8,
+                 max_idle_time: float = 30,
+                 health_check_interval: Optional[float] = 5,
+                 crypto_backend: Optional[str] = None):
+        '''Constructor
+
+        Arguments:
+            SS_addr, SS_port, password, cipher_name -- Passed to `Connection`.
+
+        Keyword Arguments:
+            max_size -- Maximum number of idle connections kept warm. (default: {8})
+            max_idle_time -- Seconds after which an idle connection is closed, should be
+                             shorter than the server's idle timeout. (default: {30})
+            health_check_interval -- Seconds between background eviction and refill,
+                                     None to disable the background thread. (default: {5})
+            crypto_backend -- Passed to `Connection`. (default: {None})
+        '''
+
+        self.SS_addr = SS_addr
+        self.SS_port = SS_port
+        self.password = password
+        self.cipher_name = cipher_name
+        self.crypto_backend = crypto_backend
+
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+
+        self.hits = 0
+        self.misses = 0
+
+        # (connection, time it became idle), newest at the right.
+        self._idle: Deque[Tuple[Connection, float]] = deque()
+        self._n_creating = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._wakeup = threading.Event()
+        self._maintainer: Optional[threading.Thread] = None
+        if health_check_interval is not None:
+            self._maintainer = threading.Thread(target=self._maintain_loop,
+                                                args=(health_check_interval, ),
+                                                daemon=True)
+            self._maintainer.start()
+
+    def _new_connection(self) -> Connection:
+        return Connection(self.SS_addr,
+                          self.SS_port,
+                          self.password,
+                          self.cipher_name,
+                          crypto_backend=self.crypto_backend)
+
+    def acquire(self, target_addr: str, target_port: int) -> Connection:
+        '''Return a connection with a tunnel to `target_addr`:`target_port`.
+
+        Uses a warm connection if a healthy one is idle, otherwise connects directly.
+        '''
+        now = time.monotonic()
+
+        while True:
+            with self._lock:
+                if not self._idle: break
+                connection, idle_since = self._idle.pop()
+
+            if now - idle_since <= self.max_idle_time and connection.is_alive():
+                with self._lock: self.hits += 1
+                self._wakeup.set()
+                connection.connect_target(target_addr, target_port)
+                return connection
+            connection.close()
+
+        with self._lock: self.misses += 1
+        self._wakeup.set()
+        connection = self._new_connection()
+        connection.connect_target(target_addr, target_port)
+        return connection
+
+    def fill(self):
+        '''Open connections until `max_size` are idle.'''
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) + self._n_creating >= self.max_size: return
+                self._n_creating += 1
+
+            try:
+                connection = self._new_connection()
+            except OSError:
+                return
+            finally:
+                with self._lock: self._n_creating -= 1
+
+            with self._lock:
+                if self._closed:
+                    connection.close()
+                    return
+                self._idle.append((connection, time.monotonic()))
+
+    def evict(self):
+        '''Close idle connections which expired or were closed by the server.'''
+        now = time.monotonic()
+
+        with self._lock:
+            candidates = list(self._idle)
+            self._idle.clear()
+
+        alive = []
+        for connection, idle_since in candidates:
+            if now - idle_since <= self.max_idle_time and connection.is_alive():
+                alive.append((connection, idle_since))
+            else:
+                connection.close()
+
+        with self._lock:
+            # Keep the order by idle time, connections added meanwhile are newer.
+            self._idle.extendleft(reversed(alive))
+
+    def _maintain_loop(self, interval: float):
+        while not self._closed:
+            self.evict()
+            self.fill()
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def __len__(self):
+        '''Return number of idle connections.'''
+        return len(self._idle)
+
+    def close(self):
+        '''Close all idle connections and stop the background thread.'''
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+
+        self._wakeup.set()
+        for connection, _ in idle: connection.close()
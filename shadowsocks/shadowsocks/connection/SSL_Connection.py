@@ -1,5 +1,6 @@
 from .Connection import Connection, Timeout
-from ..utils.ByteBuffer import ByteBuffer
+from .TLS_SessionCache import TLS_SessionCache
+from ..utils.TimeoutChecker import TimeoutChecker
 
 import ssl
 import time
@@ -8,11 +9,25 @@ from typing import Optional, Callable, Dict, Any, TypeVar
 
 SSL_Fn_Return_Type = TypeVar('SSL_Fn_Return_Type')
 
+# Upper bound of tunnel plaintext moved into the incoming BIO per read.
+BIO_READ_SIZE = 256 * 1024
+
 class SSL_Connection:
     def __init__(self, 
                  connection: Connection, 
                  target_hostname: str, 
-                 ssl_context: Optional[ssl.SSLContext] = None):
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 session_cache: Optional[TLS_SessionCache] = None):
+        '''Constructor
+
+        Arguments:
+            connection -- Shadowsocks connection to the target.
+            target_hostname -- Hostname the certificate is verified against.
+
+        Keyword Arguments:
+            ssl_context -- Context of the TLS client, a verifying default context if None, the one of `session_cache` if given. (default: {None})
+            session_cache -- Cache to resume TLS sessions of `target_hostname` from and store them to. (default: {None})
+        '''
         
         self.eof = False
 
@@ -21,54 +36,99 @@ class SSL_Connection:
 
         self.downlink_buffer = ssl.MemoryBIO() # conn -> ssl_obj
         self.uplink_buffer = ssl.MemoryBIO() # ssl_obj -> conn
-        self.recv_buffer = ByteBuffer() # ssl_obj -> user_app
 
-        if ssl_context is None:
+        if ssl_context is None and session_cache is not None:
+            ssl_context = session_cache.default_context
+        elif ssl_context is None:
             ssl_context = ssl.create_default_context()
             ssl_context.verify_mode = ssl.CERT_REQUIRED
             ssl_context.check_hostname = True
 
+        self.target_hostname = target_hostname
+        self.ssl_context = ssl_context
+        self.session_cache = session_cache
+        # Whether a session with a ticket is stored, TLS 1.3 tickets arrive after the handshake.
+        self._session_stored = session_cache is None
+
         self.ssl_object = ssl_context.wrap_bio(
             incoming=self.downlink_buffer,
             outgoing=self.uplink_buffer,
             server_hostname=target_hostname,
+            session=None if session_cache is None else session_cache.get(target_hostname, ssl_context),
         )
 
+        handshake_start_ns = time.perf_counter_ns()
         self._ssl_io_wrapper(None, self.ssl_object.do_handshake)
+        if connection.tracer is not None:
+            connection.tracer.emit('ssl_handshake', connection.trace_id, handshake_start_ns)
+
+        self.session_reused = self.ssl_object.session_reused
+        self._store_session()
+
+    def _store_session(self):
+        '''Put the session into the session cache once it can be resumed.'''
+        if self._session_stored: return
+
+        session = self.ssl_object.session
+        if session is None or not session.has_ticket: return
+        self.session_cache.put(self.target_hostname, self.ssl_context, session)
+        self._session_stored = True
 
     def _ssl_io_wrapper(self, 
                         timeout: Optional[Timeout],
                         func: Callable[..., SSL_Fn_Return_Type], 
                         *args: Any,
                         **kwargs: Any) -> Optional[SSL_Fn_Return_Type]:
-        
-        
-        blocking = timeout is None
-        timeout_expired = False
-        start_time = time.time()
+        '''Run `func` of the SSL object, moving TLS data between the BIOs and the tunnel as it needs.
 
-        while not timeout_expired:
+        Returns:
+            Result of `func`, None if timeout expired or the tunnel reached EOF first.
+        '''
+
+        timeout_checker = TimeoutChecker(timeout)
+
+        while True:
             try:
-                return func(*args, **kwargs)
-            
+                result = func(*args, **kwargs)
             except ssl.SSLWantReadError: # conn -> ssl_obj
-                if self.connection.eof: break
-         
-                downlink_data = self.connection.recv(1024)
-                self.downlink_buffer.write(downlink_data)
+                self._flush()
+                if not self._fill(timeout_checker): return None
+                continue
+            except ssl.SSLWantWriteError: # ssl_obj -> conn
+                self._flush()
+                continue
+            except (ssl.SSLZeroReturnError, ssl.SSLEOFError):
+                self.eof = True
+                return None
 
-                if self.connection.eof: self.eof = True
+            self._flush()
+            return result
+
+    def _flush(self):
+        '''Send pending outgoing TLS data, if any.'''
+        if self.uplink_buffer.pending:
+            self.connection.send(self.uplink_buffer.read())
+
+    def _fill(self, timeout_checker: TimeoutChecker) -> bool:
+        '''Move all TLS data the tunnel has decrypted into the incoming BIO, waiting for some if allowed.
+
+        Returns:
+            Whether the BIO got new data or EOF, False if timeout expired first.
+        '''
+        while True:
+            filled = False
+            while True:
+                data = self.connection.recv(BIO_READ_SIZE)
+                if not data: break
+                self.downlink_buffer.write(data)
+                filled = True
+
+            if filled: return True
+            if self.connection.at_eof():
+                self.downlink_buffer.write_eof()
+                return True
+            if not self.connection.wait_readable(timeout_checker.remaining()): return False
 
-            except ssl.SSLWantWriteError: # ssl_obj -> conn
-                # caused by uplink_buffer is full
-                pass
-
-            uplink_data = self.uplink_buffer.read()
-            self.connection.send(uplink_data)
-            
-            if not blocking:
-                timeout_expired = (time.time() - start_time) > timeout
-                
     def send(self, data: bytes):
         '''Send plaintext data.'''
         self._ssl_io_wrapper(None, self.ssl_object.write, data)
@@ -76,25 +136,38 @@ class SSL_Connection:
     def recv(self, length: int, timeout: Optional[Timeout] = None) -> bytes:
         '''Receive SS and SSL decrypted message.
 
-        Note that in non-blocking mode, to return data as soon as possible, at most one unit of SSL data is decrypted.
+        Waits until some plaintext is available, then returns all plaintext that can be
+        decrypted from data already received, up to `length` bytes.
 
         Arguments:
-            length -- the length of message to read
+            length -- the maximum length of message to read
 
         Keyword Arguments:
             timeout -- receive timeout (default: {None})
-                * None: block until receive enough length or connection closed.
+                * None: block until some data is received or connection closed.
                 * 0: non-blocking.
                 * Non-negative float: receive duration in seconds.
 
         Returns:
-            Decrypted message.
+            Decrypted message, b'' on EOF or if timeout expired.
         '''
-        received = self._ssl_io_wrapper(timeout, 
-                                        self.ssl_object.read, 
-                                        length, None)
-        
-        return received if received else b''
+        received = self._ssl_io_wrapper(timeout, self.ssl_object.read, length)
+        if not self._session_stored: self._store_session()
+        if received is None: return b''
+        if not received:
+            # TLS was shut down cleanly.
+            self.eof = True
+            return b''
+
+        chunks = [received]
+        n_received = len(received)
+        while n_received < length:
+            more = self._ssl_io_wrapper(0, self.ssl_object.read, length - n_received)
+            if not more: break
+            chunks.append(more)
+            n_received += len(more)
+
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
 
     def close(self):
         self.connection.close()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import ssl
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class TLS_SessionCache:
+    '''LRU cache of TLS sessions keyed by hostname, for abbreviated handshakes.
+
+    A session is only handed out with the `ssl.SSLContext` it was created by,
+    connections without a context of their own share `default_context`.
+    Entries expire after `ttl` seconds or the lifetime announced by the server,
+    whichever is shorter. Safe to share across threads.
+    '''
+
+    def __init__(self, max_size: int = 256, ttl: float = 3600):
+        '''Constructor
+
+        Keyword Arguments:
+            max_size -- Maximum number of hostnames kept, least recently used are evicted. (default: {256})
+            ttl -- Maximum age of a session in seconds. (default: {3600})
+        '''
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # hostname -> (context, session, expire time)
+        self._sessions: 'OrderedDict[str, Tuple[ssl.SSLContext, ssl.SSLSession, float]]' = OrderedDict()
+        self._default_context: Optional[ssl.SSLContext] = None
+        self._lock = threading.Lock()
+
+    @property
+    def default_context(self) -> ssl.SSLContext:
+        '''Verifying client context, created on first use and shared so its sessions can be resumed.'''
+        with self._lock:
+            if self._default_context is None:
+                self._default_context = ssl.create_default_context()
+            return self._default_context
+
+    def get(self, hostname: str, ssl_context: ssl.SSLContext) -> Optional[ssl.SSLSession]:
+        '''Return a resumable session for `hostname` created by `ssl_context`, or None.'''
+        with self._lock:
+            entry = self._sessions.get(hostname)
+            if entry is not None:
+                context, session, expire_time = entry
+                if time.time() >= expire_time:
+                    del self._sessions[hostname]
+                    self.evictions += 1
+                elif context is ssl_context:
+                    self._sessions.move_to_end(hostname)
+                    self.hits += 1
+                    return session
+
+            self.misses += 1
+            return None
+
+    def put(self, hostname: str, ssl_context: ssl.SSLContext, session: ssl.SSLSession):
+        '''Store `session` of `hostname`, replacing the previous one.'''
+        expire_time = min(time.time() + self.ttl, session.time + session.timeout)
+
+        with self._lock:
+            self._sessions[hostname] = (ssl_context, session, expire_time)
+            self._sessions.move_to_end(hostname)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, hostname: str):
+        '''Forget the session of `hostname`, e.g. after the server refused to resume it.'''
+        with self._lock: self._sessions.pop(hostname, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._sessions),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def __len__(self):
+        return len(self._sessions)
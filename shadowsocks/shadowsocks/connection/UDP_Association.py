@@ -0,0 +1,70 @@
+import socket
+
+from typing import Optional, Tuple
+
+from ..cipher.CipherParamerters import supported_cipher_parameters
+from ..message.AEAD import AEAD_UDP_Codec
+from ..utils.socks_addr import encode_address, from_socks5_addr
+from ..utils.TimeoutChecker import Timeout
+
+MAX_DATAGRAM_SIZE = 65535
+
+
+class UDP_Association:
+    '''Blocking client of Shadowsocks AEAD UDP relay.
+
+    Every datagram is sent to the server as one packet carrying its own salt.
+    '''
+
+    def __init__(self, 
+                 SS_addr: str, 
+                 SS_port: int,
+                 password: str,
+                 cipher_name: str,
+                 crypto_backend: Optional[str] = None):
+        
+        if cipher_name not in supported_cipher_parameters: 
+            raise ValueError(f'cipher_name "{cipher_name}" not supported, should be one of {list(supported_cipher_parameters.keys())}')
+        
+        self.cipher_parameters = supported_cipher_parameters[cipher_name]
+        if crypto_backend is not None:
+            self.cipher_parameters = self.cipher_parameters.with_backend(crypto_backend)
+        
+        self.codec = AEAD_UDP_Codec(self.cipher_parameters, password)
+        self.n_dropped = 0
+
+        family, _, _, _, server_addr = socket.getaddrinfo(SS_addr, SS_port, type=socket.SOCK_DGRAM)[0]
+        self.connection = socket.socket(family, socket.SOCK_DGRAM)
+        self.connection.connect(server_addr)
+
+    def sendto(self, data: bytes, address: Tuple[str, int]):
+        '''Send `data` to `address` through the server.'''
+        self.connection.send(self.codec.encrypt((encode_address(*address), data)))
+
+    def recvfrom(self) -> Tuple[bytes, Tuple[str, int]]:
+        '''Receive one datagram, packets failing authentication are dropped.
+
+        Raises:
+            socket.timeout -- If timeout expired.
+
+        Returns:
+            (data, (source_host, source_port))
+        '''
+        while True:
+            packet = self.connection.recv(MAX_DATAGRAM_SIZE)
+            try:
+                payload = self.codec.decrypt(packet)
+                _, host, port, n_consumed_bytes = from_socks5_addr(payload)
+            except ValueError:
+                self.n_dropped += 1
+                continue
+            return payload[n_consumed_bytes:], (host, port)
+
+    def settimeout(self, timeout: Optional[Timeout]):
+        self.connection.settimeout(timeout)
+
+    def fileno(self) -> int:
+        return self.connection.fileno()
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,187 @@
+import asyncio
+import socket
+import time
+
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from ..message.AEAD import AEAD_UDP_Codec
+
+MAX_DATAGRAM_SIZE = 65535
+# Maximum datagrams read from one socket per event loop wakeup.
+DEFAULT_BATCH_SIZE = 64
+
+# Socket address as returned by `recvfrom`, (host, port) or (host, port, flowinfo, scope_id).
+Address = Tuple
+
+
+class _Association:
+    def __init__(self, client_addr: Address, upstream: socket.socket):
+        self.client_addr = client_addr
+        self.upstream = upstream
+        self.last_active = time.monotonic()
+
+
+class UDP_Relay:
+    '''SOCKS5 UDP relay forwarding datagrams through a Shadowsocks AEAD UDP server.
+
+    Client datagrams are `[RSV][FRAG][address][data]`, the `[address][data]` part
+    is exactly the AEAD UDP payload, so it is encrypted without re-encoding. Each
+    client address gets its own upstream socket to route replies back.
+
+    Sockets are read in batches of up to `batch_size` datagrams per wakeup and
+    written without waiting, datagrams that cannot be sent are dropped.
+
+    Batches need readiness callbacks, so the relay runs on event loops with
+    `add_reader`: selector loops such as the default loop of POSIX systems, not
+    the proactor loop Windows uses by default, where `start` raises
+    NotImplementedError.
+    '''
+
+    def __init__(self,
+                 SS_addr: str,
+                 SS_port: int,
+                 codec: AEAD_UDP_Codec,
+                 listen_addr: str = '127.0.0.1',
+                 listen_port: int = 0,
+                 idle_timeout: float = 60,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+
+        self.SS_addr = SS_addr
+        self.SS_port = SS_port
+        self.codec = codec
+        self.listen_addr = listen_addr
+        self.listen_port = listen_port
+        self.idle_timeout = idle_timeout
+        self.batch_size = batch_size
+
+        self.uplink_packets = 0
+        self.downlink_packets = 0
+        self.dropped_packets = 0
+
+        self._allowed_hosts: Counter = Counter()
+        self._associations: Dict[Address, _Association] = {}
+        self._server_addr: Optional[Address] = None
+        self._server_family = socket.AF_INET
+        self._socket: Optional[socket.socket] = None
+        self._sweeper: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        family, _, _, _, self._server_addr = (await self._loop.getaddrinfo(
+            self.SS_addr, self.SS_port, type=socket.SOCK_DGRAM))[0]
+        self._server_family = family
+
+        listen_family = socket.AF_INET6 if ':' in self.listen_addr else socket.AF_INET
+        self._socket = socket.socket(listen_family, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind((self.listen_addr, self.listen_port))
+        self.listen_port = self._socket.getsockname()[1]
+
+        try:
+            self._loop.add_reader(self._socket, self._on_client_readable)
+        except NotImplementedError:
+            self._socket.close()
+            self._socket = None
+            raise NotImplementedError('UDP_Relay needs an event loop with add_reader, e.g. asyncio.SelectorEventLoop') from None
+        self._sweeper = self._loop.call_later(self.idle_timeout, self._sweep)
+
+    def allow(self, host: str):
+        '''Accept datagrams from `host`, called once per SOCKS5 UDP ASSOCIATE.'''
+        self._allowed_hosts[host] += 1
+
+    def disallow(self, host: str):
+        '''Revert one `allow` call.'''
+        self._allowed_hosts[host] -= 1
+        if self._allowed_hosts[host] <= 0: del self._allowed_hosts[host]
+
+    def _on_client_readable(self):
+        assert self._socket is not None
+        for _ in range(self.batch_size):
+            try:
+                datagram, client_addr = self._socket.recvfrom(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+            self._relay_uplink(datagram, client_addr)
+
+    def _relay_uplink(self, datagram: bytes, client_addr: Address):
+        # Fragmentation is not supported, FRAG must be 0.
+        if (len(datagram) < 4 or datagram[2] != 0 
+            or client_addr[0] not in self._allowed_hosts):
+            self.dropped_packets += 1
+            return
+
+        association = self._associations.get(client_addr)
+        if association is None:
+            association = self._new_association(client_addr)
+
+        association.last_active = time.monotonic()
+        try:
+            association.upstream.send(self.codec.encrypt((memoryview(datagram)[3:], )))
+            self.uplink_packets += 1
+        except OSError:
+            self.dropped_packets += 1
+
+    def _new_association(self, client_addr: Address) -> _Association:
+        assert self._loop is not None
+        upstream = socket.socket(self._server_family, socket.SOCK_DGRAM)
+        upstream.setblocking(False)
+        upstream.connect(self._server_addr)
+
+        association = _Association(client_addr, upstream)
+        self._associations[client_addr] = association
+        self._loop.add_reader(upstream, self._on_upstream_readable, association)
+        return association
+
+    def _on_upstream_readable(self, association: _Association):
+        assert self._socket is not None
+        for _ in range(self.batch_size):
+            try:
+                packet = association.upstream.recv(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+
+            try:
+                payload = self.codec.decrypt(packet)
+            except ValueError:
+                self.dropped_packets += 1
+                continue
+
+            association.last_active = time.monotonic()
+            try:
+                self._socket.sendto(b'\x00\x00\x00' + payload, association.client_addr)
+                self.downlink_packets += 1
+            except OSError:
+                self.dropped_packets += 1
+
+    def _close_association(self, association: _Association):
+        assert self._loop is not None
+        self._loop.remove_reader(association.upstream)
+        association.upstream.close()
+        del self._associations[association.client_addr]
+
+    def _sweep(self):
+        assert self._loop is not None
+        now = time.monotonic()
+        for association in list(self._associations.values()):
+            if now - association.last_active > self.idle_timeout:
+                self._close_association(association)
+        self._sweeper = self._loop.call_later(self.idle_timeout, self._sweep)
+
+    def __len__(self):
+        '''Return number of active associations.'''
+        return len(self._associations)
+
+    def close(self):
+        if self._sweeper is not None: self._sweeper.cancel()
+        for association in list(self._associations.values()):
+            self._close_association(association)
+        if self._socket is not None and self._loop is not None:
+            self._loop.remove_reader(self._socket)
+            self._socket.close()
+            self._socket = None
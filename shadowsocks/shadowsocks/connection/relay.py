@@ -0,0 +1,192 @@
+import selectors
+import socket
+import time
+
+from typing import Optional
+
+from .Connection import Connection
+from ..utils.TimeoutChecker import Timeout
+
+# Plaintext read from the local socket per uplink step, 16 full AEAD chunks.
+DEFAULT_RELAY_BUFFER_SIZE = 16 * 0x3FFF
+# Seconds a lazily connected tunnel waits for local data to write with its handshake,
+# before sending the handshake alone for targets which speak first.
+LAZY_CONNECT_WAIT = 0.05
+
+
+class RelayStats:
+    '''Bytes moved by `relay`, updated while it runs.'''
+
+    def __init__(self):
+        self.uplink_bytes = 0
+        self.downlink_bytes = 0
+        self.start_time = time.monotonic()
+        self.end_time: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        end_time = self.end_time if self.end_time is not None else time.monotonic()
+        return end_time - self.start_time
+
+    def __repr__(self):
+        return (f'RelayStats(uplink_bytes={self.uplink_bytes}, '
+                f'downlink_bytes={self.downlink_bytes}, duration={self.duration:.3f})')
+
+
+def _send_pending(sock: socket.socket, pending: memoryview) -> memoryview:
+    '''Write as much of `pending` as `sock` accepts now, return the unsent rest.'''
+    try:
+        n_sent = sock.send(pending)
+    except BlockingIOError:
+        return pending
+    return pending[n_sent:]
+
+
+def relay(local_sock: socket.socket,
+          conn: Connection,
+          buffer_size: int = DEFAULT_RELAY_BUFFER_SIZE,
+          idle_timeout: Optional[Timeout] = None,
+          stats: Optional[RelayStats] = None) -> RelayStats:
+    '''Copy data between `local_sock` and `conn` in both directions until both reach EOF.
+
+    Both directions run concurrently on one selector. Each direction holds at most
+    one buffer of data in flight, and stops reading its source until the
+    destination has taken it, so a slow side throttles the other instead of
+    growing memory. EOF from one side is forwarded as a write shutdown to the
+    other while the opposite direction keeps running.
+
+    If `conn` was created with `lazy_connect`, the first data of `local_sock` is
+    written together with its handshake.
+
+    The sockets are left open, close them after `relay` returns or raises.
+
+    Arguments:
+        local_sock -- Connected application socket.
+        conn -- Tunnel with its target already sent or pending.
+
+    Keyword Arguments:
+        buffer_size -- Plaintext bytes read from `local_sock` per step. (default: {16 AEAD chunks})
+        idle_timeout -- Seconds without progress in either direction before giving up,
+                        None to wait forever. (default: {None})
+        stats -- Object to update, useful to read partial counts when an error is raised. (default: {new RelayStats})
+
+    Raises:
+        socket.timeout -- If `idle_timeout` expired.
+        OSError -- On socket errors of either side.
+        ValueError -- If data from the server fails authentication.
+
+    Returns:
+        Bytes moved in each direction.
+    '''
+
+    if stats is None: stats = RelayStats()
+
+    plaintext = memoryview(bytearray(buffer_size))
+    ciphertext = memoryview(bytearray(conn.uplink_cipher.encrypted_size(buffer_size)))
+
+    uplink_pending = ciphertext[:0]
+    downlink_pending = memoryview(b'')
+    local_eof = False
+    uplink_done = False
+    downlink_done = False
+
+    local_timeout = local_sock.gettimeout()
+    conn_timeout = conn.timeout
+    local_sock.setblocking(False)
+    conn.settimeout(0)
+
+    if conn.handshake_pending:
+        # The handshake is written before `conn.connection` is watched, since a TCP
+        # Fast Open fallback replaces the socket. It goes alone if no data comes in time.
+        with selectors.DefaultSelector() as first_data_selector:
+            first_data_selector.register(local_sock, selectors.EVENT_READ)
+            first_data_selector.select(LAZY_CONNECT_WAIT)
+        try:
+            n_received = local_sock.recv_into(plaintext)
+        except BlockingIOError:
+            n_received = None
+
+        if n_received:
+            stats.uplink_bytes += n_received
+            conn.send(plaintext[:n_received])
+        else:
+            conn.flush_handshake()
+            local_eof = n_received == 0
+
+    selector = selectors.DefaultSelector()
+    selector.register(local_sock, selectors.EVENT_READ)
+    selector.register(conn.connection, selectors.EVENT_READ)
+    masks = {local_sock: selectors.EVENT_READ, conn.connection: selectors.EVENT_READ}
+
+    def set_mask(sock: socket.socket, mask: int):
+        if masks[sock] == mask: return
+        if masks[sock] == 0:
+            selector.register(sock, mask)
+        elif mask == 0:
+            selector.unregister(sock)
+        else:
+            selector.modify(sock, mask)
+        masks[sock] = mask
+
+    try:
+        while not (uplink_done and downlink_done):
+            # Uplink: local_sock -> plaintext -> ciphertext -> conn.
+            if not uplink_pending and not local_eof:
+                try:
+                    n_received = local_sock.recv_into(plaintext)
+                except BlockingIOError:
+                    n_received = None
+
+                if n_received == 0:
+                    local_eof = True
+                elif n_received:
+                    stats.uplink_bytes += n_received
+                    n_encrypted = conn.encrypt_into(plaintext[:n_received], ciphertext)
+                    uplink_pending = ciphertext[:n_encrypted]
+
+            if uplink_pending:
+                start_time = time.perf_counter_ns()
+                uplink_pending = _send_pending(conn.connection, uplink_pending)
+                conn.perf.send_syscalls += 1
+                conn.perf.io_ns += time.perf_counter_ns() - start_time
+
+            if local_eof and not uplink_pending and not uplink_done:
+                conn.shutdown_write()
+                uplink_done = True
+
+            # Downlink: conn -> decrypted buffer -> local_sock.
+            if not downlink_pending and not downlink_done:
+                data = conn.recv(buffer_size)
+                if data:
+                    stats.downlink_bytes += len(data)
+                    downlink_pending = memoryview(data)
+                elif conn.at_eof():
+                    local_sock.shutdown(socket.SHUT_WR)
+                    downlink_done = True
+
+            if downlink_pending:
+                downlink_pending = _send_pending(local_sock, downlink_pending)
+                # More plaintext may be decrypted already, the socket will not signal it.
+                if not downlink_pending and conn.decryted_buffer: continue
+
+            local_mask = ((0 if uplink_pending or local_eof else selectors.EVENT_READ)
+                          | (selectors.EVENT_WRITE if downlink_pending else 0))
+            conn_mask = ((0 if downlink_pending or downlink_done else selectors.EVENT_READ)
+                         | (selectors.EVENT_WRITE if uplink_pending else 0))
+            set_mask(local_sock, local_mask)
+            set_mask(conn.connection, conn_mask)
+
+            if (uplink_done and downlink_done) or not (local_mask or conn_mask): break
+            if not selector.select(idle_timeout):
+                raise socket.timeout('relay idle timeout expired')
+
+    finally:
+        stats.end_time = time.monotonic()
+        selector.close()
+        conn.settimeout(conn_timeout)
+        try:
+            local_sock.settimeout(local_timeout)
+        except OSError:
+            pass
+
+    return stats
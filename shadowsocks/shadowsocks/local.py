@@ -0,0 +1,306 @@
+'''Local SOCKS5 server forwarding CONNECT and UDP ASSOCIATE requests through a Shadowsocks server.
+
+Usage: python -m shadowsocks.local -s SERVER -p PORT -k PASSWORD -m CIPHER [-b ADDR] [-l PORT]
+'''
+
+import argparse
+import asyncio
+import functools
+import ipaddress
+import logging
+import socket
+import struct
+
+from typing import Dict, Optional, Tuple
+
+from .cipher.CipherParamerters import supported_cipher_parameters
+from .connection.AsyncConnection import AsyncConnection, open_connection, relay
+from .connection.UDP_Relay import UDP_Relay
+from .message.AEAD import AEAD_UDP_Codec
+from .utils.socks_addr import SOCKS5_ADDR_TYPE, Host, encode_address
+from .utils.WorkerSupervisor import serve, start_server
+
+logger = logging.getLogger(__name__)
+
+SOCKS5_VERSION = 0x05
+SOCKS5_NO_AUTHENTICATION = 0x00
+SOCKS5_NO_ACCEPTABLE_METHODS = 0xff
+SOCKS5_CMD_CONNECT = 0x01
+SOCKS5_CMD_UDP_ASSOCIATE = 0x03
+
+SOCKS5_REPLY_SUCCEEDED = 0x00
+SOCKS5_REPLY_GENERAL_FAILURE = 0x01
+SOCKS5_REPLY_COMMAND_NOT_SUPPORTED = 0x07
+SOCKS5_REPLY_ADDRESS_TYPE_NOT_SUPPORTED = 0x08
+
+RELAY_BUFFER_SIZE = 64 * 1024
+# Stats of `LocalServer.stats` which are not counters.
+STATS_GAUGES = ('n_active_clients', 'udp_associations')
+
+
+class SOCKS5Error(Exception):
+    def __init__(self, reply: int):
+        super(SOCKS5Error, self).__init__(f'SOCKS5 reply {reply:#04x}')
+        self.reply = reply
+
+
+async def read_socks5_addr(reader: asyncio.StreamReader) -> Tuple[Host, int]:
+    '''Read ATYP, DST.ADDR and DST.PORT fields of a SOCKS5 request.
+
+    IPs are returned as `ipaddress` addresses and domains as bytes, which
+    `encode_address` takes without parsing them again.
+
+    Raises:
+        SOCKS5Error -- If the address type is unknown.
+    '''
+    addr_type = (await reader.readexactly(1))[0]
+
+    if addr_type == SOCKS5_ADDR_TYPE.IPV4.value:
+        host: Host = ipaddress.IPv4Address(await reader.readexactly(4))
+    elif addr_type == SOCKS5_ADDR_TYPE.DOMAIN.value:
+        length = (await reader.readexactly(1))[0]
+        host = await reader.readexactly(length)
+    elif addr_type == SOCKS5_ADDR_TYPE.IPV6.value:
+        host = ipaddress.IPv6Address(await reader.readexactly(16))
+    else:
+        raise SOCKS5Error(SOCKS5_REPLY_ADDRESS_TYPE_NOT_SUPPORTED)
+
+    port, = struct.unpack('!H', await reader.readexactly(2))
+    return host, port
+
+
+def socks5_reply(reply: int, bind_addr: str = '0.0.0.0', bind_port: int = 0) -> bytes:
+    # BND.ADDR and BND.PORT are not meaningful for a tunnel, report 0.0.0.0:0 by default.
+    return (bytes((SOCKS5_VERSION, reply, 0x00)) 
+            + encode_address(bind_addr, bind_port))
+
+
+class LocalServer:
+    def __init__(self,
+                 SS_addr: str,
+                 SS_port: int,
+                 password: str,
+                 cipher_name: str,
+                 listen_addr: str = '127.0.0.1',
+                 listen_port: int = 1080,
+                 crypto_backend: Optional[str] = None,
+                 connect_timeout: float = 10,
+                 reuse_port: bool = False,
+                 udp_idle_timeout: float = 60):
+
+        if cipher_name not in supported_cipher_parameters:
+            raise ValueError(f'cipher_name "{cipher_name}" not supported, should be one of {list(supported_cipher_parameters.keys())}')
+
+        self.SS_addr = SS_addr
+        self.SS_port = SS_port
+        self.password = password
+        self.cipher_name = cipher_name
+        self.listen_addr = listen_addr
+        self.listen_port = listen_port
+        self.crypto_backend = crypto_backend
+        self.connect_timeout = connect_timeout
+        self.reuse_port = reuse_port
+        self.udp_idle_timeout = udp_idle_timeout
+
+        self.n_active_clients = 0
+        self.uplink_bytes = 0
+        self.downlink_bytes = 0
+
+        self.server: Optional[asyncio.base_events.Server] = None
+        # Shared by all UDP ASSOCIATE requests, created on the first one.
+        self.udp_relay: Optional[UDP_Relay] = None
+
+    async def start(self, sock: Optional[socket.socket] = None):
+        '''Start listening.
+
+        Keyword Arguments:
+            sock -- Already bound socket to serve on instead of binding `listen_addr`:`listen_port`. (default: {None})
+        '''
+        self.server = await start_server(self._handle_client,
+                                         self.listen_addr,
+                                         self.listen_port,
+                                         sock,
+                                         self.reuse_port,
+                                         limit=RELAY_BUFFER_SIZE)
+        # Resolve port 0 to the bound port.
+        self.listen_port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self.server is None: await self.start()
+        assert self.server is not None
+        await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None: self.server.close()
+        if self.udp_relay is not None: self.udp_relay.close()
+
+    def stats(self) -> Dict[str, int]:
+        stats = {
+            'n_active_clients': self.n_active_clients,
+            'uplink_bytes': self.uplink_bytes,
+            'downlink_bytes': self.downlink_bytes,
+        }
+        if self.udp_relay is not None:
+            stats.update({
+                'udp_associations': len(self.udp_relay),
+                'udp_uplink_packets': self.udp_relay.uplink_packets,
+                'udp_downlink_packets': self.udp_relay.downlink_packets,
+                'udp_dropped_packets': self.udp_relay.dropped_packets,
+            })
+        return stats
+
+    async def _handshake(self, 
+                         reader: asyncio.StreamReader, 
+                         writer: asyncio.StreamWriter) -> Optional[Tuple[int, Tuple[Host, int]]]:
+        '''Run SOCKS5 method negotiation and read the request.
+
+        Returns:
+            Requested (command, (host, port)), or None if the client was rejected.
+        '''
+        version, n_methods = await reader.readexactly(2)
+        methods = await reader.readexactly(n_methods)
+        if version != SOCKS5_VERSION: return None
+
+        if SOCKS5_NO_AUTHENTICATION not in methods:
+            writer.write(bytes((SOCKS5_VERSION, SOCKS5_NO_ACCEPTABLE_METHODS)))
+            return None
+        writer.write(bytes((SOCKS5_VERSION, SOCKS5_NO_AUTHENTICATION)))
+
+        version, command, _ = await reader.readexactly(3)
+        try:
+            target = await read_socks5_addr(reader)
+        except SOCKS5Error as e:
+            writer.write(socks5_reply(e.reply))
+            return None
+
+        if command not in (SOCKS5_CMD_CONNECT, SOCKS5_CMD_UDP_ASSOCIATE):
+            writer.write(socks5_reply(SOCKS5_REPLY_COMMAND_NOT_SUPPORTED))
+            return None
+
+        return command, target
+
+    async def _get_udp_relay(self) -> UDP_Relay:
+        if self.udp_relay is None:
+            cipher_parameters = supported_cipher_parameters[self.cipher_name]
+            if self.crypto_backend is not None:
+                cipher_parameters = cipher_parameters.with_backend(self.crypto_backend)
+
+            udp_relay = UDP_Relay(self.SS_addr, self.SS_port,
+                                  AEAD_UDP_Codec(cipher_parameters, self.password),
+                                  self.listen_addr,
+                                  idle_timeout=self.udp_idle_timeout)
+            await udp_relay.start()
+            # Another client may have created the relay while this one was starting.
+            if self.udp_relay is None:
+                self.udp_relay = udp_relay
+            else:
+                udp_relay.close()
+        return self.udp_relay
+
+    async def _handle_udp_associate(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        '''Accept datagrams from the client's host while its control connection stays open.'''
+        client_host = writer.get_extra_info('peername')[0]
+        try:
+            udp_relay = await self._get_udp_relay()
+        except NotImplementedError as e:
+            # e.g. on the proactor event loop of Windows.
+            logger.warning('UDP ASSOCIATE not supported: %s', e)
+            writer.write(socks5_reply(SOCKS5_REPLY_COMMAND_NOT_SUPPORTED))
+            return
+
+        udp_relay.allow(client_host)
+        try:
+            writer.write(socks5_reply(SOCKS5_REPLY_SUCCEEDED, self.listen_addr, udp_relay.listen_port))
+            while await reader.read(RELAY_BUFFER_SIZE): pass
+        finally:
+            udp_relay.disallow(client_host)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.n_active_clients += 1
+        tunnel: Optional[AsyncConnection] = None
+        try:
+            request = await self._handshake(reader, writer)
+            if request is None: return
+
+            command, target = request
+            if command == SOCKS5_CMD_UDP_ASSOCIATE:
+                await self._handle_udp_associate(reader, writer)
+                return
+
+            try:
+                tunnel = await asyncio.wait_for(
+                    open_connection(self.SS_addr, self.SS_port,
+                                    self.password, self.cipher_name,
+                                    *target,
+                                    crypto_backend=self.crypto_backend,
+                                    limit=RELAY_BUFFER_SIZE),
+                    self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.debug('Failed to connect to Shadowsocks server: %r', e)
+                writer.write(socks5_reply(SOCKS5_REPLY_GENERAL_FAILURE))
+                return
+
+            writer.write(socks5_reply(SOCKS5_REPLY_SUCCEEDED))
+            await relay(reader, writer, tunnel, RELAY_BUFFER_SIZE,
+                        on_send=self._count_uplink, on_recv=self._count_downlink)
+
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            logger.debug('Client connection closed: %r', e)
+        finally:
+            self.n_active_clients -= 1
+            if tunnel is not None: tunnel.close()
+            writer.close()
+
+    def _count_uplink(self, n_bytes: int):
+        self.uplink_bytes += n_bytes
+
+    def _count_downlink(self, n_bytes: int):
+        self.downlink_bytes += n_bytes
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m shadowsocks.local',
+                                     description='Local SOCKS5 server forwarding through a Shadowsocks server.')
+    parser.add_argument('-s', '--server', required=True, help='Shadowsocks server address')
+    parser.add_argument('-p', '--server-port', type=int, required=True, help='Shadowsocks server port')
+    parser.add_argument('-k', '--password', required=True)
+    parser.add_argument('-m', '--method', required=True, choices=list(supported_cipher_parameters.keys()))
+    parser.add_argument('-b', '--local-addr', default='127.0.0.1', help='SOCKS5 listen address (default: 127.0.0.1)')
+    parser.add_argument('-l', '--local-port', type=int, default=1080, help='SOCKS5 listen port (default: 1080)')
+    parser.add_argument('--backend', default=None, help='Crypto backend, e.g. cryptography or pycryptodome')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes (default: 1)')
+    parser.add_argument('--stats-interval', type=float, default=60, help='Seconds between stats logs in multi-worker mode (default: 60)')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve /metrics and /metrics.json on 127.0.0.1 at this port')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    return parser.parse_args(args)
+
+
+def _new_server(options: argparse.Namespace, 
+                listen_addr: str, 
+                listen_port: int, 
+                reuse_port: bool = False) -> LocalServer:
+    return LocalServer(options.server, options.server_port,
+                       options.password, options.method,
+                       listen_addr, listen_port,
+                       crypto_backend=options.backend,
+                       reuse_port=reuse_port)
+
+
+def main(args=None):
+    options = parse_args(args)
+    logging.basicConfig(level=logging.DEBUG if options.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+
+    serve(functools.partial(_new_server, options),
+          options.workers,
+          options.local_addr,
+          options.local_port,
+          'local',
+          'SOCKS5 server',
+          stats_interval=options.stats_interval,
+          metrics_port=options.metrics_port,
+          gauges=STATS_GAUGES)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,9 @@ class AEAD_AddressMessage(AEAD_MessageBase):
                  ip_or_domain: str = '', 
                  port: int = -1,
 
+                 # From an encoded SOCKS5 address, e.g. by `encode_address`
+                 header: bytes = b'',
+
                  # From ciphertext
                  encrypted: bytes = b''):
         
@@ -23,16 +26,39 @@ class AEAD_AddressMessage(AEAD_MessageBase):
         self.addr_type = addr_type
         self.host = ip_or_domain
         self.port = port
+        self.header = header
+        # Data following the address in the same chunk, set by `decrypt`.
+        self.initial_payload = b''
 
         self.encrypted = encrypted
 
     def encrypt(self, cipher: AEAD_CipherBase):
-        raw_payload = to_socks5_addr(self.addr_type, self.host, self.port)
+        raw_payload = self.header or to_socks5_addr(self.addr_type, self.host, self.port)
 
         self.encrypted = cipher.encrypt_chunk(raw_payload)
 
     def decrypt(self, cipher: AEAD_CipherBase):
-        raise NotImplementedError('This method should not be invoked')
+        '''Decrypt the address chunk.
+
+        Raises:
+            ValueError -- If authentication fails or the address is malformed.
+        '''
+        self._parse(cipher.decrypt_chunk(self.encrypted))
+
+    def decrypt_payload(self, cipher: AEAD_CipherBase, chunk_bytes: bytes):
+        '''Decrypt the payload segment of an address chunk whose size segment was already decrypted.
+
+        Like `AEAD_CipherBase.decrypt_chunk_payload`, the nonce of `cipher` should
+        already be increased past the size segment.
+
+        Raises:
+            ValueError -- If authentication fails or the address is malformed.
+        '''
+        self._parse(cipher.decrypt_chunk_payload(chunk_bytes))
+
+    def _parse(self, chunk: bytes):
+        self.addr_type, self.host, self.port, n_consumed_bytes = from_socks5_addr(chunk)
+        self.initial_payload = chunk[n_consumed_bytes:]
 
     def serialize_encrypted(self) -> bytes:
         return self.encrypted
@@ -43,4 +69,19 @@ class AEAD_AddressMessage(AEAD_MessageBase):
                  cipher_parameters: CipherParamerters, 
                  payload: bytes) -> Tuple[Optional['AEAD_AddressMessage'], int]:
         
-        raise NotImplementedError('This method should not be invoked.')
+        if len(payload) < 2 + cipher_parameters.tag_size: 
+            # The given payload is not long enough.
+            return (None, 0)
+        
+        chunk_size = cipher.decrypt_chunk_size(payload[: 2 + cipher_parameters.tag_size])
+        if chunk_size > cipher_parameters.chunk_size:
+            raise ValueError('The received chunk size exceeds the limit.')
+        payload_size = (2 + chunk_size + cipher_parameters.tag_size * 2)
+
+        if len(payload) < payload_size: return (None, 0)
+
+        encrypted = bytes(payload[:payload_size])
+        return (
+            cls(cipher_parameters, encrypted=encrypted),
+            payload_size
+        )
@@ -28,7 +28,7 @@ class AEAD_SaltMessage(AEAD_MessageBase):
                  payload: bytes) -> Tuple[Optional['AEAD_SaltMessage'], int]:
         
         if len(payload) >= cipher_parameters.salt_size:
-            salt = payload[:cipher_parameters.salt_size]
+            salt = bytes(payload[:cipher_parameters.salt_size])
             return (
                 cls(cipher_parameters, salt),
                 cipher_parameters.salt_size
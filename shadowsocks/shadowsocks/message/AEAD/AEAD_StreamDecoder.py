@@ -0,0 +1,145 @@
+from __future__ import annotations
+from enum import Enum
+from typing import TYPE_CHECKING, List, Optional, Tuple
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+from .AEAD_SaltMessage import AEAD_SaltMessage
+from ...cipher.AEAD.AEAD_CipherBase import AEAD_CipherBase
+from ...cipher.CipherParamerters import CipherParamerters
+from ...utils.RingBuffer import RingBuffer
+
+class DECODER_STATE(Enum):
+    AWAITING_SALT    = 0
+    AWAITING_LENGTH  = 1
+    AWAITING_PAYLOAD = 2
+
+class AEAD_StreamDecoder:
+    '''Incremental decoder of an AEAD encrypted stream.
+
+    Walks through "awaiting salt -> awaiting length -> awaiting payload" and
+    keeps the decrypted chunk size between calls, so every length segment is
+    decrypted exactly once and a partial frame is never re-parsed.
+    '''
+
+    def __init__(self, 
+                 cipher_parameters: CipherParamerters,
+                 cipher: AEAD_CipherBase,
+                 password: str):
+        
+        self.cipher_parameters = cipher_parameters
+        self.cipher = cipher
+        self.password = password
+
+        self.state = DECODER_STATE.AWAITING_SALT
+        self.salt: Optional[bytes] = None
+        self._chunk_size = 0
+
+    def resume(self, salt: bytes):
+        '''Continue a stream whose salt and first chunks were consumed with `cipher` elsewhere.'''
+        self.salt = salt
+        self.state = DECODER_STATE.AWAITING_LENGTH
+
+    def decode(self, buffer: RingBuffer) -> Optional[bytes]:
+        '''Consume encrypted bytes from `buffer` until one plaintext chunk is complete.
+
+        Raises:
+            ValueError -- If authentication fails or the chunk size is invalid.
+
+        Returns:
+            The plaintext chunk, or None if `buffer` does not hold a complete chunk yet.
+        '''
+        tag_size = self.cipher_parameters.tag_size
+
+        if self.state == DECODER_STATE.AWAITING_SALT:
+            salt_size = self.cipher_parameters.salt_size
+            if len(buffer) < salt_size: return None
+
+            message, n_consumed_bytes = AEAD_SaltMessage.try_load(self.cipher, 
+                                                                  self.cipher_parameters, 
+                                                                  buffer.peek(salt_size))
+            assert isinstance(message, AEAD_SaltMessage)
+            buffer.consume(n_consumed_bytes)
+
+            self.salt = message.salt
+            self.cipher.init_key(self.password, message.salt)
+            self.state = DECODER_STATE.AWAITING_LENGTH
+
+        if self.state == DECODER_STATE.AWAITING_LENGTH:
+            if len(buffer) < 2 + tag_size: return None
+
+            chunk_size = self.cipher.decrypt_chunk_size(buffer.peek(2 + tag_size))
+            if chunk_size > self.cipher_parameters.chunk_size:
+                raise ValueError('The received chunk size exceeds the limit.')
+
+            self.cipher.increase_nonce()
+            buffer.consume(2 + tag_size)
+
+            self._chunk_size = chunk_size
+            self.state = DECODER_STATE.AWAITING_PAYLOAD
+
+        # DECODER_STATE.AWAITING_PAYLOAD
+        if len(buffer) < self._chunk_size + tag_size: return None
+
+        chunk = self.cipher.decrypt_chunk_payload(buffer.peek(self._chunk_size + tag_size))
+        buffer.consume(self._chunk_size + tag_size)
+
+        self.state = DECODER_STATE.AWAITING_LENGTH
+        return chunk
+
+    def decode_all(self, buffer: RingBuffer, executor: Optional[Executor] = None) -> List[bytes]:
+        '''Decode every complete chunk in `buffer`.
+
+        Keyword Arguments:
+            executor -- If given, payloads of complete chunks are decrypted by tasks submitted to it. (default: {None})
+        '''
+        chunks = []
+
+        if executor is not None:
+            # Finish the salt or a pending payload first, then decode in parallel.
+            if self.state != DECODER_STATE.AWAITING_LENGTH:
+                chunk = self.decode(buffer)
+                if chunk is None: return chunks
+                chunks.append(chunk)
+            return chunks + self._decode_parallel(buffer, executor)
+
+        while True:
+            chunk = self.decode(buffer)
+            if chunk is None: return chunks
+            chunks.append(chunk)
+
+    @property
+    def salt_received(self) -> bool:
+        return self.state != DECODER_STATE.AWAITING_SALT
+
+    def _decode_parallel(self, buffer: RingBuffer, executor: Executor) -> List[bytes]:
+        '''Decrypt length segments in order, then decrypt the payloads concurrently.'''
+        backend = self.cipher.backend
+        assert backend is not None
+
+        tag_size = self.cipher_parameters.tag_size
+        encrypted = buffer.peek()
+
+        payloads: List[Tuple[bytes, memoryview]] = []
+        offset = 0
+        while len(encrypted) - offset >= 2 + tag_size:
+            chunk_size = self.cipher.decrypt_chunk_size(encrypted[offset: offset + 2 + tag_size])
+            if chunk_size > self.cipher_parameters.chunk_size:
+                raise ValueError('The received chunk size exceeds the limit.')
+            
+            self.cipher.increase_nonce()
+            offset += 2 + tag_size
+
+            if len(encrypted) - offset < chunk_size + tag_size:
+                # Incomplete payload, resume from AWAITING_PAYLOAD on the next call.
+                self._chunk_size = chunk_size
+                self.state = DECODER_STATE.AWAITING_PAYLOAD
+                break
+
+            payloads.append((self.cipher.nonce, encrypted[offset: offset + chunk_size + tag_size]))
+            self.cipher.increase_nonce()
+            offset += chunk_size + tag_size
+
+        chunks = list(executor.map(lambda payload: backend.decrypt(*payload), payloads))
+        buffer.consume(offset)
+        return chunks
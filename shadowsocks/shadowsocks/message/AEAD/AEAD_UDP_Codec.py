@@ -0,0 +1,58 @@
+import os
+
+from typing import Sequence
+
+from ...cipher.AEAD.AEAD_CipherBase import master_key
+from ...cipher.AEAD.backend import select_backend
+from ...cipher.CipherParamerters import CipherParamerters
+from ...cipher.key_gen import HKDF_SHA1
+
+class AEAD_UDP_Codec:
+    '''Encrypt and decrypt AEAD UDP packets: [salt][encrypted payload][tag].
+
+    Every packet has its own salt and subkey and uses an all-zero nonce. The
+    master key and crypto backend are resolved once per codec, so a packet
+    costs one HKDF and one AEAD operation.
+    '''
+
+    def __init__(self, cipher_parameters: CipherParamerters, password: str):
+        self.cipher_parameters = cipher_parameters
+        self.algorithm = cipher_parameters.cipher.algorithm
+        
+        self._master_key = master_key(password, cipher_parameters.key_size)
+        self._backend_type = select_backend(self.algorithm, cipher_parameters)
+        self._zero_nonce = bytes(cipher_parameters.nonce_size)
+
+    def _backend(self, salt: bytes):
+        subkey = HKDF_SHA1(
+            ikm = self._master_key,
+            salt = salt,
+            info = b'ss-subkey',
+            key_length = self.cipher_parameters.key_size
+        )
+        return self._backend_type(self.algorithm, subkey, self.cipher_parameters)
+
+    def encrypt(self, payload_parts: Sequence[bytes]) -> bytes:
+        '''Encrypt the concatenation of `payload_parts`, usually (address header, data).'''
+        salt_size = self.cipher_parameters.salt_size
+        payload = b''.join(payload_parts)
+
+        packet = bytearray(salt_size + len(payload) + self.cipher_parameters.tag_size)
+        salt = os.urandom(salt_size)
+        packet[:salt_size] = salt
+
+        self._backend(salt).encrypt_into(self._zero_nonce, payload, memoryview(packet)[salt_size:])
+        return bytes(packet)
+
+    def decrypt(self, packet: bytes) -> bytes:
+        '''Return the plaintext payload of `packet`.
+
+        Raises:
+            ValueError -- If the packet is too short or authentication fails.
+        '''
+        salt_size = self.cipher_parameters.salt_size
+        if len(packet) < salt_size + self.cipher_parameters.tag_size:
+            raise ValueError('The given packet is too short.')
+
+        packet = memoryview(packet)
+        return self._backend(bytes(packet[:salt_size])).decrypt(self._zero_nonce, packet[salt_size:])
@@ -2,10 +2,15 @@ from .AEAD_MessageBase import AEAD_MessageBase
 from .AEAD_SaltMessage import AEAD_SaltMessage
 from .AEAD_AddressMessage import AEAD_AddressMessage
 from .AEAD_PayloadMessage import AEAD_PayloadMessage
+from .AEAD_StreamDecoder import AEAD_StreamDecoder, DECODER_STATE
+from .AEAD_UDP_Codec import AEAD_UDP_Codec
 
 __all__ = [
     'AEAD_MessageBase',
     'AEAD_SaltMessage',
     'AEAD_AddressMessage',
     'AEAD_PayloadMessage',
+    'AEAD_StreamDecoder',
+    'DECODER_STATE',
+    'AEAD_UDP_Codec',
 ]
\ No newline at end of file
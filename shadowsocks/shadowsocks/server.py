@@ -0,0 +1,340 @@
+'''Shadowsocks AEAD server dialing the targets requested by clients.
+
+Usage: python -m shadowsocks.server -p PORT (-k PASSWORD | --users FILE) -m CIPHER [-s ADDR]
+'''
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import time
+
+from typing import Dict, Mapping, Optional, Set
+
+from .cipher.CipherParamerters import supported_cipher_parameters
+from .connection.AsyncConnection import AsyncConnection, relay
+from .message.AEAD import AEAD_AddressMessage, AEAD_SaltMessage
+from .utils.ReplayFilter import ReplayFilter
+from .utils.UserTable import UserTable
+from .utils.WorkerSupervisor import serve, start_server
+
+logger = logging.getLogger(__name__)
+
+RELAY_BUFFER_SIZE = 64 * 1024
+# Stats of `Server.stats` which are not counters.
+STATS_GAUGES = ('n_active_clients', 'replay_filter_bytes', 'replay_filter_salts')
+
+
+class _Session:
+    def __init__(self, client_writer: asyncio.StreamWriter):
+        self.client_writer = client_writer
+        self.target_writer: Optional[asyncio.StreamWriter] = None
+        self.last_active = time.monotonic()
+        self.task = asyncio.current_task()
+
+    def close(self):
+        self.client_writer.close()
+        if self.target_writer is not None: self.target_writer.close()
+
+
+class Server:
+    '''asyncio Shadowsocks AEAD server.
+
+    A client first sends its salt and the address chunk, which must arrive within
+    `handshake_timeout`. The target is then dialed within `connect_timeout` and
+    data is relayed in both directions. Sessions without traffic for
+    `idle_timeout` are closed by one periodic sweep, instead of a timer per read.
+    Clients beyond `max_connections` are closed as soon as they are accepted.
+
+    Salts of authenticated clients and of the server itself are remembered by
+    `replay_filter`; a client reusing one fails its handshake before any key is
+    derived, so recorded sessions cannot be replayed or reflected. Each
+    connection takes two salts of the filter's capacity. Workers serving one
+    port should share a `shared` filter, a replayed connection usually reaches
+    another worker than the original.
+
+    With `users`, clients of any of the passwords are served and identified by
+    `UserTable`.
+    '''
+
+    def __init__(self,
+                 password: Optional[str],
+                 cipher_name: str,
+                 listen_addr: str = '0.0.0.0',
+                 listen_port: int = 8388,
+                 crypto_backend: Optional[str] = None,
+                 max_connections: int = 1024,
+                 handshake_timeout: float = 10,
+                 connect_timeout: float = 10,
+                 idle_timeout: float = 300,
+                 reuse_port: bool = False,
+                 replay_filter: Optional[ReplayFilter] = None,
+                 users: Optional[Mapping[str, str]] = None):
+
+        if cipher_name not in supported_cipher_parameters:
+            raise ValueError(f'cipher_name "{cipher_name}" not supported, should be one of {list(supported_cipher_parameters.keys())}')
+
+        self.cipher_parameters = supported_cipher_parameters[cipher_name]
+        if crypto_backend is not None:
+            self.cipher_parameters = self.cipher_parameters.with_backend(crypto_backend)
+
+        if (password is None) == (users is None):
+            raise ValueError('Exactly one of password and users should be given.')
+
+        self.password = password
+        self.users = UserTable(users, self.cipher_parameters) if users is not None else None
+        self.listen_addr = listen_addr
+        self.listen_port = listen_port
+        self.max_connections = max_connections
+        self.handshake_timeout = handshake_timeout
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.reuse_port = reuse_port
+        self.replay_filter = replay_filter if replay_filter is not None else ReplayFilter()
+
+        self.n_rejected_clients = 0
+        self.n_failed_handshakes = 0
+        self.n_replayed_salts = 0
+        self.n_failed_connects = 0
+        self.uplink_bytes = 0
+        self.downlink_bytes = 0
+
+        self.server: Optional[asyncio.base_events.Server] = None
+        self._sessions: Set[_Session] = set()
+        self._sweeper: Optional[asyncio.TimerHandle] = None
+
+    async def start(self, sock: Optional[socket.socket] = None):
+        '''Start listening.
+
+        Keyword Arguments:
+            sock -- Already bound socket to serve on instead of binding `listen_addr`:`listen_port`. (default: {None})
+        '''
+        self.server = await start_server(self._handle_client,
+                                         self.listen_addr,
+                                         self.listen_port,
+                                         sock,
+                                         self.reuse_port,
+                                         limit=RELAY_BUFFER_SIZE)
+        # Resolve port 0 to the bound port.
+        self.listen_port = self.server.sockets[0].getsockname()[1]
+        self._sweeper = asyncio.get_running_loop().call_later(self.idle_timeout, self._sweep)
+
+    async def serve_forever(self):
+        if self.server is None: await self.start()
+        assert self.server is not None
+        await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None: self.server.close()
+        if self._sweeper is not None: self._sweeper.cancel()
+        for session in list(self._sessions): session.close()
+
+    async def wait_closed(self):
+        '''Wait until the sessions closed by `close` have finished.'''
+        tasks = [session.task for session in self._sessions if session.task is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'n_active_clients': len(self._sessions),
+            'n_rejected_clients': self.n_rejected_clients,
+            'n_failed_handshakes': self.n_failed_handshakes,
+            'n_replayed_salts': self.n_replayed_salts,
+            'n_failed_connects': self.n_failed_connects,
+            'uplink_bytes': self.uplink_bytes,
+            'downlink_bytes': self.downlink_bytes,
+            # A shared filter is reported once, by the process which created it.
+            **(self.replay_filter.stats() if not self.replay_filter.shared else {}),
+            **(self.users.stats() if self.users is not None else {}),
+        }
+
+    def _sweep(self):
+        deadline = time.monotonic() - self.idle_timeout
+        for session in list(self._sessions):
+            if session.last_active < deadline:
+                logger.debug('Closing idle session')
+                session.close()
+        self._sweeper = asyncio.get_running_loop().call_later(self.idle_timeout, self._sweep)
+
+    async def _handshake(self, tunnel: AsyncConnection, client_addr: Optional[str] = None) -> AEAD_AddressMessage:
+        '''Read the salt and the address chunk of a client.
+
+        Keyword Arguments:
+            client_addr -- Client host, helps identifying its user in multi-user mode. (default: {None})
+
+        Raises:
+            ValueError -- If the salt was seen before, authentication fails or the address is malformed.
+            asyncio.IncompleteReadError -- If the client closed before the address.
+        '''
+        params = self.cipher_parameters
+        cipher = tunnel.downlink_cipher
+
+        salt_message, _ = AEAD_SaltMessage.try_load(cipher, params,
+                                                    await tunnel.reader.readexactly(params.salt_size))
+        assert isinstance(salt_message, AEAD_SaltMessage)
+        salt = salt_message.salt
+        if salt in self.replay_filter: self._reject_replay()
+
+        header = await tunnel.reader.readexactly(2 + params.tag_size)
+        if self.users is None:
+            cipher.init_key(tunnel.password, salt)
+            chunk_size = cipher.decrypt_chunk_size(header)
+        else:
+            user, chunk_size = await self.users.identify(cipher, salt, header, client_addr)
+            # The downlink to the client is encrypted with the password of its user.
+            tunnel.password = self.users.password(user)
+        if chunk_size > params.chunk_size:
+            raise ValueError('The received chunk size exceeds the limit.')
+        cipher.increase_nonce()
+        body = await tunnel.reader.readexactly(chunk_size + params.tag_size)
+
+        # The size segment is verified already, only the payload is decrypted.
+        address_message = AEAD_AddressMessage(params)
+        address_message.decrypt_payload(cipher, body)
+        # Only remembered once authenticated, so junk salts cannot flush out real ones.
+        # Checked again for concurrent handshakes with the same salt.
+        if self.replay_filter.add(salt): self._reject_replay()
+
+        # Later chunks are decoded by the tunnel.
+        tunnel.downlink_decoder.resume(salt)
+        return address_message
+
+    def _reject_replay(self):
+        self.n_replayed_salts += 1
+        raise ValueError('The salt was used before.')
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if len(self._sessions) >= self.max_connections:
+            self.n_rejected_clients += 1
+            writer.close()
+            return
+
+        session = _Session(writer)
+        self._sessions.add(session)
+        tunnel = AsyncConnection(reader, writer, self.password or '', self.cipher_parameters)
+        peername = writer.get_extra_info('peername')
+        try:
+            try:
+                address = await asyncio.wait_for(self._handshake(tunnel, peername[0] if peername else None),
+                                                 self.handshake_timeout)
+            except (ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                # Read until the client gives up instead of closing at once, so the
+                # failure point does not reveal where authentication failed.
+                logger.debug('Handshake failed: %r', e)
+                self.n_failed_handshakes += 1
+                await self._drain_client(reader)
+                return
+
+            try:
+                target_reader, target_writer = await asyncio.wait_for(
+                    asyncio.open_connection(address.host, address.port, limit=RELAY_BUFFER_SIZE),
+                    self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.debug('Failed to connect to %s:%d: %r', address.host, address.port, e)
+                self.n_failed_connects += 1
+                return
+
+            session.target_writer = target_writer
+            session.last_active = time.monotonic()
+            if address.initial_payload:
+                self.uplink_bytes += len(address.initial_payload)
+                target_writer.write(address.initial_payload)
+
+            uplink_salt = os.urandom(self.cipher_parameters.salt_size)
+            self.replay_filter.add(uplink_salt)
+            tunnel.start_uplink(uplink_salt)
+            # The client's uplink is what the tunnel receives.
+            await relay(target_reader, target_writer, tunnel, RELAY_BUFFER_SIZE,
+                        on_send=functools.partial(self._count_downlink, session),
+                        on_recv=functools.partial(self._count_uplink, session))
+
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            logger.debug('Client connection closed: %r', e)
+        finally:
+            self._sessions.discard(session)
+            session.close()
+            tunnel.close()
+
+    async def _drain_client(self, reader: asyncio.StreamReader):
+        try:
+            while await asyncio.wait_for(reader.read(RELAY_BUFFER_SIZE), self.handshake_timeout): pass
+        except (OSError, asyncio.TimeoutError):
+            pass
+
+    def _count_uplink(self, session: _Session, n_bytes: int):
+        session.last_active = time.monotonic()
+        self.uplink_bytes += n_bytes
+
+    def _count_downlink(self, session: _Session, n_bytes: int):
+        session.last_active = time.monotonic()
+        self.downlink_bytes += n_bytes
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m shadowsocks.server',
+                                     description='Shadowsocks AEAD server.')
+    parser.add_argument('-s', '--server-addr', default='0.0.0.0', help='Listen address (default: 0.0.0.0)')
+    parser.add_argument('-p', '--server-port', type=int, required=True, help='Listen port')
+    password = parser.add_mutually_exclusive_group(required=True)
+    password.add_argument('-k', '--password')
+    password.add_argument('--users', help='JSON file of a {"user name": "password"} object, to serve several passwords')
+    parser.add_argument('-m', '--method', required=True, choices=list(supported_cipher_parameters.keys()))
+    parser.add_argument('--backend', default=None, help='Crypto backend, e.g. cryptography or pycryptodome')
+    parser.add_argument('--max-connections', type=int, default=1024, help='Maximum concurrent clients per worker (default: 1024)')
+    parser.add_argument('-t', '--timeout', type=float, default=300, help='Idle timeout in seconds (default: 300)')
+    parser.add_argument('--replay-capacity', type=int, default=1000000,
+                        help='Recent connections whose salts are remembered to reject replays, at least, '
+                             'shared by all workers (default: 1000000)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes (default: 1)')
+    parser.add_argument('--stats-interval', type=float, default=60, help='Seconds between stats logs in multi-worker mode (default: 60)')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve /metrics and /metrics.json on 127.0.0.1 at this port')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    return parser.parse_args(args)
+
+
+def _new_server(options: argparse.Namespace,
+                replay_filter: ReplayFilter,
+                listen_addr: str,
+                listen_port: int,
+                reuse_port: bool = False) -> Server:
+    users = None
+    if options.users is not None:
+        with open(options.users) as f:
+            users = json.load(f)
+    return Server(options.password, options.method,
+                  listen_addr, listen_port,
+                  crypto_backend=options.backend,
+                  max_connections=options.max_connections,
+                  idle_timeout=options.timeout,
+                  reuse_port=reuse_port,
+                  replay_filter=replay_filter,
+                  users=users)
+
+
+def main(args=None):
+    options = parse_args(args)
+    logging.basicConfig(level=logging.DEBUG if options.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+
+    # Each connection remembers the salt of the client and the server's own.
+    replay_filter = ReplayFilter(2 * options.replay_capacity, shared=options.workers > 1)
+    try:
+        serve(functools.partial(_new_server, options, replay_filter),
+              options.workers,
+              options.server_addr,
+              options.server_port,
+              'server',
+              'Shadowsocks server',
+              stats_interval=options.stats_interval,
+              metrics_port=options.metrics_port,
+              gauges=STATS_GAUGES,
+              stats=replay_filter.stats if replay_filter.shared else None)
+    finally:
+        replay_filter.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import socket
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+# (family, type, proto, canonname, sockaddr) as returned by `socket.getaddrinfo`.
+AddrInfo = Tuple[Any, Any, int, str, tuple]
+Resolver = Callable[..., List[AddrInfo]]
+
+
+class DNSCache:
+    '''TTL-bounded cache of `getaddrinfo` results for TCP connections.
+
+    `getaddrinfo` does not report record TTLs, so every entry lives `ttl`
+    seconds. Failed lookups are not cached. Safe to share across threads.
+    '''
+
+    def __init__(self, ttl: float = 60, max_size: int = 1024, resolver: Resolver = socket.getaddrinfo):
+        '''Constructor
+
+        Keyword Arguments:
+            ttl -- Seconds a resolution is reused. (default: {60})
+            max_size -- Maximum number of cached (host, port), least recently used are evicted. (default: {1024})
+            resolver -- Function with the signature of `socket.getaddrinfo`. (default: {socket.getaddrinfo})
+        '''
+        self.ttl = ttl
+        self.max_size = max_size
+        self.resolver = resolver
+
+        self.hits = 0
+        self.misses = 0
+
+        # (host, port) -> (addresses, expire time)
+        self._entries: 'OrderedDict[Tuple[str, int], Tuple[List[AddrInfo], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> List[AddrInfo]:
+        '''Return the TCP addresses of `host`:`port` in resolver order.
+
+        Raises:
+            socket.gaierror -- If resolution fails.
+        '''
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry[1]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Resolved without the lock, concurrent misses of one host may both resolve.
+        addresses = self.resolver(host, port, type=socket.SOCK_STREAM)
+        if not addresses: raise socket.gaierror(f'No address for {host}')
+
+        with self._lock:
+            self._entries[key] = (addresses, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return addresses
+
+    def invalidate(self, host: str, port: int):
+        '''Forget the addresses of `host`:`port`, e.g. after connecting to all of them failed.'''
+        with self._lock: self._entries.pop((host, port), None)
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Shared by connections which are not given a cache.
+dns_cache = DNSCache()
@@ -0,0 +1,73 @@
+import json
+import logging
+import threading
+
+from typing import Callable, Dict, Optional
+
+from .PerfCounters import PerfRegistry, registry as default_registry, to_prometheus
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsServer:
+    '''HTTP endpoint exporting a `PerfRegistry` from a daemon thread.
+
+    `GET /metrics` returns Prometheus text, `GET /metrics.json` returns JSON.
+    Snapshots are only taken on request, so an idle endpoint costs nothing.
+    '''
+
+    def __init__(self,
+                 listen_addr: str = '127.0.0.1',
+                 listen_port: int = 9100,
+                 registry: Optional[PerfRegistry] = None):
+
+        # Imported here, only processes serving metrics pay for loading http.server.
+        import http.server
+
+        self.registry = registry or default_registry
+
+        metrics_registry = self.registry
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = to_prometheus(metrics_registry.snapshot()).encode()
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(metrics_registry.snapshot()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((listen_addr, listen_port), Handler)
+        self._server.daemon_threads = True
+        self.listen_addr, self.listen_port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None: self._server.shutdown()
+        self._server.server_close()
+
+
+def start_metrics_server(listen_port: int, 
+                         name: str, 
+                         stats: Callable[[], Dict[str, int]]) -> MetricsServer:
+    '''Export `stats` with the connection counters of this process on 127.0.0.1:`listen_port`.'''
+    default_registry.register_source(name, stats)
+    metrics_server = MetricsServer('127.0.0.1', listen_port)
+    metrics_server.start()
+    logger.info('Metrics served on http://127.0.0.1:%d/metrics', metrics_server.listen_port)
+    return metrics_server
@@ -0,0 +1,127 @@
+import threading
+import weakref
+
+from collections import Counter
+from typing import Callable, Dict, Iterable, List
+
+# Counters summed across connections.
+SUM_COUNTERS = (
+    'uplink_bytes',         # Plaintext bytes encrypted and sent.
+    'downlink_bytes',       # Plaintext bytes received and decrypted.
+    'uplink_chunks',
+    'downlink_chunks',
+    'send_syscalls',
+    'recv_syscalls',
+    'crypto_ns',            # Time in AEAD encryption and decryption.
+    'io_ns',                # Time in socket send and receive calls.
+    'handshake_ns',         # Time from connecting until the salt and address are sent.
+    'handshakes',
+    'mac_failures',         # Chunks from the server failing authentication.
+)
+# Counters aggregated with max across connections.
+MAX_COUNTERS = (
+    'recv_buffer_high_water',
+    'decrypted_buffer_high_water',
+)
+COUNTER_NAMES = SUM_COUNTERS + MAX_COUNTERS
+
+
+class PerfCounters:
+    '''Counters of one connection.
+
+    Counters are plain attributes, so updating one costs a single integer add and
+    needs no lock: each connection is updated by the thread using it. Read them
+    process-wide through `registry`.
+    '''
+
+    __slots__ = COUNTER_NAMES + ('__weakref__', )
+
+    def __init__(self):
+        for name in COUNTER_NAMES: setattr(self, name, 0)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in COUNTER_NAMES}
+
+    def __repr__(self):
+        return f'PerfCounters({self.as_dict()})'
+
+
+class PerfRegistry:
+    '''Process-wide aggregation of `PerfCounters` and other stats sources.
+
+    Live counters are held weakly. `retire` folds the final values of a closed
+    connection into the totals, so they are kept after the connection is freed.
+    '''
+
+    def __init__(self):
+        self._live: 'weakref.WeakSet[PerfCounters]' = weakref.WeakSet()
+        self._retired: Counter = Counter()
+        self._n_retired = 0
+        self._sources: Dict[str, Callable[[], Dict[str, int]]] = {}
+        self._lock = threading.Lock()
+
+    def new_counters(self) -> PerfCounters:
+        counters = PerfCounters()
+        with self._lock: self._live.add(counters)
+        return counters
+
+    def retire(self, counters: PerfCounters):
+        with self._lock:
+            if counters not in self._live: return
+            self._live.discard(counters)
+            self._n_retired += 1
+            _accumulate(self._retired, [counters])
+
+    def register_source(self, name: str, source: Callable[[], Dict[str, int]]):
+        '''Include `source()` in snapshots, keys are prefixed with `name`.'''
+        with self._lock: self._sources[name] = source
+
+    def unregister_source(self, name: str):
+        with self._lock: self._sources.pop(name, None)
+
+    def snapshot(self) -> Dict[str, int]:
+        '''Return the current totals of live and retired connections and of every source.'''
+        with self._lock:
+            live = list(self._live)
+            totals = Counter(self._retired)
+            n_retired = self._n_retired
+            sources = list(self._sources.items())
+
+        _accumulate(totals, live)
+        snapshot = {name: totals[name] for name in COUNTER_NAMES}
+        snapshot['open_connections'] = len(live)
+        snapshot['closed_connections'] = n_retired
+
+        for source_name, source in sources:
+            for name, value in source().items():
+                snapshot[f'{source_name}_{name}'] = value
+        return snapshot
+
+    def reset(self):
+        '''Forget retired totals, live counters are left untouched.'''
+        with self._lock:
+            self._retired.clear()
+            self._n_retired = 0
+
+
+def _accumulate(totals: Counter, counters: Iterable[PerfCounters]):
+    for counter in counters:
+        for name in SUM_COUNTERS: totals[name] += getattr(counter, name)
+        for name in MAX_COUNTERS: totals[name] = max(totals[name], getattr(counter, name))
+
+
+def to_prometheus(snapshot: Dict[str, int], prefix: str = 'shadowsocks_') -> str:
+    '''Format a snapshot in the Prometheus text exposition format.'''
+    lines: List[str] = []
+    for name, value in snapshot.items():
+        metric_type = 'counter' if name in SUM_COUNTERS else 'gauge'
+        if name.endswith('_ns'):
+            name, value = name[:-3] + '_seconds', value / 1e9
+        if metric_type == 'counter': name += '_total'
+        lines.append(f'# TYPE {prefix}{name} {metric_type}')
+        lines.append(f'{prefix}{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# Default registry used by the connection classes.
+registry = PerfRegistry()
@@ -0,0 +1,201 @@
+import contextlib
+import hashlib
+import logging
+import math
+import multiprocessing
+import os
+import struct
+
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the lock of a shared filter. It is held for microseconds,
+# a longer wait means its holder died holding it, and the lock is taken over.
+SHARED_LOCK_TIMEOUT = 1
+
+# Start of the filter memory: index of the current filter, salts in it, rotations.
+_STATE = struct.Struct('<QQQ')
+_KEY_SIZE = 16
+
+
+class _SharedLock:
+    '''Process lock taken over from a holder which died holding it.'''
+
+    def __init__(self, lock):
+        self.lock = lock
+
+    def __enter__(self):
+        if not self.lock.acquire(timeout=SHARED_LOCK_TIMEOUT):
+            # Releasing on exit makes the lock usable again.
+            logger.warning('Replay filter lock held for over %g seconds, taking it over', SHARED_LOCK_TIMEOUT)
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+
+def bloom_parameters(capacity: int, false_positive_rate: float) -> Tuple[int, int]:
+    '''Return (number of bits, number of hashes) of a Bloom filter holding `capacity` items.'''
+    n_bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+    n_hashes = max(1, round(n_bits / capacity * math.log(2)))
+    return n_bits, n_hashes
+
+
+class ReplayFilter:
+    '''Fixed-memory filter of recently seen salts, made of two rotating Bloom filters.
+
+    New salts go into the current filter. Once it holds `capacity` salts the
+    previous filter is cleared and becomes the current one, so at least the last
+    `capacity` salts, and at most the last 2 * `capacity`, are remembered with
+    a false positive rate of at most `false_positive_rate`. Memory is fixed at
+    two filters whatever the connection rate.
+
+    Bit positions are derived from a keyed hash, so clients cannot craft salts
+    colliding with those of others.
+
+    A `shared` filter lives in shared memory behind a process lock. Passed to
+    worker processes, it lets every worker reject the salts seen by the others.
+    Otherwise the filter is not thread-safe, use one per event loop.
+    '''
+
+    def __init__(self,
+                 capacity: int = 1000000,
+                 false_positive_rate: float = 1e-6,
+                 shared: bool = False):
+        '''Constructor
+
+        Keyword Arguments:
+            capacity -- Salts per filter, at least that many recent salts are remembered. (default: {1000000})
+            false_positive_rate -- Probability that a new salt is reported as seen. (default: {1e-6})
+            shared -- Keep the filter in shared memory for other processes, see `close`. (default: {False})
+        '''
+        self._memory: Optional[shared_memory.SharedMemory] = None
+        if capacity < 1: raise ValueError('capacity should be at least 1.')
+        if not 0 < false_positive_rate < 1: raise ValueError('false_positive_rate should be between 0 and 1.')
+
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.shared = shared
+        self._init_parameters()
+
+        # Forked processes inherit the filter, only its creator frees it.
+        self._owner_pid = os.getpid() if shared else None
+        if shared:
+            self._memory = shared_memory.SharedMemory(create=True,
+                                                      size=_STATE.size + _KEY_SIZE + 2 * self._filter_size)
+            self._lock = _SharedLock(multiprocessing.Lock())
+            # Secret prefix of the hashed salts.
+            self._memory.buf[_STATE.size:_STATE.size + _KEY_SIZE] = os.urandom(_KEY_SIZE)
+            self._attach(self._memory.buf)
+        else:
+            # Private filters skip the views of shared memory, bytearrays are faster to probe.
+            self._lock = contextlib.nullcontext()
+            self._buffer = memoryview(bytearray(_STATE.size))
+            self._key = os.urandom(_KEY_SIZE)
+            self._filters = (bytearray(self._filter_size), bytearray(self._filter_size))
+
+    def _init_parameters(self):
+        # Both filters are checked, each gets half of the false positive budget.
+        self.n_bits, self.n_hashes = bloom_parameters(self.capacity, self.false_positive_rate / 2)
+        self._filter_size = (self.n_bits + 7) // 8
+        self._unpack_hashes = struct.Struct(f'<{self.n_hashes}Q').unpack
+
+    def _attach(self, buffer: memoryview):
+        self._buffer = buffer
+        self._key = bytes(buffer[_STATE.size:_STATE.size + _KEY_SIZE])
+        start = _STATE.size + _KEY_SIZE
+        size = self._filter_size
+        self._filters = (buffer[start:start + size], buffer[start + size:start + 2 * size])
+
+    def __getstate__(self):
+        if not self.shared: raise TypeError('Only shared replay filters can be passed to other processes.')
+        return {
+            'capacity': self.capacity,
+            'false_positive_rate': self.false_positive_rate,
+            'memory': self._memory,
+            'lock': self._lock.lock,
+        }
+
+    def __setstate__(self, state):
+        self.capacity = state['capacity']
+        self.false_positive_rate = state['false_positive_rate']
+        self.shared = True
+        self._init_parameters()
+        self._owner_pid = None
+        self._memory = state['memory']
+        self._lock = _SharedLock(state['lock'])
+        self._attach(self._memory.buf)
+
+    def _hashes(self, salt: bytes) -> Tuple[int, ...]:
+        # One independent 64 bits hash per position. Double hashing h1 + i * h2 only
+        # yields n_bits ** 2 distinct position sets, which bounds the false positive
+        # rate of small filters far above the configured one.
+        return self._unpack_hashes(hashlib.shake_256(self._key + salt).digest(8 * self.n_hashes))
+
+    def _contains(self, bits: Union[bytearray, memoryview], hashes: Tuple[int, ...]) -> bool:
+        # Positions are reduced as probed, an unseen salt usually misses at the first ones.
+        n_bits = self.n_bits
+        for h in hashes:
+            position = h % n_bits
+            if not bits[position >> 3] & (1 << (position & 7)): return False
+        return True
+
+    def __contains__(self, salt: bytes) -> bool:
+        hashes = self._hashes(salt)
+        with self._lock:
+            return self._contains(self._filters[0], hashes) or self._contains(self._filters[1], hashes)
+
+    def add(self, salt: bytes) -> bool:
+        '''Remember `salt`.
+
+        Returns:
+            Whether `salt` was seen before, in which case it is not added again.
+        '''
+        hashes = self._hashes(salt)
+        with self._lock:
+            if self._contains(self._filters[0], hashes) or self._contains(self._filters[1], hashes): return True
+
+            current_index, n_current, n_rotations = _STATE.unpack_from(self._buffer)
+            if n_current >= self.capacity:
+                current_index ^= 1
+                self._filters[current_index][:] = bytes(self._filter_size)
+                n_current = 0
+                n_rotations += 1
+
+            current = self._filters[current_index]
+            n_bits = self.n_bits
+            for h in hashes:
+                position = h % n_bits
+                current[position >> 3] |= 1 << (position & 7)
+            _STATE.pack_into(self._buffer, 0, current_index, n_current + 1, n_rotations)
+        return False
+
+    @property
+    def n_rotations(self) -> int:
+        return _STATE.unpack_from(self._buffer)[2]
+
+    @property
+    def memory_bytes(self) -> int:
+        return 2 * self._filter_size
+
+    def stats(self) -> Dict[str, int]:
+        _, n_current, n_rotations = _STATE.unpack_from(self._buffer)
+        return {
+            'replay_filter_bytes': self.memory_bytes,
+            'replay_filter_salts': n_current,
+            'replay_filter_rotations': n_rotations,
+        }
+
+    def __del__(self):
+        # Views of the shared memory must be released before it is unmapped.
+        self.close()
+
+    def close(self):
+        '''Unmap a shared filter, and free it if this process created it.'''
+        if self._memory is None: return
+        for bits in self._filters: bits.release()
+        self._buffer.release()
+        self._memory.close()
+        if self._owner_pid == os.getpid(): self._memory.unlink()
+        self._memory = None
@@ -0,0 +1,91 @@
+import socket
+
+from typing import Optional
+
+class RingBuffer:
+    '''Byte buffer backed by one preallocated bytearray.
+
+    Data occupies the contiguous segment `[head, tail)` of the storage. Reads
+    advance `head`, writes and `recv_into` fill the storage after `tail`. When
+    the tail runs out of room the segment is moved back to the front in place,
+    the storage is only reallocated if the data does not fit at all.
+
+    Views returned by `peek` share memory with the buffer, they are valid until
+    the next `write` or `recv_into`.
+    '''
+
+    def __init__(self, capacity: int = 64 * 1024):
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._head = 0
+        self._tail = 0
+
+    def peek(self, length: Optional[int] = None) -> memoryview:
+        '''Return a view of the first `length` bytes from buffer without copying.'''
+        if length is None:
+            return self._view[self._head: self._tail]
+        return self._view[self._head: min(self._tail, self._head + length)]
+
+    def consume(self, length: int):
+        '''Remove first `length` bytes from buffer.'''
+        self._head = min(self._tail, self._head + length)
+        if self._head == self._tail:
+            self._head = self._tail = 0
+
+    def read(self, length: int) -> bytes:
+        '''Remove and return first `length` bytes from buffer.'''
+        ret = bytes(self.peek(length))
+        self.consume(length)
+        return ret
+
+    def write(self, data: bytes):
+        '''Write data into buffer.'''
+        length = len(data)
+        self._reserve(length)
+        self._view[self._tail: self._tail + length] = data
+        self._tail += length
+
+    def recv_into(self, sock: socket.socket, max_size: int = 64 * 1024) -> int:
+        '''Receive at most `max_size` bytes from `sock` directly into buffer.
+
+        Returns:
+            Number of bytes received, 0 on EOF.
+
+        Raises:
+            BlockingIOError -- If `sock` is non-blocking and has no data available.
+        '''
+        self._reserve(max_size)
+        n_received = sock.recv_into(self._view[self._tail: self._tail + max_size])
+        self._tail += n_received
+        return n_received
+
+    def as_bytes(self, length: Optional[int] = None) -> bytes:
+        '''Return the first `length` bytes from buffer.'''
+        return bytes(self.peek(length))
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    def _reserve(self, length: int):
+        '''Make sure at least `length` bytes are writable after tail.'''
+        if self.capacity - self._tail >= length: return
+
+        occupied = len(self)
+        if self.capacity - occupied >= length:
+            # Compact: move data to the front of the same storage.
+            self._view[:occupied] = self._view[self._head: self._tail]
+        else:
+            new_buffer = bytearray(max(2 * self.capacity, occupied + length))
+            new_buffer[:occupied] = self._view[self._head: self._tail]
+            self._buffer = new_buffer
+            self._view = memoryview(new_buffer)
+
+        self._head, self._tail = 0, occupied
+
+    def __len__(self):
+        '''Return length of current buffer.'''
+        return self._tail - self._head
+
+    def __bool__(self):
+        return self._tail != self._head
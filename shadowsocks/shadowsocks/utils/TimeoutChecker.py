@@ -6,11 +6,19 @@ Timeout = Union[int, float]
 
 class TimeoutChecker:
     def __init__(self, 
-                 timeout: Timeout,
+                 timeout: Optional[Timeout],
                  start_time: Optional[float] = None):
+        '''Constructor
+
+        Arguments:
+            timeout -- 0 for non-blocking, None for never expire, non-negative numeric for timeout in seconds.
+
+        Keyword Arguments:
+            start_time -- Start time in `time.time()` scale. (default: {now})
+        '''
         
         start_time = start_time or time.time()
-        self._expire_time = start_time + timeout
+        self._expire_time = None if timeout is None else start_time + timeout
         self._blocking = (timeout != 0)
 
     def timeout_expired(self) -> bool:
@@ -18,7 +26,20 @@ class TimeoutChecker:
         
 
         Returns:
-            Whether timeout expired. If timout initiated by 0, always return False.
+            Whether timeout expired. If timout initiated by 0 or None, always return False.
         '''        
 
-        return (self._blocking and time.time() > self._expire_time)
\ No newline at end of file
+        return (self._blocking 
+                and self._expire_time is not None 
+                and time.time() > self._expire_time)
+
+    def remaining(self) -> Optional[float]:
+        '''Return seconds left before timeout expires.
+
+        Returns:
+            None if timeout never expires, 0 in non-blocking mode or when already expired.
+        '''
+
+        if not self._blocking: return 0
+        if self._expire_time is None: return None
+        return max(0, self._expire_time - time.time())
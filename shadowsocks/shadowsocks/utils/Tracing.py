@@ -0,0 +1,173 @@
+import itertools
+import random
+import threading
+import time
+
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+
+class Span(NamedTuple):
+    stage: str
+    trace_id: int       # Identifies the traced connection.
+    start_ns: int       # `time.perf_counter_ns` at stage start.
+    duration_ns: int
+
+
+SpanCallback = Callable[[Span], None]
+
+# (stage, attribute holding the object, method name) instrumented on a sampled `Connection`.
+CONNECTION_STAGES = (
+    ('init_socket',  None,              '_init_socket'),
+    ('send_message', None,              '_send_message'),
+    ('send',         None,              '_send_all'),
+    ('recv',         None,              '_recv'),
+    ('init_key',     'uplink_cipher',   'init_key'),
+    ('init_key',     'downlink_cipher', 'init_key'),
+    ('encrypt',      'uplink_cipher',   'encrypt_chunk'),
+    ('encrypt',      'uplink_cipher',   'encrypt_into'),
+    ('decrypt',      'downlink_cipher', 'decrypt_chunk'),
+    ('decrypt',      'downlink_cipher', 'decrypt_chunk_payload'),
+)
+
+
+class Tracer:
+    '''Emit timing spans of the main stages of sampled connections to `callback`.
+
+    One in `sample_rate` connections is traced. Tracing replaces the stage methods
+    on the sampled connection and its ciphers only, so connections which are not
+    sampled run the unmodified methods at no cost. The callback runs on the
+    thread of the traced stage and should return quickly.
+    '''
+
+    def __init__(self, callback: SpanCallback, sample_rate: int = 1, random_sampling: bool = False):
+        '''Constructor
+
+        Arguments:
+            callback -- Called with a `Span` at the end of every traced stage.
+
+        Keyword Arguments:
+            sample_rate -- Trace 1 in `sample_rate` connections. (default: {1})
+            random_sampling -- Sample at random instead of every `sample_rate`-th connection. (default: {False})
+        '''
+        if sample_rate < 1: raise ValueError('sample_rate should be at least 1.')
+
+        self.callback = callback
+        self.sample_rate = sample_rate
+        self.random_sampling = random_sampling
+        self._n_connections = itertools.count()
+        self._trace_ids = itertools.count(1)
+
+    def sample(self) -> bool:
+        if self.random_sampling:
+            return random.randrange(self.sample_rate) == 0
+        return next(self._n_connections) % self.sample_rate == 0
+
+    def instrument(self, connection: Any) -> int:
+        '''Trace `connection` if it is sampled.
+
+        Returns:
+            The trace id of `connection`, 0 if it is not traced.
+        '''
+        if not self.sample(): return 0
+
+        trace_id = next(self._trace_ids)
+        for stage, attribute, method_name in CONNECTION_STAGES:
+            target = connection if attribute is None else getattr(connection, attribute)
+            self._wrap(target, method_name, stage, trace_id)
+        return trace_id
+
+    def _wrap(self, target: Any, method_name: str, stage: str, trace_id: int):
+        method = getattr(target, method_name)
+        callback = self.callback
+
+        def traced(*args, **kwargs):
+            start_ns = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                callback(Span(stage, trace_id, start_ns, time.perf_counter_ns() - start_ns))
+
+        setattr(target, method_name, traced)
+
+    def emit(self, stage: str, trace_id: int, start_ns: int):
+        '''Emit a span of `stage` from `start_ns` until now.'''
+        self.callback(Span(stage, trace_id, start_ns, time.perf_counter_ns() - start_ns))
+
+
+_tracer: Optional[Tracer] = None
+
+
+def set_tracer(tracer: Optional[Tracer]):
+    '''Install `tracer` for connections created from now on, None to disable tracing.'''
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+class TraceReporter:
+    '''Span callback collecting a per-stage latency breakdown.
+
+    Keeps at most `max_samples` durations per stage by reservoir sampling, so
+    memory stays bounded however long it runs. Counts and totals are exact.
+    '''
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._samples: Dict[str, List[int]] = defaultdict(list)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._totals: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span):
+        with self._lock:
+            count = self._counts[span.stage] + 1
+            self._counts[span.stage] = count
+            self._totals[span.stage] += span.duration_ns
+
+            samples = self._samples[span.stage]
+            if len(samples) < self.max_samples:
+                samples.append(span.duration_ns)
+            else:
+                index = random.randrange(count)
+                if index < self.max_samples: samples[index] = span.duration_ns
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        '''Return {stage: {count, total_ms, share, p50_us, p90_us, p99_us, max_us}}.
+
+        `share` is the fraction of the time of all stages, nested stages (e.g.
+        encryption inside sending a message) are counted in both.
+        '''
+        with self._lock:
+            samples = {stage: sorted(durations) for stage, durations in self._samples.items()}
+            counts = dict(self._counts)
+            totals = dict(self._totals)
+
+        total_time = sum(totals.values()) or 1
+        def percentile(durations: List[int], fraction: float) -> float:
+            return durations[min(len(durations) - 1, int(fraction * len(durations)))] / 1e3
+
+        return {
+            stage: {
+                'count': counts[stage],
+                'total_ms': totals[stage] / 1e6,
+                'share': totals[stage] / total_time,
+                'p50_us': percentile(durations, 0.5),
+                'p90_us': percentile(durations, 0.9),
+                'p99_us': percentile(durations, 0.99),
+                'max_us': durations[-1] / 1e3,
+            }
+            for stage, durations in sorted(samples.items(), key=lambda item: -totals[item[0]])
+        }
+
+    def format(self) -> str:
+        '''Return the report as a text table, stages sorted by total time.'''
+        lines = [f'{"stage":<16}{"count":>10}{"total ms":>12}{"share":>8}'
+                 f'{"p50 us":>10}{"p90 us":>10}{"p99 us":>10}{"max us":>10}']
+        for stage, row in self.report().items():
+            lines.append(f'{stage:<16}{row["count"]:>10}{row["total_ms"]:>12.2f}{row["share"]:>8.1%}'
+                         f'{row["p50_us"]:>10.1f}{row["p90_us"]:>10.1f}{row["p99_us"]:>10.1f}{row["max_us"]:>10.1f}')
+        return '\n'.join(lines)
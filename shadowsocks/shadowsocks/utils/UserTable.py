@@ -0,0 +1,164 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from ..cipher.AEAD.AEAD_CipherBase import AEAD_CipherBase
+    from ..cipher.CipherParamerters import CipherParamerters
+
+import asyncio
+import time
+
+from collections import OrderedDict
+from typing import Dict, Mapping, Optional, Tuple
+
+from ..cipher.AEAD.AEAD_CipherBase import master_key
+
+# Key trials between yields to the event loop, about a millisecond of work.
+TRIAL_BATCH_SIZE = 64
+
+
+class UserTable:
+    '''Passwords of a multi-user server, identifying the user of a connection from its first chunk.
+
+    AEAD streams carry no user name, so the key of every user is tried on the
+    length of the first chunk until its tag verifies. To keep that cheap:
+
+    - master keys are derived once, a trial only derives the session subkey;
+    - users are tried most recently identified first;
+    - the user last identified for a client address is tried before anyone else,
+      so a returning client costs one trial however many users there are.
+
+    A client of no user still costs one trial per user. Trials are run in
+    batches of `TRIAL_BATCH_SIZE` between which other tasks of the event loop
+    run, and a client address failing `max_unknown` times within
+    `unknown_window` seconds is refused without trials until the window ends.
+    Not thread-safe, use one per event loop.
+    '''
+
+    def __init__(self,
+                 users: Mapping[str, str],
+                 cipher_parameters: CipherParamerters,
+                 max_clients: int = 65536,
+                 max_unknown: int = 16,
+                 unknown_window: float = 60):
+        '''Constructor
+
+        Arguments:
+            users -- User name -> password.
+            cipher_parameters -- Cipher shared by all users.
+
+        Keyword Arguments:
+            max_clients -- Client addresses whose last user or failures are remembered, least recently used are forgotten. (default: {65536})
+            max_unknown -- Failed identifications of a client address before it is refused. (default: {16})
+            unknown_window -- Seconds over which failures of a client address are counted. (default: {60})
+        '''
+        if not users: raise ValueError('At least one user is required.')
+
+        self.max_clients = max_clients
+        self.max_unknown = max_unknown
+        self.unknown_window = unknown_window
+        # name -> (password, master key), most recently identified first.
+        self._users: 'OrderedDict[str, Tuple[str, bytes]]' = OrderedDict(
+            (name, (password, master_key(password, cipher_parameters.key_size)))
+            for name, password in users.items())
+        # client address -> name of its last user.
+        self._clients: 'OrderedDict[str, str]' = OrderedDict()
+        # client address -> (start of its counting window, failures in it).
+        self._unknown_clients: 'OrderedDict[str, Tuple[float, int]]' = OrderedDict()
+
+        self.n_identified = 0
+        self.n_unknown = 0
+        self.n_trials = 0
+        self.n_client_hits = 0
+        self.n_throttled = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def password(self, name: str) -> str:
+        return self._users[name][0]
+
+    async def identify(self,
+                       cipher: AEAD_CipherBase,
+                       salt: bytes,
+                       chunk_size_bytes: bytes,
+                       client_addr: Optional[str] = None) -> Tuple[str, int]:
+        '''Find the user whose key authenticates the first chunk length of a stream.
+
+        Arguments:
+            cipher -- Downlink cipher of the stream, left keyed for the identified user.
+            salt -- Salt of the stream.
+            chunk_size_bytes -- Encrypted length and tag of the first chunk.
+
+        Keyword Arguments:
+            client_addr -- Client host, to try its previous user first. (default: {None})
+
+        Raises:
+            ValueError -- If no user key authenticates the chunk length, or the client is refused.
+
+        Returns:
+            (user name, chunk size)
+        '''
+        name = self._clients.get(client_addr) if client_addr is not None else None
+        chunk_size = self._try(cipher, name, salt, chunk_size_bytes) if name is not None else None
+
+        if chunk_size is not None:
+            self.n_client_hits += 1
+            self._clients.move_to_end(client_addr)
+        else:
+            if client_addr is not None and self._throttled(client_addr):
+                self.n_throttled += 1
+                raise ValueError('Too many failed identifications from the client.')
+
+            skipped = name
+            # A copy, other identifications reorder the users while this one yields.
+            for i, name in enumerate(list(self._users)):
+                if i and i % TRIAL_BATCH_SIZE == 0: await asyncio.sleep(0)
+                if name == skipped: continue
+                chunk_size = self._try(cipher, name, salt, chunk_size_bytes)
+                if chunk_size is not None: break
+            else:
+                self.n_unknown += 1
+                if client_addr is not None: self._count_unknown(client_addr)
+                raise ValueError('No user key authenticates the chunk.')
+
+            if client_addr is not None:
+                self._clients[client_addr] = name
+                self._clients.move_to_end(client_addr)
+                if len(self._clients) > self.max_clients: self._clients.popitem(last=False)
+
+        self._users.move_to_end(name, last=False)
+        self.n_identified += 1
+        return name, chunk_size
+
+    def _throttled(self, client_addr: str) -> bool:
+        window = self._unknown_clients.get(client_addr)
+        if window is None: return False
+        if time.monotonic() - window[0] >= self.unknown_window:
+            del self._unknown_clients[client_addr]
+            return False
+        return window[1] >= self.max_unknown
+
+    def _count_unknown(self, client_addr: str):
+        now = time.monotonic()
+        start, n_unknown = self._unknown_clients.get(client_addr, (now, 0))
+        if now - start >= self.unknown_window: start, n_unknown = now, 0
+        self._unknown_clients[client_addr] = (start, n_unknown + 1)
+        self._unknown_clients.move_to_end(client_addr)
+        if len(self._unknown_clients) > self.max_clients: self._unknown_clients.popitem(last=False)
+
+    def _try(self, cipher: AEAD_CipherBase, name: str, salt: bytes, chunk_size_bytes: bytes) -> Optional[int]:
+        self.n_trials += 1
+        cipher.init_subkey(self._users[name][1], salt)
+        try:
+            return cipher.decrypt_chunk_size(chunk_size_bytes)
+        except ValueError:
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'n_identified_users': self.n_identified,
+            'n_unknown_users': self.n_unknown,
+            'n_user_trials': self.n_trials,
+            'n_client_user_hits': self.n_client_hits,
+            'n_throttled_clients': self.n_throttled,
+        }
@@ -0,0 +1,270 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import queue
+import socket
+import threading
+import time
+
+from collections import Counter
+from typing import Any, Callable, Collection, Dict, Optional
+
+from .MetricsServer import start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+# Seconds between stats reports of a worker process to the supervisor.
+WORKER_STATS_INTERVAL = 1
+
+# Worker entry point: (worker_id, listen_addr, listen_port, listen_socket, stats_queue).
+# `listen_socket` is None when the worker should bind its own socket with SO_REUSEPORT.
+WorkerTarget = Callable[[int, str, int, Optional[socket.socket], Any], None]
+# Builds the server of a process: (listen_addr, listen_port, reuse_port) -> server.
+# The server has `async start(sock=None)`, `async serve_forever()`, `stats()` and
+# `listen_port`, like `Server` and `LocalServer`.
+ServerFactory = Callable[[str, int, bool], Any]
+
+
+def reuse_port_supported() -> bool:
+    return hasattr(socket, 'SO_REUSEPORT')
+
+
+def create_listen_socket(listen_addr: str, listen_port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ':' in listen_addr else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((listen_addr, listen_port))
+    return sock
+
+
+async def start_server(client_connected_cb: Callable,
+                       listen_addr: str,
+                       listen_port: int,
+                       sock: Optional[socket.socket] = None,
+                       reuse_port: bool = False,
+                       **kwargs) -> asyncio.base_events.Server:
+    '''`asyncio.start_server` on `sock` if given, else on `listen_addr`:`listen_port`.
+
+    Extra keyword arguments are passed to `asyncio.start_server`.
+    '''
+    if sock is not None:
+        return await asyncio.start_server(client_connected_cb, sock=sock, **kwargs)
+    return await asyncio.start_server(client_connected_cb, listen_addr, listen_port,
+                                      reuse_port=reuse_port or None, **kwargs)
+
+
+def run_worker(new_server: ServerFactory,
+               worker_id: int,
+               listen_addr: str,
+               listen_port: int,
+               listen_socket: Optional[socket.socket],
+               stats_queue: Any):
+    '''Entry point of a worker process, bind `new_server` with `functools.partial` to get a `WorkerTarget`.'''
+    server = new_server(listen_addr, listen_port, listen_socket is None)
+
+    async def serve():
+        await server.start(listen_socket)
+        while True:
+            await asyncio.sleep(WORKER_STATS_INTERVAL)
+            stats_queue.put((worker_id, server.stats()))
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(new_server: ServerFactory,
+          n_workers: int,
+          listen_addr: str,
+          listen_port: int,
+          name: str,
+          description: str,
+          stats_interval: float = 60,
+          metrics_port: Optional[int] = None,
+          gauges: Collection[str] = (),
+          stats: Optional[Callable[[], Dict[str, int]]] = None):
+    '''Run the server of `new_server` until interrupted, in this process or in `n_workers` worker processes.
+
+    Arguments:
+        new_server -- Picklable server factory (a partial of a module level function).
+        name -- Metrics source name.
+        description -- What is listening, for the logs.
+
+    Keyword Arguments:
+        stats_interval -- Seconds between stats logs in multi-worker mode. (default: {60})
+        metrics_port -- Serve the stats on 127.0.0.1 at this port, None to not serve them. (default: {None})
+        gauges -- Stats of the server which are not counters, see `WorkerSupervisor`. (default: {()})
+        stats -- Stats of state shared by the workers, added once to theirs. (default: {None})
+    '''
+    if n_workers > 1:
+        supervisor = WorkerSupervisor(functools.partial(run_worker, new_server),
+                                      n_workers,
+                                      listen_addr,
+                                      listen_port,
+                                      gauges=gauges)
+        def all_stats() -> Dict[str, int]:
+            return {**supervisor.stats(), **(stats() if stats is not None else {})}
+
+        supervisor.start()
+        if metrics_port is not None:
+            start_metrics_server(metrics_port, name, all_stats)
+        logger.info('%s listening on %s:%d with %d workers (%s)',
+                    description, listen_addr, supervisor.listen_port, n_workers,
+                    'SO_REUSEPORT' if supervisor.reuse_port else 'shared socket')
+        try:
+            while True:
+                supervisor.supervise(timeout=stats_interval)
+                logger.info('stats: %s', all_stats())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            supervisor.stop()
+        return
+
+    server = new_server(listen_addr, listen_port, False)
+    if metrics_port is not None:
+        start_metrics_server(metrics_port, name, server.stats)
+
+    async def serve_forever():
+        await server.start()
+        logger.info('%s listening on %s:%d', description, listen_addr, server.listen_port)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+class WorkerSupervisor:
+    '''Run several worker processes serving one listening port.
+
+    With SO_REUSEPORT every worker binds its own socket and the kernel spreads
+    connections across them. Otherwise the supervisor binds one listening socket
+    and passes it to every worker. Dead workers are restarted, and the counters
+    workers put on `stats_queue` as `(worker_id, {name: value})` are summed by
+    `stats`. Counters of dead workers are kept in the sums, `gauges` such as
+    active clients only count running workers.
+    '''
+
+    def __init__(self,
+                 target: WorkerTarget,
+                 n_workers: int,
+                 listen_addr: str,
+                 listen_port: int,
+                 reuse_port: Optional[bool] = None,
+                 restart_delay: float = 1,
+                 gauges: Collection[str] = ()):
+        '''Constructor
+
+        Arguments:
+            target -- Worker entry point, must be picklable (a module level function).
+            n_workers -- Number of worker processes.
+            listen_addr, listen_port -- Address to serve, port 0 picks a free port.
+
+        Keyword Arguments:
+            reuse_port -- Use SO_REUSEPORT, None to use it when supported. (default: {None})
+            restart_delay -- Minimum seconds between restarts of one worker. (default: {1})
+            gauges -- Stats describing the current state rather than counting events,
+                      dropped when their worker exits. (default: {()})
+        '''
+
+        self.target = target
+        self.n_workers = n_workers
+        self.listen_addr = listen_addr
+        self.restart_delay = restart_delay
+        self.gauges = frozenset(gauges)
+        self.reuse_port = reuse_port_supported() if reuse_port is None else reuse_port
+
+        self.n_restarts = 0
+
+        # With SO_REUSEPORT this socket only reserves the port, it never listens.
+        self._socket = create_listen_socket(listen_addr, listen_port, self.reuse_port)
+        self.listen_port = self._socket.getsockname()[1]
+        if not self.reuse_port:
+            self._socket.listen(1024)
+
+        self._stats_queue = multiprocessing.Queue()
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._worker_stats: Dict[int, Counter] = {}
+        self._retired_stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats_thread: Optional[threading.Thread] = None
+
+    def _spawn(self, worker_id: int):
+        listen_socket = None if self.reuse_port else self._socket
+        process = multiprocessing.Process(target=self.target,
+                                          args=(worker_id, self.listen_addr, self.listen_port,
+                                                listen_socket, self._stats_queue),
+                                          daemon=True)
+        process.start()
+        self._processes[worker_id] = process
+        self._started_at[worker_id] = time.monotonic()
+
+    def start(self):
+        for worker_id in range(self.n_workers):
+            self._spawn(worker_id)
+
+        self._stats_thread = threading.Thread(target=self._collect_stats, daemon=True)
+        self._stats_thread.start()
+
+    def _collect_stats(self):
+        while not self._stopping.is_set():
+            try:
+                worker_id, stats = self._stats_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                self._worker_stats[worker_id] = Counter(stats)
+
+    def stats(self) -> Dict[str, int]:
+        '''Return counters summed over running workers and workers that exited.'''
+        with self._lock:
+            total = Counter(self._retired_stats)
+            for stats in self._worker_stats.values(): total.update(stats)
+        total['n_workers'] = sum(process.is_alive() for process in self._processes.values())
+        total['n_restarts'] = self.n_restarts
+        return dict(total)
+
+    def supervise(self, timeout: Optional[float] = None):
+        '''Wait for workers to exit and restart them, return after `timeout` seconds or on `stop`.'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while not self._stopping.is_set():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0: return
+
+            sentinels = [process.sentinel for process in self._processes.values()]
+            wait_time = 0.5 if remaining is None else min(0.5, remaining)
+            if not multiprocessing.connection.wait(sentinels, wait_time): continue
+
+            for worker_id, process in list(self._processes.items()):
+                if process.is_alive() or self._stopping.is_set(): continue
+
+                with self._lock:
+                    # Counters of the dead worker restart from zero in its successor.
+                    stats = self._worker_stats.pop(worker_id, Counter())
+                    self._retired_stats.update({name: value for name, value in stats.items()
+                                                if name not in self.gauges})
+
+                delay = self.restart_delay - (time.monotonic() - self._started_at[worker_id])
+                if delay > 0: time.sleep(delay)
+                self.n_restarts += 1
+                self._spawn(worker_id)
+
+    def stop(self, timeout: float = 5):
+        '''Terminate all workers.'''
+        self._stopping.set()
+        for process in self._processes.values(): process.terminate()
+        for process in self._processes.values(): process.join(timeout)
+        if self._stats_thread is not None: self._stats_thread.join(timeout)
+        self._socket.close()
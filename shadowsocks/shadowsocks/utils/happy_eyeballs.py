@@ -0,0 +1,123 @@
+import errno
+import os
+import selectors
+import socket
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .DNSCache import AddrInfo
+from .TimeoutChecker import TimeoutChecker, Timeout
+
+# Seconds before the next address is tried while earlier attempts are pending, RFC 8305 section 5.
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+
+def interleave_families(addresses: Sequence[AddrInfo]) -> List[AddrInfo]:
+    '''Reorder `addresses` alternating address families, starting with the first one (RFC 8305 section 4).'''
+    by_family: Dict[int, List[AddrInfo]] = {}
+    for address in addresses:
+        by_family.setdefault(address[0], []).append(address)
+
+    queues = list(by_family.values())
+    interleaved: List[AddrInfo] = []
+    while queues:
+        for queue in queues: interleaved.append(queue.pop(0))
+        queues = [queue for queue in queues if queue]
+    return interleaved
+
+
+def happy_eyeballs_connect(addresses: Sequence[AddrInfo],
+                           timeout: Optional[Timeout] = None,
+                           attempt_delay: float = CONNECTION_ATTEMPT_DELAY,
+                           in_progress: Optional[Tuple[socket.socket, tuple]] = None) -> socket.socket:
+    '''Connect to the first of `addresses` to accept, racing staggered attempts.
+
+    Addresses are tried in `interleave_families` order. A new attempt starts
+    when the previous one fails or after `attempt_delay` seconds, earlier ones
+    keep running, so a dead or slow address family costs `attempt_delay`
+    instead of a whole connect timeout.
+
+    Arguments:
+        addresses -- Results of `getaddrinfo`.
+
+    Keyword Arguments:
+        timeout -- Seconds for the whole connect, None to wait forever. (default: {None})
+        attempt_delay -- Seconds between starting attempts. (default: {CONNECTION_ATTEMPT_DELAY})
+        in_progress -- (non-blocking socket, address) of a connect already started, e.g. with
+                       TCP Fast Open. It is the first attempt of the race, the other addresses
+                       follow. (default: {None})
+
+    Raises:
+        socket.timeout -- If `timeout` expired before any attempt succeeded.
+        OSError -- Error of the last attempt if all failed.
+
+    Returns:
+        The connected socket, in blocking mode.
+    '''
+    if not addresses: raise OSError('No address to connect to')
+
+    timeout_checker = TimeoutChecker(timeout)
+    pending = interleave_families(addresses)
+    # Sockets with a connect in progress -> address.
+    attempts: Dict[socket.socket, tuple] = {}
+    last_error: Optional[OSError] = None
+    selector = selectors.DefaultSelector()
+
+    if in_progress is not None:
+        sock, sockaddr = in_progress
+        pending = [address for address in pending if address[4] != sockaddr]
+        attempts[sock] = sockaddr
+        selector.register(sock, selectors.EVENT_WRITE)
+
+    def start_next():
+        nonlocal last_error
+        while pending:
+            family, type, proto, _, sockaddr = pending.pop(0)
+            try:
+                sock = socket.socket(family, type, proto)
+            except OSError as e:
+                # e.g. the address family is disabled on this host.
+                last_error = e
+                continue
+            sock.setblocking(False)
+            error = sock.connect_ex(sockaddr)
+            if error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                attempts[sock] = sockaddr
+                selector.register(sock, selectors.EVENT_WRITE)
+                return
+            sock.close()
+            last_error = OSError(error, f'{os.strerror(error)}: {sockaddr}')
+
+    try:
+        if in_progress is None: start_next()
+        while attempts:
+            remaining = timeout_checker.remaining()
+            if remaining == 0: raise socket.timeout('connect timed out')
+            wait = remaining
+            if pending: wait = attempt_delay if remaining is None else min(remaining, attempt_delay)
+
+            events = selector.select(wait)
+            if not events:
+                start_next()
+                continue
+
+            for key, _ in events:
+                sock = key.fileobj
+                selector.unregister(sock)
+                sockaddr = attempts.pop(sock)
+
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0:
+                    sock.setblocking(True)
+                    return sock
+
+                sock.close()
+                last_error = OSError(error, f'{os.strerror(error)}: {sockaddr}')
+                # Start the next attempt right away instead of after the delay.
+                start_next()
+
+        raise last_error or OSError('Connect failed')
+
+    finally:
+        for sock in attempts: sock.close()
+        selector.close()
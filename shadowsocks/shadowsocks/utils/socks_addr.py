@@ -4,6 +4,14 @@ import socket
 import ipaddress
 import re
 
+from functools import lru_cache
+from typing import Dict, Tuple, Union
+
+# Target host accepted by `encode_address`.
+Host = Union[str, bytes, ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+_DOMAIN_PATTERN = re.compile(r'^(?:[a-zA-Z0-9-]{1,63}\.)+[a-zA-Z]{2,63}$')
+
 class SOCKS5_ADDR_TYPE(Enum):
     IPV4   = 0x01
     DOMAIN = 0x03
@@ -11,6 +19,8 @@ class SOCKS5_ADDR_TYPE(Enum):
 
     UNKNOWN = 0xff
 
+_addr_type_values = {addr_type.value for addr_type in SOCKS5_ADDR_TYPE} - {SOCKS5_ADDR_TYPE.UNKNOWN.value}
+
 def to_socks5_addr(addr_type: SOCKS5_ADDR_TYPE, 
                    ip_or_domain: str,
                    port: int) -> bytes:
@@ -29,8 +39,7 @@ def to_socks5_addr(addr_type: SOCKS5_ADDR_TYPE,
     return addr
     
 def determine_addr_type(ip_or_domain: str) -> SOCKS5_ADDR_TYPE:
-    domain_pattern = r'^(?:[a-zA-Z0-9-]{1,63}\.)+[a-zA-Z]{2,63}$'
-    if (re.match(domain_pattern, ip_or_domain) is not None and
+    if (_DOMAIN_PATTERN.match(ip_or_domain) is not None and
         len(ip_or_domain) <= 255):
         
         return SOCKS5_ADDR_TYPE.DOMAIN
@@ -46,4 +55,79 @@ def determine_addr_type(ip_or_domain: str) -> SOCKS5_ADDR_TYPE:
     except ValueError:
         pass
 
-    return SOCKS5_ADDR_TYPE.UNKNOWN
\ No newline at end of file
+    return SOCKS5_ADDR_TYPE.UNKNOWN
+
+@lru_cache(maxsize=4096)
+def encode_address(host: Host, port: int) -> bytes:
+    '''Return the SOCKS5 address of `host`:`port`, cached for hot destinations.
+
+    `host` may be an `ipaddress` address, which is not parsed again, bytes of
+    an encoded domain name, or a string holding an IP or a domain. Strings
+    which are no IP are sent as domains, so single-label names like localhost
+    work too.
+
+    Raises:
+        ValueError -- If the domain is longer than 255 bytes or `port` is out of range.
+    '''
+    if not 0 <= port <= 0xFFFF: raise ValueError(f'Port {port} out of range.')
+    packed_port = struct.pack('!H', port)
+
+    if isinstance(host, str):
+        if _DOMAIN_PATTERN.match(host) is None:
+            try:
+                host = ipaddress.ip_address(host)
+            except ValueError:
+                pass
+        if isinstance(host, str):
+            host = host.encode() if host.isascii() else host.encode('idna')
+
+    if isinstance(host, ipaddress.IPv4Address):
+        return b'\x01' + host.packed + packed_port
+    if isinstance(host, ipaddress.IPv6Address):
+        return b'\x04' + host.packed + packed_port
+
+    if len(host) > 255: raise ValueError('Domain longer than 255 bytes.')
+    return b'\x03' + bytes((len(host), )) + host + packed_port
+
+def encode_address_stats() -> Dict[str, float]:
+    '''Return hits, misses, size and hit_rate of the `encode_address` cache.'''
+    info = encode_address.cache_info()
+    n_lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'hit_rate': info.hits / n_lookups if n_lookups else 0.0,
+    }
+
+def from_socks5_addr(data: bytes) -> Tuple[SOCKS5_ADDR_TYPE, str, int, int]:
+    '''Parse the SOCKS5 address at the beginning of `data`.
+
+    Raises:
+        ValueError -- If the address type is unknown or `data` is too short.
+
+    Returns:
+        (addr_type, ip_or_domain, port, n_consumed_bytes)
+    '''
+    if len(data) < 1: raise ValueError('Empty SOCKS5 address.')
+
+    addr_type = SOCKS5_ADDR_TYPE(data[0]) if data[0] in _addr_type_values else SOCKS5_ADDR_TYPE.UNKNOWN
+    
+    if addr_type == SOCKS5_ADDR_TYPE.IPV4:
+        addr_end = 1 + 4
+        if len(data) < addr_end + 2: raise ValueError('Truncated SOCKS5 address.')
+        ip_or_domain = socket.inet_ntoa(data[1: addr_end])
+    elif addr_type == SOCKS5_ADDR_TYPE.DOMAIN:
+        if len(data) < 2: raise ValueError('Truncated SOCKS5 address.')
+        addr_end = 2 + data[1]
+        if len(data) < addr_end + 2: raise ValueError('Truncated SOCKS5 address.')
+        ip_or_domain = bytes(data[2: addr_end]).decode()
+    elif addr_type == SOCKS5_ADDR_TYPE.IPV6:
+        addr_end = 1 + 16
+        if len(data) < addr_end + 2: raise ValueError('Truncated SOCKS5 address.')
+        ip_or_domain = socket.inet_ntop(socket.AF_INET6, data[1: addr_end])
+    else:
+        raise ValueError(f'Unknown SOCKS5 address type {data[0]:#04x}.')
+
+    port, = struct.unpack('!H', data[addr_end: addr_end + 2])
+    return addr_type, ip_or_domain, port, addr_end + 2
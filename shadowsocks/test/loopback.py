@@ -0,0 +1,310 @@
+import datetime
+import os
+import socket
+import ssl
+import threading
+
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from shadowsocks.cipher.CipherParamerters import CipherParamerters, supported_cipher_parameters
+from shadowsocks.cipher.AEAD.AEAD_CipherBase import AEAD_CipherBase
+from shadowsocks.message.AEAD import AEAD_StreamDecoder
+from shadowsocks.utils.RingBuffer import RingBuffer
+from shadowsocks.utils.socks_addr import from_socks5_addr
+
+TLS_HOSTNAME = 'localhost'
+
+
+class LoopbackEchoServer:
+    '''Minimal threaded Shadowsocks AEAD peer that echoes every payload chunk back.
+
+    The address chunk sent by the client is recorded in `received_addresses` and
+    otherwise ignored, so no target is dialed. The salt goes out with the first
+    reply, or on accept with `salt_first`.
+    '''
+
+    def __init__(self, password: str, cipher_name: str, salt_first: bool = False):
+        self.password = password
+        self.salt_first = salt_first
+        self.cipher_parameters = supported_cipher_parameters[cipher_name]
+        self.received_addresses: List[bytes] = []
+
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(128)
+        self.addr, self.port = self._listener.getsockname()
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._closed:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client, ), daemon=True).start()
+
+    def _handle(self, client: socket.socket):
+        params = self.cipher_parameters
+        try:
+            uplink = params.cipher(params)
+            uplink_salt = b'\x01' * params.salt_size
+            uplink.init_key(self.password, uplink_salt)
+            pending_salt = uplink_salt
+            if self.salt_first:
+                client.sendall(uplink_salt)
+                pending_salt = b''
+
+            salt = self._recv_exactly(client, params.salt_size)
+            if salt is None: return
+            downlink = params.cipher(params)
+            downlink.init_key(self.password, salt)
+
+            address = self._recv_chunk(client, downlink, params)
+            if address is None: return
+            self.received_addresses.append(address)
+
+            while True:
+                chunk = self._recv_chunk(client, downlink, params)
+                if chunk is None: break
+                client.sendall(pending_salt + uplink.encrypt_chunk(chunk))
+                pending_salt = b''
+        except (OSError, ValueError):
+            pass
+        finally:
+            client.close()
+
+    @classmethod
+    def _recv_chunk(cls, 
+                    client: socket.socket, 
+                    cipher: AEAD_CipherBase, 
+                    params: CipherParamerters) -> Optional[bytes]:
+        
+        header = cls._recv_exactly(client, 2 + params.tag_size)
+        if header is None: return None
+        chunk_size = cipher.decrypt_chunk_size(header)
+        body = cls._recv_exactly(client, chunk_size + params.tag_size)
+        if body is None: return None
+        return cipher.decrypt_chunk(header + body)
+
+    @staticmethod
+    def _recv_exactly(client: socket.socket, length: int) -> Optional[bytes]:
+        data = bytearray()
+        while len(data) < length:
+            received = client.recv(length - len(data))
+            if not received: return None
+            data += received
+        return bytes(data)
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+
+
+
+class LoopbackUDPEchoServer:
+    '''Minimal threaded Shadowsocks AEAD UDP peer that echoes every packet back.
+
+    The reply carries the same address header, as if the target echoed the
+    datagram. Decrypted payloads are recorded in `received_payloads`.
+    '''
+
+    def __init__(self, password: str, cipher_name: str):
+        # Imported here so the TCP loopback server does not depend on the UDP codec.
+        from shadowsocks.message.AEAD import AEAD_UDP_Codec
+
+        self.codec = AEAD_UDP_Codec(supported_cipher_parameters[cipher_name], password)
+        self.received_payloads: List[bytes] = []
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(('127.0.0.1', 0))
+        self.addr, self.port = self._socket.getsockname()
+
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                packet, client_addr = self._socket.recvfrom(65535)
+            except OSError:
+                return
+            try:
+                payload = self.codec.decrypt(packet)
+            except ValueError:
+                continue
+            self.received_payloads.append(payload)
+            self._socket.sendto(self.codec.encrypt((payload, )), client_addr)
+
+    def close(self):
+        self._socket.close()
+
+
+class _ThreadedServer(ABC):
+    '''TCP listener on 127.0.0.1 handling every client in its own daemon thread.'''
+
+    def __init__(self):
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(128)
+        self.addr, self.port = self._listener.getsockname()
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._closed:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle, args=(client, ), daemon=True).start()
+
+    @abstractmethod
+    def _handle(self, client: socket.socket):
+        '''Serve `client` until done and close it, runs in the client's thread.'''
+        pass
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+
+
+class EchoServer(_ThreadedServer):
+    '''Plain TCP echo target, optionally wrapped in TLS with `ssl_context`.'''
+
+    def __init__(self, ssl_context: Optional[ssl.SSLContext] = None):
+        self.ssl_context = ssl_context
+        super(EchoServer, self).__init__()
+
+    def _handle(self, client: socket.socket):
+        try:
+            if self.ssl_context is not None:
+                client = self.ssl_context.wrap_socket(client, server_side=True)
+            while True:
+                data = client.recv(256 * 1024)
+                if not data: break
+                client.sendall(data)
+        except (OSError, ssl.SSLError):
+            pass
+        finally:
+            client.close()
+
+
+class LoopbackRelayServer(_ThreadedServer):
+    '''Threaded Shadowsocks AEAD server which dials the requested target and relays to it.
+
+    Only meant for tests and benchmarks on loopback, targets are not restricted.
+    '''
+
+    def __init__(self, password: str, cipher_name: str):
+        self.password = password
+        self.cipher_parameters = supported_cipher_parameters[cipher_name]
+        super(LoopbackRelayServer, self).__init__()
+
+    def _handle(self, client: socket.socket):
+        params = self.cipher_parameters
+        decoder = AEAD_StreamDecoder(params, params.cipher(params), self.password)
+        buffer = RingBuffer()
+        target: Optional[socket.socket] = None
+
+        try:
+            chunks: List[bytes] = []
+            while not chunks:
+                if buffer.recv_into(client) == 0: return
+                chunks = decoder.decode_all(buffer)
+
+            _, host, port, n_consumed_bytes = from_socks5_addr(chunks[0])
+            target = socket.create_connection((host, port))
+            target.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for chunk in [chunks[0][n_consumed_bytes:]] + chunks[1:]:
+                if chunk: target.sendall(chunk)
+
+            threading.Thread(target=self._relay_downlink, args=(target, client), daemon=True).start()
+            while True:
+                if buffer.recv_into(client) == 0:
+                    target.shutdown(socket.SHUT_WR)
+                    return
+                for chunk in decoder.decode_all(buffer): target.sendall(chunk)
+
+        except (OSError, ValueError):
+            client.close()
+            if target is not None: target.close()
+
+    def _relay_downlink(self, target: socket.socket, client: socket.socket):
+        params = self.cipher_parameters
+        uplink = params.cipher(params)
+        salt = os.urandom(params.salt_size)
+        uplink.init_key(self.password, salt)
+
+        plaintext = memoryview(bytearray(16 * params.chunk_size))
+        ciphertext = memoryview(bytearray(params.salt_size + uplink.encrypted_size(len(plaintext))))
+        ciphertext[:params.salt_size] = salt
+        header_size = params.salt_size
+
+        try:
+            while True:
+                n_received = target.recv_into(plaintext)
+                if n_received == 0: break
+                n_encrypted = uplink.encrypt_into(plaintext[:n_received], ciphertext[header_size:])
+                client.sendall(ciphertext[:header_size + n_encrypted])
+                header_size = 0
+        except OSError:
+            pass
+        finally:
+            # shutdown sends FIN and wakes the uplink thread blocked in recv, close alone does neither.
+            for sock in (client, target):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                sock.close()
+
+
+def create_tls_contexts(directory: str):
+    '''Return (server_context, client_context) trusting a new self-signed certificate.
+
+    Returns None if the `cryptography` package is not installed.
+    '''
+    try:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.x509.oid import NameOID
+    except ImportError:
+        return None
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, TLS_HOSTNAME)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (x509.CertificateBuilder()
+                   .subject_name(name)
+                   .issuer_name(name)
+                   .public_key(key.public_key())
+                   .serial_number(x509.random_serial_number())
+                   .not_valid_before(now - datetime.timedelta(days=1))
+                   .not_valid_after(now + datetime.timedelta(days=1))
+                   .add_extension(x509.SubjectAlternativeName([x509.DNSName(TLS_HOSTNAME)]), critical=False)
+                   .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+                   .sign(key, hashes.SHA256()))
+
+    cert_path = os.path.join(directory, 'cert.pem')
+    key_path = os.path.join(directory, 'key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM,
+                                  serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert_path, key_path)
+    client_context = ssl.create_default_context(cafile=cert_path)
+    return server_context, client_context
@@ -0,0 +1,61 @@
+import hashlib
+import unittest
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.cipher.AEAD.AEAD_CipherBase import master_key
+from shadowsocks.cipher.key_gen import EVP_BytesToKey, HKDF_SHA1
+
+
+class TestAEADCipher(unittest.TestCase):
+    def _new_cipher(self, cipher_name, salt=b''):
+        cipher_parameters = supported_cipher_parameters[cipher_name]
+        cipher = cipher_parameters.cipher(cipher_parameters)
+        cipher.init_key('password', salt or b's' * cipher_parameters.salt_size)
+        return cipher
+
+    def test_init_key(self):
+        salt = b'random-salt' * 3
+        cipher = self._new_cipher('AEAD_AES_256_GCM', salt)
+
+        main_key, _ = EVP_BytesToKey(b'password', b'', 32, 0, 1, hashlib.md5)
+        self.assertEqual(cipher.key, HKDF_SHA1(main_key, 32, salt, b'ss-subkey'))
+
+    def test_master_key_cached(self):
+        master_key.cache_clear()
+        self._new_cipher('AEAD_AES_128_GCM')
+        self._new_cipher('AEAD_AES_128_GCM')
+        
+        cache_info = master_key.cache_info()
+        self.assertEqual((cache_info.hits, cache_info.misses), (1, 1))
+
+    def test_chunk_roundtrip(self):
+        for cipher_name in supported_cipher_parameters:
+            with self.subTest(cipher_name=cipher_name):
+                encrypt_cipher = self._new_cipher(cipher_name)
+                decrypt_cipher = self._new_cipher(cipher_name)
+
+                for chunk in [b'hello', b'', b'x' * 0x3fff]:
+                    encrypted = encrypt_cipher.encrypt_chunk(chunk)
+                    self.assertEqual(decrypt_cipher.decrypt_chunk(encrypted), chunk)
+
+    def test_encrypt_into_matches_encrypt_chunk(self):
+        data = bytes(range(256)) * 200
+        for cipher_name in supported_cipher_parameters:
+            with self.subTest(cipher_name=cipher_name):
+                chunk_cipher = self._new_cipher(cipher_name)
+                into_cipher = self._new_cipher(cipher_name)
+                chunk_size = chunk_cipher.cipher_parameters.chunk_size
+
+                expected = b''.join(chunk_cipher.encrypt_chunk(data[i: i + chunk_size])
+                                    for i in range(0, len(data), chunk_size))
+                
+                output = bytearray(into_cipher.encrypted_size(len(data)))
+                n_written = into_cipher.encrypt_into(data, memoryview(output))
+
+                self.assertEqual(n_written, len(output))
+                self.assertEqual(bytes(output), expected)
+
+    def test_encrypt_chunk_too_large(self):
+        cipher = self._new_cipher('AEAD_AES_128_GCM')
+        with self.assertRaises(ValueError):
+            cipher.encrypt_chunk(b'x' * 0x4000)
@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.connection.AsyncConnection import open_connection, relay
+
+from .loopback import LoopbackEchoServer
+
+
+class TestAsyncConnection(unittest.IsolatedAsyncioTestCase):
+    async def test_echo_all_ciphers(self):
+        for cipher_name in supported_cipher_parameters:
+            with self.subTest(cipher_name=cipher_name):
+                server = LoopbackEchoServer('password', cipher_name)
+                try:
+                    connection = await open_connection(server.addr, server.port,
+                                                       'password', cipher_name,
+                                                       'example.com', 80)
+                    connection.send(b'hello')
+                    await connection.drain()
+                    self.assertEqual(await connection.readexactly(5), b'hello')
+
+                    connection.close()
+                    await connection.wait_closed()
+                finally:
+                    server.close()
+
+    async def test_large_data(self):
+        server = LoopbackEchoServer('password', 'AEAD_AES_256_GCM')
+        data = bytes(range(256)) * 1000
+        try:
+            connection = await open_connection(server.addr, server.port,
+                                               'password', 'AEAD_AES_256_GCM',
+                                               '1.2.3.4', 443)
+            connection.send(data)
+            await connection.drain()
+            self.assertEqual(await connection.readexactly(len(data)), data)
+            self.assertEqual(server.received_addresses, [b'\x01\x01\x02\x03\x04\x01\xbb'])
+
+            connection.close()
+            await connection.wait_closed()
+        finally:
+            server.close()
+
+    async def test_eof(self):
+        server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        try:
+            connection = await open_connection(server.addr, server.port,
+                                               'password', 'AEAD_AES_128_GCM',
+                                               'example.com', 80)
+            connection.send(b'x')
+            await connection.drain()
+            self.assertEqual(await connection.recv(10), b'x')
+
+            connection.write_eof()
+            self.assertEqual(await asyncio.wait_for(connection.recv(10), 5), b'')
+            self.assertTrue(connection.at_eof())
+            connection.close()
+        finally:
+            server.close()
+
+    async def test_relay(self):
+        server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        counts = {'sent': 0, 'received': 0}
+
+        async def handle(reader, writer):
+            tunnel = await open_connection(server.addr, server.port,
+                                           'password', 'AEAD_AES_128_GCM',
+                                           'example.com', 80)
+            try:
+                await relay(reader, writer, tunnel,
+                            on_send=lambda n: counts.__setitem__('sent', counts['sent'] + n),
+                            on_recv=lambda n: counts.__setitem__('received', counts['received'] + n))
+            finally:
+                tunnel.close()
+                writer.close()
+
+        app_server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', app_server.sockets[0].getsockname()[1])
+            writer.write(b'hello')
+            writer.write_eof()
+            # EOF goes through the tunnel and comes back after the echo.
+            self.assertEqual(await asyncio.wait_for(reader.read(), 5), b'hello')
+            self.assertEqual(counts, {'sent': 5, 'received': 5})
+            writer.close()
+        finally:
+            app_server.close()
+            server.close()
+
+    async def test_unsupported_cipher(self):
+        with self.assertRaises(ValueError):
+            await open_connection('127.0.0.1', 1, 'password', 'NOT_A_CIPHER', 'example.com', 80)
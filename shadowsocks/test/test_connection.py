@@ -0,0 +1,179 @@
+import socket
+import threading
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from shadowsocks.connection.Connection import Connection
+
+from .loopback import EchoServer, LoopbackEchoServer, LoopbackRelayServer
+
+
+class TestConnection(unittest.TestCase):
+    def setUp(self):
+        self.server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        self.connection = Connection(self.server.addr, self.server.port,
+                                     'password', 'AEAD_AES_128_GCM',
+                                     'example.com', 80)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.close()
+
+    def _recv_exactly(self, length: int) -> bytes:
+        received = b''
+        while len(received) < length:
+            data = self.connection.recv(length - len(received))
+            if not data: break
+            received += data
+        return received
+
+    def test_echo(self):
+        self.connection.settimeout(5)
+        self.connection.send(b'hello')
+        self.assertEqual(self._recv_exactly(5), b'hello')
+
+    def test_large_data(self):
+        data = bytes(range(256)) * 1000
+        self.connection.settimeout(5)
+        self.connection.send(data)
+        self.assertEqual(self._recv_exactly(len(data)), data)
+
+    def test_send_exceeding_socket_buffer(self):
+        data = bytes(range(256)) * 16 * 1024
+        self.connection.settimeout(5)
+        
+        received = []
+        receiver = threading.Thread(target=lambda: received.append(self._recv_exactly(len(data))))
+        receiver.start()
+        self.connection.send(data)
+        receiver.join()
+
+        self.assertEqual(received, [data])
+
+    def test_bulk_mode(self):
+        data = bytes(range(256)) * 4 * 1024
+        self.connection.settimeout(5)
+        
+        with ThreadPoolExecutor(4) as executor:
+            self.connection.set_bulk_mode(executor)
+            received = []
+            receiver = threading.Thread(target=lambda: received.append(self._recv_exactly(len(data))))
+            receiver.start()
+            self.connection.send(data)
+            self.connection.send(b'tail')
+            receiver.join()
+
+            self.assertEqual(received, [data])
+            self.assertEqual(self._recv_exactly(4), b'tail')
+
+    def test_non_blocking(self):
+        self.assertEqual(self.connection.recv(10), b'')
+
+    def test_timeout_does_not_spin(self):
+        self.connection.settimeout(0.5)
+
+        start_cpu_time = time.process_time()
+        with self.assertRaises(socket.timeout):
+            self.connection.recv(10)
+        
+        # A busy-waiting reader would consume about 0.5s of CPU time.
+        self.assertLess(time.process_time() - start_cpu_time, 0.2)
+
+    def test_send_buffer_sized_to_data(self):
+        self.connection.send(b'hello')
+        self.assertEqual(len(self.connection._send_buffer), 5 + 2 * 16 + 2)
+
+
+class TestSendTimeout(unittest.TestCase):
+    def test_send_to_stalled_server(self):
+        # Accepts but never reads.
+        listener = socket.create_server(('127.0.0.1', 0))
+        connection = Connection('127.0.0.1', listener.getsockname()[1],
+                                'password', 'AEAD_AES_128_GCM',
+                                'example.com', 80)
+        try:
+            connection.settimeout(0.5)
+            start_time = time.monotonic()
+            with self.assertRaises(socket.timeout):
+                # Far more than the socket buffers hold.
+                for _ in range(64): connection.send(bytes(1024 * 1024))
+            self.assertLess(time.monotonic() - start_time, 5)
+        finally:
+            connection.close()
+            listener.close()
+
+
+class TestLazyConnect(unittest.TestCase):
+    def setUp(self):
+        self.server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_handshake_sent_with_first_data(self):
+        connection = Connection(self.server.addr, self.server.port, 'password', 'AEAD_AES_128_GCM',
+                                'example.com', 80, lazy_connect=True)
+        try:
+            self.assertTrue(connection.handshake_pending)
+            self.assertEqual(connection.perf.send_syscalls, 0)
+
+            connection.settimeout(5)
+            connection.send(b'hello')
+            self.assertFalse(connection.handshake_pending)
+            # Salt, address and payload in a single write.
+            self.assertEqual(connection.perf.send_syscalls, 1)
+            self.assertEqual(connection.recv(5), b'hello')
+            self.assertEqual(self.server.received_addresses, [b'\x03\x0bexample.com\x00\x50'])
+        finally:
+            connection.close()
+
+    def test_recv_sends_handshake(self):
+        connection = Connection(self.server.addr, self.server.port, 'password', 'AEAD_AES_128_GCM',
+                                'example.com', 80, lazy_connect=True)
+        try:
+            self.assertEqual(connection.recv(10), b'')
+            self.assertFalse(connection.handshake_pending)
+            self.assertEqual(connection.perf.send_syscalls, 1)
+        finally:
+            connection.close()
+
+    def test_fast_open(self):
+        # Falls back to a regular connect where TCP Fast Open is unavailable.
+        target = EchoServer()
+        server = LoopbackRelayServer('password', 'AEAD_AES_128_GCM')
+        connection = Connection(server.addr, server.port, 'password', 'AEAD_AES_128_GCM',
+                                target.addr, target.port, fast_open=True)
+        try:
+            connection.settimeout(5)
+            connection.send(b'hello')
+            received = b''
+            while len(received) < 5:
+                received += connection.recv(5)
+            self.assertEqual(received, b'hello')
+        finally:
+            connection.close()
+            server.close()
+            target.close()
+
+
+class TestConnectionToTarget(unittest.TestCase):
+    def test_relay_to_echo_target(self):
+        target = EchoServer()
+        server = LoopbackRelayServer('password', 'AEAD_AES_256_GCM')
+        connection = Connection(server.addr, server.port, 'password', 'AEAD_AES_256_GCM',
+                                target.addr, target.port)
+        try:
+            data = bytes(range(256)) * 1000
+            connection.settimeout(5)
+            connection.send(data)
+
+            received = b''
+            while len(received) < len(data):
+                received += connection.recv(len(data))
+            self.assertEqual(received, data)
+        finally:
+            connection.close()
+            server.close()
+            target.close()
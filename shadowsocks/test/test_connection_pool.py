@@ -0,0 +1,117 @@
+import os
+import socket
+import time
+import unittest
+
+from shadowsocks.connection.ConnectionPool import ConnectionPool
+
+from .loopback import LoopbackEchoServer
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        self.pool = ConnectionPool(self.server.addr, self.server.port,
+                                   'password', 'AEAD_AES_128_GCM',
+                                   max_size=3, health_check_interval=None)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.close()
+
+    def _echo(self, connection, data):
+        connection.settimeout(5)
+        connection.send(data)
+        received = b''
+        while len(received) < len(data):
+            received += connection.recv(len(data) - len(received))
+        return received
+
+    def test_acquire_warm(self):
+        self.pool.fill()
+        self.assertEqual(len(self.pool), 3)
+
+        connection = self.pool.acquire('example.com', 80)
+        self.assertEqual(self._echo(connection, b'hello'), b'hello')
+        self.assertEqual(len(self.pool), 2)
+        self.assertEqual((self.pool.hits, self.pool.misses), (1, 0))
+        connection.close()
+
+    def test_acquire_empty(self):
+        connection = self.pool.acquire('example.com', 80)
+        self.assertEqual(self._echo(connection, b'hello'), b'hello')
+        self.assertEqual((self.pool.hits, self.pool.misses), (0, 1))
+        connection.close()
+
+    def test_acquire_warm_salt_first(self):
+        # Servers sending their salt before the address leave pooled sockets readable.
+        server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM', salt_first=True)
+        pool = ConnectionPool(server.addr, server.port,
+                              'password', 'AEAD_AES_128_GCM',
+                              max_size=1, health_check_interval=None)
+        try:
+            pool.fill()
+            connection = pool._idle[0][0]
+            self.assertTrue(connection.wait_readable(5))
+
+            pool.evict()
+            self.assertEqual(len(pool), 1)
+            connection = pool.acquire('example.com', 80)
+            self.assertEqual(self._echo(connection, b'hello'), b'hello')
+            self.assertEqual((pool.hits, pool.misses), (1, 0))
+            connection.close()
+        finally:
+            pool.close()
+            server.close()
+
+    def test_acquire_warm_high_fd(self):
+        try:
+            import resource
+        except ImportError:
+            raise unittest.SkipTest('resource module not available')
+        if resource.getrlimit(resource.RLIMIT_NOFILE)[0] < 2048:
+            raise unittest.SkipTest('needs more than 2048 file descriptors')
+        # Push the pooled sockets above FD_SETSIZE.
+        fillers = [os.open(os.devnull, os.O_RDONLY) for _ in range(1100)]
+        try:
+            self.pool.fill()
+            self.assertGreater(self.pool._idle[0][0].connection.fileno(), 1024)
+
+            connection = self.pool.acquire('example.com', 80)
+            self.assertEqual(self._echo(connection, b'hello'), b'hello')
+            self.assertEqual((self.pool.hits, self.pool.misses), (1, 0))
+            connection.close()
+        finally:
+            for fd in fillers: os.close(fd)
+
+    def test_evict_idle(self):
+        self.pool.fill()
+        self.pool.max_idle_time = 0
+        time.sleep(0.01)
+        
+        self.pool.evict()
+        self.assertEqual(len(self.pool), 0)
+
+    def test_evict_unhealthy(self):
+        self.pool.fill()
+        connection, _ = self.pool._idle[0]
+        connection.connection.shutdown(socket.SHUT_RD)
+
+        self.pool.evict()
+        self.assertEqual(len(self.pool), 2)
+
+    def test_background_refill(self):
+        pool = ConnectionPool(self.server.addr, self.server.port,
+                              'password', 'AEAD_AES_128_GCM',
+                              max_size=2, health_check_interval=0.05)
+        try:
+            deadline = time.monotonic() + 5
+            while len(pool) < 2 and time.monotonic() < deadline: time.sleep(0.01)
+            self.assertEqual(len(pool), 2)
+
+            pool.acquire('example.com', 80).close()
+            deadline = time.monotonic() + 5
+            while len(pool) < 2 and time.monotonic() < deadline: time.sleep(0.01)
+            self.assertEqual(len(pool), 2)
+        finally:
+            pool.close()
@@ -0,0 +1,102 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from shadowsocks.cipher.CipherParamerters import CIPHER_TYPE, CipherRegistry, supported_cipher_parameters
+from shadowsocks.cipher.AEAD.backend import (AEAD_ALGORITHM, CryptographyBackend, 
+                                             PyCryptodomeBackend, select_backend)
+from shadowsocks.cipher.AEAD.backend.CryptographyBackend import cryptography_available
+
+
+class TestCryptoBackend(unittest.TestCase):
+    def _new_cipher(self, cipher_name, backend):
+        cipher_parameters = supported_cipher_parameters[cipher_name].with_backend(backend)
+        cipher = cipher_parameters.cipher(cipher_parameters)
+        cipher.init_key('password', b's' * cipher_parameters.salt_size)
+        return cipher
+
+    @unittest.skipUnless(cryptography_available, 'cryptography not installed')
+    def test_backends_interoperate(self):
+        for cipher_name in ['AEAD_AES_128_GCM', 'AEAD_AES_256_GCM', 'AEAD_CHACHA20_IETF_POLY1305']:
+            with self.subTest(cipher_name=cipher_name):
+                pycryptodome_cipher = self._new_cipher(cipher_name, 'pycryptodome')
+                cryptography_cipher = self._new_cipher(cipher_name, 'cryptography')
+
+                encrypted = pycryptodome_cipher.encrypt_chunk(b'hello')
+                self.assertEqual(cryptography_cipher.decrypt_chunk(encrypted), b'hello')
+
+                output = bytearray(cryptography_cipher.encrypted_size(5))
+                cryptography_cipher.encrypt_into(b'world', memoryview(output))
+                self.assertEqual(pycryptodome_cipher.decrypt_chunk(bytes(output)), b'world')
+
+    def test_tampered_raises_value_error(self):
+        backends = ['pycryptodome'] + (['cryptography'] if cryptography_available else [])
+        for backend in backends:
+            with self.subTest(backend=backend):
+                encrypt_cipher = self._new_cipher('AEAD_AES_128_GCM', backend)
+                decrypt_cipher = self._new_cipher('AEAD_AES_128_GCM', backend)
+
+                encrypted = bytearray(encrypt_cipher.encrypt_chunk(b'hello'))
+                encrypted[-1] ^= 0xff
+                with self.assertRaises(ValueError):
+                    decrypt_cipher.decrypt_chunk(bytes(encrypted))
+
+    def test_select_backend(self):
+        aes = supported_cipher_parameters['AEAD_AES_128_GCM']
+        self.assertIs(select_backend(AEAD_ALGORITHM.AES_GCM, aes.with_backend('pycryptodome')), 
+                      PyCryptodomeBackend)
+        
+        # 8 bytes nonce is only implemented by pycryptodome.
+        chacha_8 = supported_cipher_parameters['AEAD_CHACHA20_POLY1305']
+        self.assertIs(select_backend(AEAD_ALGORITHM.CHACHA20_POLY1305, chacha_8), PyCryptodomeBackend)
+        
+        with self.assertRaises(ValueError):
+            select_backend(AEAD_ALGORITHM.CHACHA20_POLY1305, chacha_8.with_backend('cryptography'))
+        with self.assertRaises(ValueError):
+            select_backend(AEAD_ALGORITHM.AES_GCM, aes.with_backend('unknown'))
+
+    @unittest.skipUnless(cryptography_available, 'cryptography not installed')
+    def test_default_prefers_cryptography(self):
+        aes = supported_cipher_parameters['AEAD_AES_128_GCM']
+        self.assertIs(select_backend(AEAD_ALGORITHM.AES_GCM, aes), CryptographyBackend)
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_crypto_libraries_loaded_on_first_use(self):
+        check = '''
+import json, sys
+import shadowsocks.connection.Connection, shadowsocks.local, shadowsocks.server
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters as ciphers
+
+def loaded():
+    return sorted({name.split('.')[0] for name in sys.modules} & {'Crypto', 'cryptography'})
+
+imported = loaded()
+names = list(ciphers), 'AEAD_AES_128_GCM' in ciphers
+listed = loaded()
+params = ciphers['AEAD_AES_128_GCM']
+params.cipher(params)
+print(json.dumps([imported, listed, loaded()]))
+'''
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True, check=True, cwd=root)
+        imported, listed, used = json.loads(process.stdout)
+
+        self.assertEqual(imported, [])
+        self.assertEqual(listed, [])
+        self.assertNotEqual(used, [])
+
+    def test_registry(self):
+        registry = CipherRegistry()
+        registry.register('AES', '.AEAD.AEAD_AES_GCM.AEAD_AES_GCM', cipher_type=CIPHER_TYPE.AEAD,
+                          key_size=16, tag_size=16, salt_size=16, nonce_size=12, chunk_size=0x3fff)
+
+        self.assertIn('AES', registry)
+        self.assertNotIn('DES', registry)
+        self.assertEqual(list(registry), ['AES'])
+        self.assertIs(registry['AES'], registry['AES'])
+        self.assertEqual(registry['AES'].cipher.__name__, 'AEAD_AES_GCM')
+        with self.assertRaises(KeyError):
+            registry['DES']
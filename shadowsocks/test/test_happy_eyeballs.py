@@ -0,0 +1,223 @@
+import socket
+import threading
+import time
+import unittest
+
+from shadowsocks.connection.Connection import Connection
+from shadowsocks.utils.DNSCache import DNSCache
+from shadowsocks.utils.happy_eyeballs import happy_eyeballs_connect, interleave_families
+
+from .loopback import LoopbackEchoServer
+
+
+def addrinfo(host: str, port: int, family: int = socket.AF_INET):
+    return (family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (host, port))
+
+
+class StubResolver:
+    '''Resolves names of `records` to loopback addresses, counting lookups.'''
+
+    def __init__(self, records):
+        self.records = records
+        self.n_lookups = 0
+
+    def __call__(self, host, port, type=0):
+        self.n_lookups += 1
+        if host not in self.records: raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [addrinfo(address, port) for address in self.records[host]]
+
+
+class TestDNSCache(unittest.TestCase):
+    def test_hit(self):
+        resolver = StubResolver({'ss.test': ['127.0.0.1']})
+        dns_cache = DNSCache(resolver=resolver)
+
+        self.assertEqual(dns_cache.resolve('ss.test', 8388), [addrinfo('127.0.0.1', 8388)])
+        self.assertEqual(dns_cache.resolve('ss.test', 8388), [addrinfo('127.0.0.1', 8388)])
+        self.assertEqual(resolver.n_lookups, 1)
+        self.assertEqual(dns_cache.stats(), {'size': 1, 'hits': 1, 'misses': 1})
+
+    def test_expiry_and_invalidate(self):
+        resolver = StubResolver({'ss.test': ['127.0.0.1']})
+        dns_cache = DNSCache(ttl=0, resolver=resolver)
+        dns_cache.resolve('ss.test', 8388)
+        dns_cache.resolve('ss.test', 8388)
+        self.assertEqual(resolver.n_lookups, 2)
+
+        dns_cache = DNSCache(resolver=resolver)
+        dns_cache.resolve('ss.test', 8388)
+        dns_cache.invalidate('ss.test', 8388)
+        dns_cache.resolve('ss.test', 8388)
+        self.assertEqual(resolver.n_lookups, 4)
+
+    def test_failure_not_cached(self):
+        resolver = StubResolver({})
+        dns_cache = DNSCache(resolver=resolver)
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                dns_cache.resolve('missing.test', 8388)
+        self.assertEqual(resolver.n_lookups, 2)
+
+    def test_lru(self):
+        resolver = StubResolver({'a.test': ['127.0.0.1'], 'b.test': ['127.0.0.2'], 'c.test': ['127.0.0.3']})
+        dns_cache = DNSCache(max_size=2, resolver=resolver)
+        for host in ('a.test', 'b.test', 'a.test', 'c.test', 'a.test'):
+            dns_cache.resolve(host, 80)
+        # b.test was evicted, a.test stayed cached.
+        self.assertEqual(resolver.n_lookups, 3)
+        dns_cache.resolve('b.test', 80)
+        self.assertEqual(resolver.n_lookups, 4)
+
+
+class TestHappyEyeballs(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+
+        # Connects to a listener with a full backlog hang like to a dead address.
+        self.black_hole = socket.socket()
+        self.black_hole.bind(('127.0.0.1', 0))
+        self.black_hole.listen(0)
+        self.black_hole_port = self.black_hole.getsockname()[1]
+        self.black_hole_fill = [socket.create_connection(('127.0.0.1', self.black_hole_port))]
+
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.closed_port = closed.getsockname()[1]
+        closed.close()
+
+    def tearDown(self):
+        for sock in [self.server, self.black_hole] + self.black_hole_fill: sock.close()
+
+    def test_interleave_families(self):
+        addresses = [addrinfo('::1', 1, socket.AF_INET6), addrinfo('::2', 1, socket.AF_INET6),
+                     addrinfo('::3', 1, socket.AF_INET6), addrinfo('127.0.0.1', 1), addrinfo('127.0.0.2', 1)]
+        self.assertEqual([address[4][0] for address in interleave_families(addresses)],
+                         ['::1', '127.0.0.1', '::2', '127.0.0.2', '::3'])
+
+    def test_slow_address_is_raced(self):
+        start_time = time.monotonic()
+        sock = happy_eyeballs_connect([addrinfo('127.0.0.1', self.black_hole_port),
+                                       addrinfo('127.0.0.1', self.port)],
+                                      timeout=5, attempt_delay=0.1)
+        elapsed = time.monotonic() - start_time
+        try:
+            self.assertEqual(sock.getpeername()[1], self.port)
+            self.assertTrue(sock.getblocking())
+            self.assertGreaterEqual(elapsed, 0.1)
+            self.assertLess(elapsed, 1)
+        finally:
+            sock.close()
+
+    def test_refused_address_skipped_without_delay(self):
+        start_time = time.monotonic()
+        sock = happy_eyeballs_connect([addrinfo('127.0.0.1', self.closed_port),
+                                       addrinfo('127.0.0.1', self.port)],
+                                      timeout=5, attempt_delay=2)
+        try:
+            self.assertEqual(sock.getpeername()[1], self.port)
+            self.assertLess(time.monotonic() - start_time, 1)
+        finally:
+            sock.close()
+
+    def test_all_failed(self):
+        with self.assertRaises(ConnectionRefusedError):
+            happy_eyeballs_connect([addrinfo('127.0.0.1', self.closed_port)], timeout=5)
+        with self.assertRaises(socket.timeout):
+            happy_eyeballs_connect([addrinfo('127.0.0.1', self.black_hole_port)], timeout=0.2)
+
+
+class TestConnectionResolution(unittest.TestCase):
+    def test_connections_share_resolution(self):
+        server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        resolver = StubResolver({'ss.test': ['127.0.0.1']})
+        dns_cache = DNSCache(resolver=resolver)
+        try:
+            for _ in range(2):
+                connection = Connection('ss.test', server.port, 'password', 'AEAD_AES_128_GCM',
+                                        'example.com', 80, dns_cache=dns_cache)
+                connection.settimeout(5)
+                connection.send(b'hello')
+                self.assertEqual(connection.recv(5), b'hello')
+                connection.close()
+            self.assertEqual(resolver.n_lookups, 1)
+        finally:
+            server.close()
+
+
+@unittest.skipUnless(hasattr(socket, 'MSG_FASTOPEN'), 'TCP Fast Open is not supported')
+class TestFastOpenFallback(unittest.TestCase):
+    def setUp(self):
+        self.server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+
+        self.black_hole = socket.socket()
+        self.black_hole.bind(('127.0.0.1', 0))
+        self.black_hole.listen(0)
+        self.black_hole_fill = [socket.create_connection(self.black_hole.getsockname())]
+
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.closed_port = closed.getsockname()[1]
+        closed.close()
+
+    def tearDown(self):
+        for sock in [self.black_hole] + self.black_hole_fill: sock.close()
+        self.server.close()
+
+    def _echo(self, ports):
+        # Every name resolves to `ports` on loopback, in order.
+        dns_cache = DNSCache(resolver=lambda host, port, type=0: [addrinfo('127.0.0.1', port) for port in ports])
+        connection = Connection('ss.test', 8388, 'password', 'AEAD_AES_128_GCM',
+                                'example.com', 80, fast_open=True, dns_cache=dns_cache)
+        try:
+            connection.settimeout(5)
+            connection.send(b'hello')
+            self.assertEqual(connection.recv(5), b'hello')
+        finally:
+            connection.close()
+        return dns_cache
+
+    def test_refused_first_address(self):
+        dns_cache = self._echo([self.closed_port, self.server.port])
+        self.assertEqual(dns_cache.stats()['size'], 1)
+
+    def test_unresponsive_first_address(self):
+        start_time = time.monotonic()
+        self._echo([self.black_hole.getsockname()[1], self.server.port])
+        self.assertLess(time.monotonic() - start_time, 2)
+
+    def test_delayed_accept(self):
+        # The server accepts only after 0.4s, a SYN retransmitted after that gets in.
+        def accept_later():
+            time.sleep(0.4)
+            self.black_hole.accept()[0].close()
+            client, _ = self.black_hole.accept()
+            self.server._handle(client)
+
+        threading.Thread(target=accept_later, daemon=True).start()
+        dns_cache = DNSCache(resolver=lambda host, port, type=0: [addrinfo('127.0.0.1', self.black_hole.getsockname()[1])])
+        connection = Connection('ss.test', 8388, 'password', 'AEAD_AES_128_GCM',
+                                'example.com', 80, fast_open=True, dns_cache=dns_cache)
+        try:
+            fast_open_socket = connection.connection
+            connection.settimeout(5)
+            connection.send(b'hello')
+            self.assertEqual(connection.recv(5), b'hello')
+            # Accepted as the Fast Open attempt, not abandoned for a second connect.
+            self.assertIs(connection.connection, fast_open_socket)
+        finally:
+            connection.close()
+
+    def test_all_failed(self):
+        dns_cache = DNSCache(resolver=lambda host, port, type=0: [addrinfo('127.0.0.1', self.closed_port)])
+        connection = Connection('ss.test', 8388, 'password', 'AEAD_AES_128_GCM',
+                                'example.com', 80, fast_open=True, dns_cache=dns_cache)
+        try:
+            with self.assertRaises(ConnectionRefusedError):
+                connection.send(b'hello')
+        finally:
+            connection.close()
+        # Resolved again by the next connection.
+        self.assertEqual(dns_cache.stats()['size'], 0)
@@ -0,0 +1,58 @@
+import asyncio
+import struct
+import unittest
+
+from shadowsocks.local import LocalServer
+
+from .loopback import LoopbackEchoServer
+
+
+class TestLocalServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.ss_server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        self.local_server = LocalServer(self.ss_server.addr, self.ss_server.port,
+                                        'password', 'AEAD_AES_128_GCM',
+                                        listen_port=0)
+        await self.local_server.start()
+
+    async def asyncTearDown(self):
+        self.local_server.close()
+        self.ss_server.close()
+
+    async def _socks5_request(self, command: int, address: bytes):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.local_server.listen_port)
+        writer.write(b'\x05\x01\x00')
+        self.assertEqual(await reader.readexactly(2), b'\x05\x00')
+
+        writer.write(bytes((0x05, command, 0x00)) + address)
+        reply = await reader.readexactly(10)
+        return reader, writer, reply[1]
+
+    async def test_connect_and_relay(self):
+        address = b'\x03\x0bexample.com' + struct.pack('!H', 443)
+        reader, writer, reply = await self._socks5_request(0x01, address)
+        self.assertEqual(reply, 0x00)
+
+        data = bytes(range(256)) * 1000
+        writer.write(data)
+        self.assertEqual(await asyncio.wait_for(reader.readexactly(len(data)), 5), data)
+
+        writer.write_eof()
+        self.assertEqual(await asyncio.wait_for(reader.read(), 5), b'')
+        writer.close()
+
+        self.assertEqual(self.ss_server.received_addresses, [address])
+        self.assertEqual(self.local_server.uplink_bytes, len(data))
+        self.assertEqual(self.local_server.downlink_bytes, len(data))
+
+    async def test_command_not_supported(self):
+        # BIND
+        reader, writer, reply = await self._socks5_request(0x02, b'\x01\x00\x00\x00\x00\x00\x00')
+        self.assertEqual(reply, 0x07)
+        writer.close()
+
+    async def test_no_acceptable_method(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.local_server.listen_port)
+        writer.write(b'\x05\x01\x02')
+        self.assertEqual(await reader.readexactly(2), b'\x05\xff')
+        writer.close()
@@ -0,0 +1,110 @@
+import json
+import socket
+import threading
+import unittest
+import urllib.request
+
+from shadowsocks.connection.Connection import Connection
+from shadowsocks.utils.MetricsServer import MetricsServer
+from shadowsocks.utils.PerfCounters import PerfRegistry, to_prometheus
+
+from .loopback import LoopbackEchoServer
+
+
+class TestPerfRegistry(unittest.TestCase):
+    def test_aggregation(self):
+        registry = PerfRegistry()
+        first, second = registry.new_counters(), registry.new_counters()
+        first.uplink_bytes, second.uplink_bytes = 10, 20
+        first.recv_buffer_high_water, second.recv_buffer_high_water = 100, 50
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['uplink_bytes'], 30)
+        self.assertEqual(snapshot['recv_buffer_high_water'], 100)
+        self.assertEqual(snapshot['open_connections'], 2)
+
+        registry.retire(first)
+        registry.retire(first)
+        del first
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['uplink_bytes'], 30)
+        self.assertEqual((snapshot['open_connections'], snapshot['closed_connections']), (1, 1))
+
+    def test_sources(self):
+        registry = PerfRegistry()
+        registry.register_source('local', lambda: {'n_active_clients': 3})
+        self.assertEqual(registry.snapshot()['local_n_active_clients'], 3)
+        registry.unregister_source('local')
+        self.assertNotIn('local_n_active_clients', registry.snapshot())
+
+    def test_prometheus(self):
+        text = to_prometheus({'uplink_bytes': 5, 'crypto_ns': 1500000000, 'open_connections': 1})
+        self.assertIn('# TYPE shadowsocks_uplink_bytes_total counter\nshadowsocks_uplink_bytes_total 5\n', text)
+        self.assertIn('shadowsocks_crypto_seconds_total 1.5\n', text)
+        self.assertIn('# TYPE shadowsocks_open_connections gauge\n', text)
+
+
+class TestConnectionCounters(unittest.TestCase):
+    def test_echo(self):
+        server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        connection = Connection(server.addr, server.port, 'password', 'AEAD_AES_128_GCM',
+                                'example.com', 80)
+        connection.settimeout(5)
+        try:
+            data = b'x' * 40000
+            connection.send(data)
+            received = b''
+            while len(received) < len(data): received += connection.recv(len(data))
+
+            perf = connection.perf
+            self.assertEqual((perf.uplink_bytes, perf.downlink_bytes), (len(data), len(data)))
+            self.assertEqual(perf.uplink_chunks, 3)
+            self.assertEqual(perf.downlink_chunks, 3)
+            self.assertEqual(perf.handshakes, 1)
+            self.assertGreater(perf.handshake_ns, 0)
+            self.assertGreater(perf.crypto_ns, 0)
+            self.assertGreaterEqual(perf.send_syscalls, 3)
+            self.assertGreater(perf.recv_syscalls, 0)
+            self.assertGreater(perf.decrypted_buffer_high_water, 0)
+        finally:
+            connection.close()
+            server.close()
+
+    def test_mac_failure(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+
+        def serve():
+            client, _ = listener.accept()
+            client.sendall(b'\x00' * 128)
+            client.recv(1024)
+            client.close()
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+
+        connection = Connection(*listener.getsockname(), 'password', 'AEAD_AES_128_GCM', 'example.com', 80)
+        connection.settimeout(5)
+        try:
+            self.assertRaises(ValueError, connection.recv, 10)
+            self.assertEqual(connection.perf.mac_failures, 1)
+        finally:
+            connection.close()
+            listener.close()
+
+
+class TestMetricsServer(unittest.TestCase):
+    def test_endpoints(self):
+        registry = PerfRegistry()
+        counters = registry.new_counters()
+        counters.downlink_bytes = 7
+        metrics_server = MetricsServer('127.0.0.1', 0, registry)
+        metrics_server.start()
+        base_url = f'http://127.0.0.1:{metrics_server.listen_port}'
+        try:
+            with urllib.request.urlopen(base_url + '/metrics.json', timeout=5) as response:
+                self.assertEqual(json.load(response)['downlink_bytes'], 7)
+            with urllib.request.urlopen(base_url + '/metrics', timeout=5) as response:
+                self.assertIn(b'shadowsocks_downlink_bytes_total 7', response.read())
+        finally:
+            metrics_server.close()
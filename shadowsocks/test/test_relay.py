@@ -0,0 +1,92 @@
+import socket
+import threading
+import unittest
+
+from shadowsocks.connection.Connection import Connection
+from shadowsocks.connection.relay import relay, RelayStats
+
+from .loopback import LoopbackEchoServer
+
+
+class TestRelay(unittest.TestCase):
+    def setUp(self):
+        self.server = LoopbackEchoServer('password', 'AEAD_CHACHA20_POLY1305')
+        self.connection = Connection(self.server.addr, self.server.port,
+                                     'password', 'AEAD_CHACHA20_POLY1305',
+                                     'example.com', 80)
+        self.app_sock, self.local_sock = socket.socketpair()
+        self.app_sock.settimeout(5)
+
+    def tearDown(self):
+        self.app_sock.close()
+        self.local_sock.close()
+        self.connection.close()
+        self.server.close()
+
+    def _run_relay(self, **kwargs) -> threading.Thread:
+        self.result = None
+        def target():
+            self.result = relay(self.local_sock, self.connection, **kwargs)
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return thread
+
+    def _recv_all(self) -> bytes:
+        received = bytearray()
+        while True:
+            data = self.app_sock.recv(65536)
+            if not data: return bytes(received)
+            received += data
+
+    def test_echo_with_half_close(self):
+        data = bytes(range(256)) * 4000
+        thread = self._run_relay()
+
+        # Write everything before reading, the relay must not deadlock on full buffers.
+        sender = threading.Thread(target=lambda: (self.app_sock.sendall(data), 
+                                                  self.app_sock.shutdown(socket.SHUT_WR)))
+        sender.start()
+        self.assertEqual(self._recv_all(), data)
+        sender.join(5)
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        assert self.result is not None
+        self.assertEqual((self.result.uplink_bytes, self.result.downlink_bytes), (len(data), len(data)))
+        self.assertEqual(self.server.received_addresses, [b'\x03\x0bexample.com\x00\x50'])
+
+    def test_lazy_connect(self):
+        self.connection.close()
+        self.connection = Connection(self.server.addr, self.server.port,
+                                     'password', 'AEAD_CHACHA20_POLY1305',
+                                     'example.com', 80, lazy_connect=True)
+        self.app_sock.sendall(b'hello')
+        thread = self._run_relay()
+        self.assertEqual(self.app_sock.recv(5), b'hello')
+        # The handshake went out with the first data.
+        self.assertEqual(self.connection.perf.send_syscalls, 1)
+
+        self.app_sock.shutdown(socket.SHUT_WR)
+        self.assertEqual(self._recv_all(), b'')
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_small_buffer(self):
+        data = b'x' * 100000
+        thread = self._run_relay(buffer_size=1000)
+        self.app_sock.sendall(data)
+        self.app_sock.shutdown(socket.SHUT_WR)
+        self.assertEqual(self._recv_all(), data)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_idle_timeout(self):
+        stats = RelayStats()
+        self.app_sock.sendall(b'hello')
+        with self.assertRaises(socket.timeout):
+            relay(self.local_sock, self.connection, idle_timeout=0.2, stats=stats)
+        self.assertEqual(stats.uplink_bytes, 5)
+        self.assertEqual(stats.downlink_bytes, 5)
+        self.assertEqual(self.app_sock.recv(5), b'hello')
+        # Timeouts are restored.
+        self.assertIsNone(self.local_sock.gettimeout())
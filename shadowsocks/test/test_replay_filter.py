@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import pickle
+import unittest
+
+from shadowsocks.utils.ReplayFilter import ReplayFilter, bloom_parameters
+
+
+def add_salts(replay_filter, salts, results):
+    results.put([replay_filter.add(salt) for salt in salts])
+
+
+class TestReplayFilter(unittest.TestCase):
+    def test_add_and_contains(self):
+        replay_filter = ReplayFilter(capacity=100)
+        salt = os.urandom(32)
+        self.assertNotIn(salt, replay_filter)
+        self.assertFalse(replay_filter.add(salt))
+        self.assertIn(salt, replay_filter)
+        self.assertTrue(replay_filter.add(salt))
+
+    def test_rotation(self):
+        # A tiny false positive budget keeps the random salts below from ever colliding.
+        replay_filter = ReplayFilter(capacity=10, false_positive_rate=1e-12)
+        salts = [os.urandom(32) for _ in range(25)]
+        for salt in salts: self.assertFalse(replay_filter.add(salt))
+
+        self.assertEqual(replay_filter.n_rotations, 2)
+        # At least the last `capacity` salts are remembered, the first ones are forgotten.
+        for salt in salts[-10:]: self.assertIn(salt, replay_filter)
+        self.assertEqual(sum(salt in replay_filter for salt in salts[:10]), 0)
+
+    def test_fixed_memory(self):
+        replay_filter = ReplayFilter(capacity=1000)
+        memory_bytes = replay_filter.memory_bytes
+        for _ in range(5000): replay_filter.add(os.urandom(32))
+        self.assertEqual(replay_filter.memory_bytes, memory_bytes)
+        self.assertEqual(replay_filter.stats()['replay_filter_bytes'], memory_bytes)
+
+    def test_false_positive_rate(self):
+        replay_filter = ReplayFilter(capacity=20000, false_positive_rate=1e-3)
+        for _ in range(2 * replay_filter.capacity - 1): replay_filter.add(os.urandom(32))
+        # Both filters full, 20000 lookups expect 20 false positives.
+        false_positives = sum(os.urandom(32) in replay_filter for _ in range(20000))
+        self.assertLess(false_positives, 60)
+
+    def test_false_positive_rate_small_filters(self):
+        # Small filters leave few bit positions, they should still meet the target.
+        false_positives = 0
+        for _ in range(200):
+            replay_filter = ReplayFilter(capacity=10, false_positive_rate=1e-2)
+            for _ in range(2 * replay_filter.capacity - 1): replay_filter.add(os.urandom(32))
+            false_positives += sum(os.urandom(32) in replay_filter for _ in range(100))
+        # 20000 lookups expect at most 200 false positives.
+        self.assertLess(false_positives, 300)
+
+    def test_bloom_parameters(self):
+        # 1e6 items at 1e-6: about 28.8 bits per item and 20 hashes.
+        n_bits, n_hashes = bloom_parameters(1000000, 1e-6)
+        self.assertAlmostEqual(n_bits / 1e6, 28.76, places=1)
+        self.assertEqual(n_hashes, 20)
+
+        with self.assertRaises(ValueError): ReplayFilter(capacity=0)
+        with self.assertRaises(ValueError): ReplayFilter(false_positive_rate=1)
+
+    def test_shared(self):
+        replay_filter = ReplayFilter(capacity=10, false_positive_rate=1e-12, shared=True)
+        try:
+            seen = os.urandom(32)
+            replay_filter.add(seen)
+            salts = [seen] + [os.urandom(32) for _ in range(14)]
+
+            # Started like the workers of `WorkerSupervisor`.
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target=add_salts, args=(replay_filter, salts, results))
+            process.start()
+            self.assertEqual(results.get(timeout=30), [True] + [False] * 14)
+            process.join(5)
+
+            # Salts and rotations of the other process are seen here.
+            for salt in salts[-10:]: self.assertIn(salt, replay_filter)
+            self.assertEqual(replay_filter.n_rotations, 1)
+            self.assertEqual(replay_filter.stats()['replay_filter_salts'], 5)
+        finally:
+            replay_filter.close()
+
+        with self.assertRaises(TypeError): pickle.dumps(ReplayFilter(capacity=10))
@@ -0,0 +1,70 @@
+import socket
+import unittest
+
+from shadowsocks.utils.RingBuffer import RingBuffer
+
+from . import test_byte_buffer
+
+
+class TestUtilsRingBuffer(unittest.TestCase):
+    def test_RingBuffer_basic(self):
+        operations = [
+            ('write', (b'12345', )),
+            ('read', (3, )),
+            ('write', (b'6789abc', )),
+            ('as_bytes', (9, )),
+        ]
+        self.assertTrue(self._run_testcase(operations))
+
+    def test_RingBuffer_large_data(self):
+        operations = [
+            ('write', (b'1' * (1000000), )),
+            ('read', (700000, )),
+            ('write', (b'2' * (1000000), )),
+            ('as_bytes', (10000, )),
+        ]
+        self.assertTrue(self._run_testcase(operations))
+
+    def test_RingBuffer_compact_in_place(self):
+        buffer = RingBuffer(16)
+        storage = buffer._buffer
+
+        buffer.write(b'0123456789')
+        buffer.consume(8)
+        buffer.write(b'abcdefghij')
+
+        self.assertIs(buffer._buffer, storage)
+        self.assertEqual(buffer.as_bytes(), b'89abcdefghij')
+
+    def test_RingBuffer_peek_is_view(self):
+        buffer = RingBuffer()
+        buffer.write(b'abcdef')
+        view = buffer.peek(3)
+
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(bytes(view), b'abc')
+        self.assertEqual(len(buffer), 6)
+
+    def test_RingBuffer_recv_into(self):
+        sock_a, sock_b = socket.socketpair()
+        try:
+            buffer = RingBuffer(4)
+            sock_a.sendall(b'hello world')
+            sock_a.close()
+
+            while buffer.recv_into(sock_b, 4): pass
+            self.assertEqual(buffer.read(100), b'hello world')
+            self.assertFalse(buffer)
+        finally:
+            sock_b.close()
+
+    @classmethod
+    def _run_testcase(cls, operations):
+        answer = test_byte_buffer.TestUtilsByteBuffer._simulate(operations)
+        
+        buffer = RingBuffer()
+        return_value = []
+        for operation, args in operations:
+            return_value.append(getattr(buffer, operation)(*args))
+        
+        return return_value == answer
@@ -0,0 +1,203 @@
+import asyncio
+import os
+import socket
+import unittest
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.connection.AsyncConnection import open_connection
+from shadowsocks.message.AEAD import AEAD_AddressMessage
+from shadowsocks.server import Server
+from shadowsocks.utils.socks_addr import SOCKS5_ADDR_TYPE, to_socks5_addr
+
+from .loopback import EchoServer
+
+CIPHER_NAME = 'AEAD_CHACHA20_IETF_POLY1305'
+
+
+class TestAddressMessage(unittest.TestCase):
+    def test_roundtrip(self):
+        params = supported_cipher_parameters[CIPHER_NAME]
+        salt = b's' * params.salt_size
+        uplink = params.cipher(params)
+        uplink.init_key('password', salt)
+        downlink = params.cipher(params)
+        downlink.init_key('password', salt)
+
+        message = AEAD_AddressMessage(params, SOCKS5_ADDR_TYPE.DOMAIN, 'example.com', 443)
+        message.encrypt(uplink)
+        encrypted = message.serialize_encrypted() + b'next'
+
+        self.assertEqual(AEAD_AddressMessage.try_load(downlink, params, encrypted[:10]), (None, 0))
+        loaded, n_consumed_bytes = AEAD_AddressMessage.try_load(downlink, params, encrypted)
+        assert loaded is not None
+        self.assertEqual(n_consumed_bytes, len(encrypted) - 4)
+
+        loaded.decrypt(downlink)
+        self.assertEqual((loaded.addr_type, loaded.host, loaded.port, loaded.initial_payload),
+                         (SOCKS5_ADDR_TYPE.DOMAIN, 'example.com', 443, b''))
+
+    def test_decrypt_payload(self):
+        params = supported_cipher_parameters[CIPHER_NAME]
+        salt = b's' * params.salt_size
+        uplink = params.cipher(params)
+        uplink.init_key('password', salt)
+        downlink = params.cipher(params)
+        downlink.init_key('password', salt)
+
+        encrypted = uplink.encrypt_chunk(to_socks5_addr(SOCKS5_ADDR_TYPE.IPV4, '127.0.0.1', 80) + b'hello')
+        size_segment = encrypted[:2 + params.tag_size]
+        self.assertEqual(downlink.decrypt_chunk_size(size_segment), len(encrypted) - len(size_segment) - params.tag_size)
+        downlink.increase_nonce()
+
+        message = AEAD_AddressMessage(params)
+        message.decrypt_payload(downlink, encrypted[len(size_segment):])
+        self.assertEqual((message.addr_type, message.host, message.port, message.initial_payload),
+                         (SOCKS5_ADDR_TYPE.IPV4, '127.0.0.1', 80, b'hello'))
+
+        # The next chunk decrypts with the following nonces.
+        self.assertEqual(downlink.decrypt_chunk(uplink.encrypt_chunk(b'next')), b'next')
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.target = EchoServer()
+        self.server = Server('password', CIPHER_NAME, '127.0.0.1', 0,
+                             max_connections=2, handshake_timeout=0.5)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.target.close()
+
+    async def _open(self, password: str = 'password'):
+        return await open_connection('127.0.0.1', self.server.listen_port, password, CIPHER_NAME,
+                                     self.target.addr, self.target.port)
+
+    async def test_echo(self):
+        data = bytes(range(256)) * 1000
+        connection = await self._open()
+        connection.send(data)
+        await connection.drain()
+        self.assertEqual(await asyncio.wait_for(connection.readexactly(len(data)), 5), data)
+
+        connection.write_eof()
+        self.assertEqual(await asyncio.wait_for(connection.recv(1), 5), b'')
+        connection.close()
+
+        self.assertEqual(self.server.uplink_bytes, len(data))
+        self.assertEqual(self.server.downlink_bytes, len(data))
+
+    async def test_payload_in_address_chunk(self):
+        params = supported_cipher_parameters[CIPHER_NAME]
+        salt = os.urandom(params.salt_size)
+        cipher = params.cipher(params)
+        cipher.init_key('password', salt)
+        address = to_socks5_addr(SOCKS5_ADDR_TYPE.IPV4, self.target.addr, self.target.port)
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.listen_port)
+        writer.write(salt + cipher.encrypt_chunk(address + b'hello'))
+
+        response = await asyncio.wait_for(reader.readexactly(params.salt_size + 2 + 5 + 2 * params.tag_size), 5)
+        downlink = params.cipher(params)
+        downlink.init_key('password', response[:params.salt_size])
+        self.assertEqual(downlink.decrypt_chunk(response[params.salt_size:]), b'hello')
+        writer.close()
+
+    async def test_replayed_salt(self):
+        params = supported_cipher_parameters[CIPHER_NAME]
+        salt = os.urandom(params.salt_size)
+        cipher = params.cipher(params)
+        cipher.init_key('password', salt)
+        request = salt + cipher.encrypt_chunk(to_socks5_addr(SOCKS5_ADDR_TYPE.IPV4, self.target.addr,
+                                                             self.target.port) + b'hello')
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.listen_port)
+        writer.write(request)
+        response = await asyncio.wait_for(reader.readexactly(params.salt_size + 2 + 5 + 2 * params.tag_size), 5)
+        writer.close()
+
+        # A recorded request, and the server's own salt reflected back.
+        downlink = params.cipher(params)
+        downlink.init_key('password', response[:params.salt_size])
+        reflected = response[:params.salt_size] + downlink.encrypt_chunk(request[params.salt_size:])
+        for replay in (request, reflected):
+            reader, writer = await asyncio.open_connection('127.0.0.1', self.server.listen_port)
+            writer.write(replay)
+            self.assertEqual(await asyncio.wait_for(reader.read(), 5), b'')
+            writer.close()
+
+        self.assertEqual(self.server.n_replayed_salts, 2)
+        self.assertEqual(self.server.n_failed_handshakes, 2)
+
+    async def test_users(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = Server(None, CIPHER_NAME, '127.0.0.1', 0,
+                             users={'alice': 'password', 'bob': 'other'}, handshake_timeout=0.5)
+        await self.server.start()
+
+        for password in ('other', 'other', 'password'):
+            connection = await self._open(password)
+            connection.send(b'ping')
+            self.assertEqual(await asyncio.wait_for(connection.readexactly(4), 5), b'ping')
+            connection.close()
+
+        connection = await self._open('unknown')
+        connection.send(b'ping')
+        self.assertEqual(await asyncio.wait_for(connection.recv(4), 5), b'')
+        connection.close()
+
+        stats = self.server.stats()
+        self.assertEqual((stats['n_identified_users'], stats['n_unknown_users']), (3, 1))
+        # The second connection is bob again, from the same client.
+        self.assertEqual(stats['n_client_user_hits'], 1)
+
+    async def test_wrong_password(self):
+        connection = await self._open('other')
+        connection.send(b'hello')
+        await connection.drain()
+
+        # The server keeps reading until the handshake timeout, then closes.
+        self.assertEqual(await asyncio.wait_for(connection.recv(5), 5), b'')
+        self.assertEqual(self.server.n_failed_handshakes, 1)
+        connection.close()
+
+    async def test_connect_failure(self):
+        closed_port = socket.socket()
+        closed_port.bind(('127.0.0.1', 0))
+        port = closed_port.getsockname()[1]
+        closed_port.close()
+
+        connection = await open_connection('127.0.0.1', self.server.listen_port, 'password', CIPHER_NAME,
+                                           '127.0.0.1', port)
+        self.assertEqual(await asyncio.wait_for(connection.recv(5), 5), b'')
+        self.assertEqual(self.server.n_failed_connects, 1)
+        connection.close()
+
+    async def test_max_connections(self):
+        connections = [await self._open() for _ in range(3)]
+        for connection in connections[:2]:
+            connection.send(b'ping')
+            self.assertEqual(await asyncio.wait_for(connection.readexactly(4), 5), b'ping')
+
+        # Closed with unread data or before the handshake was written, which may surface as a reset or broken pipe.
+        try:
+            self.assertEqual(await asyncio.wait_for(connections[2].recv(4), 5), b'')
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        self.assertEqual(self.server.n_rejected_clients, 1)
+        for connection in connections: connection.close()
+
+    async def test_idle_timeout(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = Server('password', CIPHER_NAME, '127.0.0.1', 0, idle_timeout=0.2)
+        await self.server.start()
+
+        connection = await self._open()
+        connection.send(b'ping')
+        self.assertEqual(await asyncio.wait_for(connection.readexactly(4), 5), b'ping')
+        self.assertEqual(await asyncio.wait_for(connection.recv(4), 5), b'')
+        self.assertEqual(self.server.stats()['n_active_clients'], 0)
+        connection.close()
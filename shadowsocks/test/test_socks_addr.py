@@ -1,3 +1,4 @@
+import ipaddress
 import unittest
 
 from shadowsocks.utils import socks_addr
@@ -46,4 +47,48 @@ class TestUtilsSocksAddr(unittest.TestCase):
         self.assertEqual(
             socks_addr.determine_addr_type('1.2.3.4.5.6'),
             socks_addr.SOCKS5_ADDR_TYPE.UNKNOWN
-        )
\ No newline at end of file
+        )
+
+    def test_from_socks5_addr(self):
+        for addr_type, ip_or_domain, port in [
+            (socks_addr.SOCKS5_ADDR_TYPE.IPV4, '123.45.67.89', 12345),
+            (socks_addr.SOCKS5_ADDR_TYPE.DOMAIN, 'example.com', 123),
+            (socks_addr.SOCKS5_ADDR_TYPE.IPV6, '2001:db8::1', 256),
+        ]:
+            addr = socks_addr.to_socks5_addr(addr_type, ip_or_domain, port)
+            self.assertEqual(
+                socks_addr.from_socks5_addr(addr + b'payload'),
+                (addr_type, ip_or_domain, port, len(addr))
+            )
+
+    def test_from_socks5_addr_invalid(self):
+        for data in [b'', b'\x01\x01\x02', b'\x03\x0bexample', b'\x05\x00\x00']:
+            with self.assertRaises(ValueError):
+                socks_addr.from_socks5_addr(data)
+
+    def test_encode_address(self):
+        for host, port in [('123.45.67.89', 12345), ('example.com', 123), ('2001:db8::1', 256)]:
+            addr_type = socks_addr.determine_addr_type(host)
+            self.assertEqual(socks_addr.encode_address(host, port),
+                             socks_addr.to_socks5_addr(addr_type, host, port))
+
+    def test_encode_typed_address(self):
+        self.assertEqual(socks_addr.encode_address(ipaddress.ip_address('123.45.67.89'), 12345), b'\x01{-CY09')
+        self.assertEqual(socks_addr.encode_address(ipaddress.ip_address('::1'), 1),
+                         b'\x04' + b'\x00' * 15 + b'\x01\x00\x01')
+        self.assertEqual(socks_addr.encode_address(b'example.com', 123), b'\x03\x0bexample.com\x00{')
+
+    def test_encode_other_names_as_domain(self):
+        self.assertEqual(socks_addr.encode_address('localhost', 80), b'\x03\x09localhost\x00\x50')
+        self.assertEqual(socks_addr.encode_address('bücher.de', 80), b'\x03\x10xn--bcher-kva.de\x00\x50')
+
+    def test_encode_invalid(self):
+        with self.assertRaises(ValueError):
+            socks_addr.encode_address('a' * 256, 80)
+        with self.assertRaises(ValueError):
+            socks_addr.encode_address('example.com', 0x10000)
+
+    def test_encode_address_cache(self):
+        socks_addr.encode_address.cache_clear()
+        for _ in range(3): socks_addr.encode_address('example.com', 443)
+        self.assertEqual(socks_addr.encode_address_stats(), {'hits': 2, 'misses': 1, 'size': 1, 'hit_rate': 2 / 3})
@@ -0,0 +1,161 @@
+import ssl
+import tempfile
+import time
+import unittest
+
+from typing import Optional
+
+from shadowsocks.connection.Connection import Connection
+from shadowsocks.connection.SSL_Connection import SSL_Connection
+from shadowsocks.connection.TLS_SessionCache import TLS_SessionCache
+
+from .loopback import EchoServer, LoopbackRelayServer, TLS_HOSTNAME, create_tls_contexts
+
+
+class TestSSLConnection(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory() as directory:
+            tls_contexts = create_tls_contexts(directory)
+        if tls_contexts is None:
+            raise unittest.SkipTest('cryptography is required to create a test certificate')
+        server_context, cls.client_context = tls_contexts
+
+        cls.target = EchoServer(server_context)
+        cls.server = LoopbackRelayServer('password', 'AEAD_AES_128_GCM')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+        cls.target.close()
+
+    def setUp(self):
+        self.connection = Connection(self.server.addr, self.server.port, 'password', 'AEAD_AES_128_GCM',
+                                     self.target.addr, self.target.port)
+        self.ssl_connection = SSL_Connection(self.connection, TLS_HOSTNAME, self.client_context)
+
+    def tearDown(self):
+        self.ssl_connection.close()
+
+    def test_echo(self):
+        self.ssl_connection.send(b'hello')
+        self.assertEqual(self.ssl_connection.recv(100, timeout=5), b'hello')
+
+    def test_recv_returns_all_available(self):
+        data = bytes(range(256)) * 256
+        self.ssl_connection.send(data)
+
+        # Wait until everything arrived, then one call returns every record.
+        time.sleep(0.2)
+        self.assertEqual(self.ssl_connection.recv(len(data), timeout=5), data)
+
+    def test_non_blocking(self):
+        self.assertEqual(self.ssl_connection.recv(100, timeout=0), b'')
+
+    def test_timeout_does_not_spin(self):
+        start_cpu_time = time.process_time()
+        start_time = time.monotonic()
+        self.assertEqual(self.ssl_connection.recv(100, timeout=0.5), b'')
+
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.5)
+        # A busy-waiting reader would consume about 0.5s of CPU time.
+        self.assertLess(time.process_time() - start_cpu_time, 0.2)
+
+    def test_eof(self):
+        # Send close_notify, the target then closes and the tunnel reaches EOF.
+        self.ssl_connection._ssl_io_wrapper(5, self.ssl_connection.ssl_object.unwrap)
+        self.assertEqual(self.ssl_connection.recv(100, timeout=5), b'')
+        self.assertTrue(self.ssl_connection.eof)
+
+
+class TestTLSSessionCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory() as directory:
+            tls_contexts = create_tls_contexts(directory)
+        if tls_contexts is None:
+            raise unittest.SkipTest('cryptography is required to create a test certificate')
+        server_context, cls.client_context = tls_contexts
+
+        cls.target = EchoServer(server_context)
+        cls.server = LoopbackRelayServer('password', 'AEAD_AES_128_GCM')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+        cls.target.close()
+
+    def _echo(self, session_cache: TLS_SessionCache, ssl_context: Optional[ssl.SSLContext] = None) -> SSL_Connection:
+        connection = Connection(self.server.addr, self.server.port, 'password', 'AEAD_AES_128_GCM',
+                                self.target.addr, self.target.port)
+        ssl_connection = SSL_Connection(connection, TLS_HOSTNAME, ssl_context, session_cache)
+        ssl_connection.send(b'hello')
+        self.assertEqual(ssl_connection.recv(100, timeout=5), b'hello')
+        ssl_connection.close()
+        return ssl_connection
+
+    def test_resumption(self):
+        session_cache = TLS_SessionCache()
+
+        self.assertFalse(self._echo(session_cache, self.client_context).session_reused)
+        self.assertEqual(len(session_cache), 1)
+        self.assertTrue(self._echo(session_cache, self.client_context).session_reused)
+        self.assertEqual(session_cache.stats(), {'size': 1, 'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_resumption_default_context(self):
+        session_cache = TLS_SessionCache()
+        # Trust the test certificate in the context connections without one share.
+        for ca_cert in self.client_context.get_ca_certs(binary_form=True):
+            session_cache.default_context.load_verify_locations(cadata=ca_cert)
+
+        self.assertFalse(self._echo(session_cache).session_reused)
+        self.assertTrue(self._echo(session_cache).session_reused)
+
+    def test_other_context_misses(self):
+        session_cache = TLS_SessionCache()
+        self._echo(session_cache, self.client_context)
+
+        self.assertIsNone(session_cache.get(TLS_HOSTNAME, ssl.create_default_context()))
+        self.assertIsNotNone(session_cache.get(TLS_HOSTNAME, self.client_context))
+
+
+class FakeSession:
+    def __init__(self, timeout: int = 7200):
+        self.time = int(time.time())
+        self.timeout = timeout
+
+
+class TestTLSSessionCacheEviction(unittest.TestCase):
+    def setUp(self):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+
+    def test_lru(self):
+        session_cache = TLS_SessionCache(max_size=2)
+        sessions = [FakeSession() for _ in range(3)]
+        session_cache.put('a', self.context, sessions[0])
+        session_cache.put('b', self.context, sessions[1])
+        session_cache.get('a', self.context)
+        session_cache.put('c', self.context, sessions[2])
+
+        self.assertIs(session_cache.get('a', self.context), sessions[0])
+        self.assertIsNone(session_cache.get('b', self.context))
+        self.assertIs(session_cache.get('c', self.context), sessions[2])
+        self.assertEqual(session_cache.evictions, 1)
+
+    def test_expiry(self):
+        session_cache = TLS_SessionCache(ttl=0)
+        session_cache.put('a', self.context, FakeSession())
+        self.assertIsNone(session_cache.get('a', self.context))
+
+        # The lifetime announced by the server bounds the TTL.
+        session_cache = TLS_SessionCache(ttl=3600)
+        session_cache.put('a', self.context, FakeSession(timeout=0))
+        self.assertIsNone(session_cache.get('a', self.context))
+        self.assertEqual(len(session_cache), 0)
+        self.assertEqual(session_cache.evictions, 1)
+
+    def test_discard(self):
+        session_cache = TLS_SessionCache()
+        session_cache.put('a', self.context, FakeSession())
+        session_cache.discard('a')
+        self.assertIsNone(session_cache.get('a', self.context))
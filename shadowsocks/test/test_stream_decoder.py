@@ -0,0 +1,86 @@
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.message.AEAD import AEAD_StreamDecoder, DECODER_STATE
+from shadowsocks.utils.RingBuffer import RingBuffer
+
+
+class TestAEADStreamDecoder(unittest.TestCase):
+    def setUp(self):
+        self.cipher_parameters = supported_cipher_parameters['AEAD_AES_128_GCM']
+        self.salt = b's' * self.cipher_parameters.salt_size
+        self.chunks = [b'hello', b'', b'x' * self.cipher_parameters.chunk_size, b'world']
+
+        encrypt_cipher = self.cipher_parameters.cipher(self.cipher_parameters)
+        encrypt_cipher.init_key('password', self.salt)
+        self.stream = self.salt + b''.join(encrypt_cipher.encrypt_chunk(chunk) 
+                                           for chunk in self.chunks)
+
+        self.cipher = self.cipher_parameters.cipher(self.cipher_parameters)
+        self.decoder = AEAD_StreamDecoder(self.cipher_parameters, self.cipher, 'password')
+
+    def test_decode_whole_stream(self):
+        buffer = RingBuffer()
+        buffer.write(self.stream)
+
+        self.assertEqual(self.decoder.decode_all(buffer), self.chunks)
+        self.assertEqual(self.decoder.salt, self.salt)
+        self.assertFalse(buffer)
+
+    def test_decode_byte_by_byte_decrypts_once(self):
+        n_decrypt = 0
+        original_decrypt = self.cipher._decrypt
+        def counting_decrypt(data):
+            nonlocal n_decrypt
+            n_decrypt += 1
+            return original_decrypt(data)
+        self.cipher._decrypt = counting_decrypt
+
+        buffer = RingBuffer()
+        decoded = []
+        for i in range(len(self.stream)):
+            buffer.write(self.stream[i: i + 1])
+            decoded += self.decoder.decode_all(buffer)
+
+        self.assertEqual(decoded, self.chunks)
+        self.assertEqual(n_decrypt, 2 * len(self.chunks))
+        self.assertEqual(self.decoder.state, DECODER_STATE.AWAITING_LENGTH)
+
+    def test_decode_parallel(self):
+        buffer = RingBuffer()
+        decoded = []
+        with ThreadPoolExecutor(4) as executor:
+            # Split inside the large chunk to leave a pending payload between calls.
+            buffer.write(self.stream[:10000])
+            decoded += self.decoder.decode_all(buffer, executor)
+            self.assertEqual(self.decoder.state, DECODER_STATE.AWAITING_PAYLOAD)
+            buffer.write(self.stream[10000:])
+            decoded += self.decoder.decode_all(buffer, executor)
+
+        self.assertEqual(decoded, self.chunks)
+        self.assertFalse(buffer)
+
+    def test_encrypt_parallel(self):
+        cipher = self.cipher_parameters.cipher(self.cipher_parameters)
+        cipher.init_key('password', self.salt)
+        data = b''.join(self.chunks)
+        
+        output = bytearray(cipher.encrypted_size(len(data)))
+        with ThreadPoolExecutor(4) as executor:
+            cipher.encrypt_into(data, memoryview(output), executor)
+
+        buffer = RingBuffer()
+        buffer.write(self.salt + output)
+        self.assertEqual(b''.join(self.decoder.decode_all(buffer)), data)
+        self.assertEqual(cipher.nonce, self.decoder.cipher.nonce)
+
+    def test_tampered_stream(self):
+        stream = bytearray(self.stream)
+        stream[-1] ^= 0xff
+
+        buffer = RingBuffer()
+        buffer.write(stream)
+        with self.assertRaises(ValueError):
+            self.decoder.decode_all(buffer)
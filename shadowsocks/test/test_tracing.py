@@ -0,0 +1,58 @@
+import unittest
+
+from shadowsocks.connection.Connection import Connection
+from shadowsocks.utils.Tracing import Span, Tracer, TraceReporter, set_tracer
+
+from .loopback import LoopbackEchoServer
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        self.spans = []
+        set_tracer(Tracer(self.spans.append, sample_rate=2))
+
+    def tearDown(self):
+        set_tracer(None)
+        self.server.close()
+
+    def _echo(self) -> Connection:
+        connection = Connection(self.server.addr, self.server.port,
+                                'password', 'AEAD_AES_128_GCM', 'example.com', 80)
+        connection.settimeout(5)
+        connection.send(b'hello')
+        received = b''
+        while len(received) < 5: received += connection.recv(5)
+        connection.close()
+        return connection
+
+    def test_sampling(self):
+        traced, untraced = self._echo(), self._echo()
+
+        self.assertIsNotNone(traced.tracer)
+        self.assertIsNone(untraced.tracer)
+        # Methods of connections which are not sampled are left untouched.
+        self.assertNotIn('_recv', vars(untraced))
+        self.assertNotIn('init_key', vars(untraced.downlink_cipher))
+
+        self.assertEqual({span.trace_id for span in self.spans}, {traced.trace_id})
+        self.assertEqual({span.stage for span in self.spans},
+                         {'init_socket', 'init_key', 'send_message', 'send', 'recv', 'encrypt', 'decrypt'})
+        self.assertTrue(all(span.duration_ns >= 0 for span in self.spans))
+
+
+class TestTraceReporter(unittest.TestCase):
+    def test_report(self):
+        reporter = TraceReporter(max_samples=10)
+        for duration in range(1, 101):
+            reporter(Span('recv', 1, 0, duration * 1000))
+        reporter(Span('encrypt', 1, 0, 50000))
+
+        report = reporter.report()
+        self.assertEqual(list(report), ['recv', 'encrypt'])
+        self.assertEqual(report['recv']['count'], 100)
+        self.assertAlmostEqual(report['recv']['total_ms'], 5.05)
+        self.assertAlmostEqual(report['recv']['share'] + report['encrypt']['share'], 1)
+        self.assertEqual(len(reporter._samples['recv']), 10)
+        self.assertEqual(report['encrypt']['p99_us'], 50)
+        self.assertIn('encrypt', reporter.format())
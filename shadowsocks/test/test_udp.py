@@ -0,0 +1,145 @@
+import asyncio
+import socket
+import struct
+import sys
+import unittest
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.connection.UDP_Association import UDP_Association
+from shadowsocks.local import LocalServer
+from shadowsocks.message.AEAD import AEAD_UDP_Codec
+
+from .loopback import LoopbackUDPEchoServer
+
+
+class TestUDPCodec(unittest.TestCase):
+    def test_roundtrip(self):
+        for cipher_name, params in supported_cipher_parameters.items():
+            with self.subTest(cipher_name=cipher_name):
+                codec = AEAD_UDP_Codec(params, 'password')
+                packet = codec.encrypt((b'\x01\x7f\x00\x00\x01\x00\x35', b'data'))
+
+                self.assertEqual(len(packet), params.salt_size + 11 + params.tag_size)
+                self.assertEqual(codec.decrypt(packet), b'\x01\x7f\x00\x00\x01\x00\x35data')
+
+    def test_fresh_salt_per_packet(self):
+        codec = AEAD_UDP_Codec(supported_cipher_parameters['AEAD_AES_128_GCM'], 'password')
+        self.assertNotEqual(codec.encrypt((b'data', )), codec.encrypt((b'data', )))
+
+    def test_tampered(self):
+        codec = AEAD_UDP_Codec(supported_cipher_parameters['AEAD_CHACHA20_POLY1305'], 'password')
+        packet = bytearray(codec.encrypt((b'data', )))
+        packet[-1] ^= 1
+        self.assertRaises(ValueError, codec.decrypt, bytes(packet))
+        self.assertRaises(ValueError, codec.decrypt, b'short')
+
+    def test_wrong_password(self):
+        params = supported_cipher_parameters['AEAD_AES_256_GCM']
+        packet = AEAD_UDP_Codec(params, 'password').encrypt((b'data', ))
+        self.assertRaises(ValueError, AEAD_UDP_Codec(params, 'other').decrypt, packet)
+
+
+class TestUDPAssociation(unittest.TestCase):
+    def setUp(self):
+        self.ss_server = LoopbackUDPEchoServer('password', 'AEAD_AES_128_GCM')
+        self.association = UDP_Association(self.ss_server.addr, self.ss_server.port,
+                                           'password', 'AEAD_AES_128_GCM')
+        self.association.settimeout(5)
+
+    def tearDown(self):
+        self.association.close()
+        self.ss_server.close()
+
+    def test_echo(self):
+        for address in [('8.8.8.8', 53), ('example.com', 443), ('::1', 8080)]:
+            self.association.sendto(b'hello', address)
+            self.assertEqual(self.association.recvfrom(), (b'hello', address))
+
+    def test_drop_invalid(self):
+        # A packet from the server which fails authentication is skipped.
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server_socket.sendto(b'\x00' * 64, self.association.connection.getsockname())
+        server_socket.close()
+
+        self.association.sendto(b'hello', ('8.8.8.8', 53))
+        self.assertEqual(self.association.recvfrom(), (b'hello', ('8.8.8.8', 53)))
+
+
+@unittest.skipIf(sys.platform == 'win32', 'UDP_Relay needs add_reader, missing from the default Windows event loop')
+class TestLocalUDPAssociate(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.ss_server = LoopbackUDPEchoServer('password', 'AEAD_AES_128_GCM')
+        self.local_server = LocalServer(self.ss_server.addr, self.ss_server.port,
+                                        'password', 'AEAD_AES_128_GCM',
+                                        listen_port=0)
+        await self.local_server.start()
+
+    async def asyncTearDown(self):
+        self.local_server.close()
+        self.ss_server.close()
+
+    async def test_udp_associate(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.local_server.listen_port)
+        writer.write(b'\x05\x01\x00')
+        self.assertEqual(await reader.readexactly(2), b'\x05\x00')
+        writer.write(b'\x05\x03\x00\x01\x00\x00\x00\x00\x00\x00')
+
+        reply = await reader.readexactly(10)
+        self.assertEqual(reply[1], 0x00)
+        relay_port, = struct.unpack('!H', reply[8:])
+
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.setblocking(False)
+        client.connect(('127.0.0.1', relay_port))
+        loop = asyncio.get_running_loop()
+
+        address = b'\x01\x08\x08\x08\x08' + struct.pack('!H', 53)
+        # Fragmented datagrams are dropped.
+        client.send(b'\x00\x00\x01' + address + b'fragment')
+        for i in range(10):
+            client.send(b'\x00\x00\x00' + address + b'query%d' % i)
+
+        replies = set()
+        for _ in range(10):
+            replies.add(await asyncio.wait_for(loop.sock_recv(client, 65535), 5))
+        self.assertEqual(replies, {b'\x00\x00\x00' + address + b'query%d' % i for i in range(10)})
+
+        stats = self.local_server.stats()
+        self.assertEqual(stats['udp_associations'], 1)
+        self.assertEqual(stats['udp_uplink_packets'], 10)
+        self.assertEqual(stats['udp_dropped_packets'], 1)
+
+        client.close()
+        writer.close()
+
+
+class _LoopWithoutReaders(asyncio.SelectorEventLoop):
+    '''Lacks readiness callbacks like the proactor event loop of Windows.'''
+
+    def add_reader(self, fd, callback, *args):
+        raise NotImplementedError()
+
+
+class TestLocalUDPAssociateUnsupported(unittest.TestCase):
+    def test_command_not_supported(self):
+        async def associate():
+            local_server = LocalServer('127.0.0.1', 8388, 'password', 'AEAD_AES_128_GCM', listen_port=0)
+            await local_server.start()
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', local_server.listen_port)
+                writer.write(b'\x05\x01\x00' + b'\x05\x03\x00\x01\x00\x00\x00\x00\x00\x00')
+                self.assertEqual(await reader.readexactly(2), b'\x05\x00')
+                reply = await asyncio.wait_for(reader.readexactly(10), 5)
+                writer.close()
+                return reply
+            finally:
+                local_server.close()
+
+        loop = _LoopWithoutReaders()
+        try:
+            with self.assertLogs('shadowsocks.local', 'WARNING'):
+                reply = loop.run_until_complete(associate())
+        finally:
+            loop.close()
+        # Command not supported.
+        self.assertEqual(reply[1], 0x07)
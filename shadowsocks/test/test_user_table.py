@@ -0,0 +1,101 @@
+import asyncio
+import os
+import unittest
+
+from shadowsocks.cipher.CipherParamerters import supported_cipher_parameters
+from shadowsocks.utils.UserTable import UserTable
+
+CIPHER_NAME = 'AEAD_AES_128_GCM'
+
+
+class TestUserTable(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.params = supported_cipher_parameters[CIPHER_NAME]
+        self.users = UserTable({f'user{i}': f'password{i}' for i in range(100)}, self.params)
+        self.cipher = self.params.cipher(self.params)
+
+    def _first_chunk(self, password: str):
+        salt = os.urandom(self.params.salt_size)
+        cipher = self.params.cipher(self.params)
+        cipher.init_key(password, salt)
+        return salt, cipher.encrypt_chunk(b'hello')[:2 + self.params.tag_size]
+
+    async def test_identify(self):
+        salt, header = self._first_chunk('password42')
+        self.assertEqual(await self.users.identify(self.cipher, salt, header), ('user42', 5))
+        self.assertEqual(self.users.n_trials, 43)
+        # The cipher is left keyed for the user.
+        self.assertEqual(self.cipher.decrypt_chunk_size(header), 5)
+
+    async def test_unknown_user(self):
+        salt, header = self._first_chunk('other')
+        with self.assertRaises(ValueError):
+            await self.users.identify(self.cipher, salt, header, '10.0.0.1')
+        self.assertEqual(self.users.stats()['n_unknown_users'], 1)
+        self.assertEqual(self.users.n_trials, 100)
+
+    async def test_most_recent_first(self):
+        await self.users.identify(self.cipher, *self._first_chunk('password99'))
+        trials = self.users.n_trials
+        await self.users.identify(self.cipher, *self._first_chunk('password99'))
+        self.assertEqual(self.users.n_trials - trials, 1)
+
+    async def test_client_user(self):
+        await self.users.identify(self.cipher, *self._first_chunk('password70'), '10.0.0.1')
+        await self.users.identify(self.cipher, *self._first_chunk('password80'), '10.0.0.2')
+
+        # user80 is the most recent, but user70 is tried first for its client.
+        trials = self.users.n_trials
+        self.assertEqual((await self.users.identify(self.cipher, *self._first_chunk('password70'), '10.0.0.1'))[0], 'user70')
+        self.assertEqual(self.users.n_trials - trials, 1)
+        self.assertEqual(self.users.n_client_hits, 1)
+
+        # The client switched user: its previous one is tried once, then the others.
+        trials = self.users.n_trials
+        self.assertEqual((await self.users.identify(self.cipher, *self._first_chunk('password80'), '10.0.0.1'))[0], 'user80')
+        self.assertEqual(self.users.n_trials - trials, 2)
+
+    async def test_max_clients(self):
+        users = UserTable({'a': 'password0', 'b': 'password1'}, self.params, max_clients=2)
+        for client_addr in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            await users.identify(self.cipher, *self._first_chunk('password1'), client_addr)
+
+        # 10.0.0.1 was forgotten and `a` became the most recent user.
+        await users.identify(self.cipher, *self._first_chunk('password0'))
+        trials = users.n_trials
+        await users.identify(self.cipher, *self._first_chunk('password1'), '10.0.0.1')
+        self.assertEqual(users.n_trials - trials, 2)
+
+    async def test_yields_between_batches(self):
+        salt, header = self._first_chunk('other')
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.ensure_future(tick())
+        await asyncio.sleep(0)
+        with self.assertRaises(ValueError):
+            await self.users.identify(self.cipher, salt, header)
+        ticker.cancel()
+        # 100 users make two batches.
+        self.assertEqual(ticks, 2)
+
+    async def test_throttle_unknown_clients(self):
+        users = UserTable({'a': 'password0'}, self.params, max_unknown=2, unknown_window=0.2)
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                await users.identify(self.cipher, *self._first_chunk('other'), '10.0.0.1')
+        self.assertEqual(users.n_trials, 2)
+
+        # Refused without trials, even with a valid key, until the window ends.
+        with self.assertRaises(ValueError):
+            await users.identify(self.cipher, *self._first_chunk('password0'), '10.0.0.1')
+        self.assertEqual((users.n_trials, users.stats()['n_throttled_clients']), (2, 1))
+        self.assertEqual((await users.identify(self.cipher, *self._first_chunk('password0'), '10.0.0.2'))[0], 'a')
+
+        await asyncio.sleep(0.2)
+        self.assertEqual((await users.identify(self.cipher, *self._first_chunk('password0'), '10.0.0.1'))[0], 'a')
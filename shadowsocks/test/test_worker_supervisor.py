@@ -0,0 +1,96 @@
+import argparse
+import functools
+import os
+import signal
+import socket
+import time
+import unittest
+
+from shadowsocks import local
+from shadowsocks.utils.WorkerSupervisor import (WorkerSupervisor, create_listen_socket, 
+                                                reuse_port_supported, run_worker)
+
+from .loopback import LoopbackEchoServer
+
+
+def pid_worker(worker_id, listen_addr, listen_port, listen_socket, stats_queue):
+    '''Reply own pid to every client.'''
+    if listen_socket is None:
+        listen_socket = create_listen_socket(listen_addr, listen_port, reuse_port=True)
+        listen_socket.listen(16)
+
+    n_clients = 0
+    stats_queue.put((worker_id, {'n_clients': n_clients, 'n_running': 1}))
+    while True:
+        client, _ = listen_socket.accept()
+        client.sendall(str(os.getpid()).encode())
+        client.close()
+        n_clients += 1
+        stats_queue.put((worker_id, {'n_clients': n_clients, 'n_running': 1}))
+
+
+class TestWorkerSupervisor(unittest.TestCase):
+    def _request_pid(self, port):
+        with socket.create_connection(('127.0.0.1', port), timeout=5) as client:
+            return int(client.recv(32))
+
+    def _wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline: time.sleep(0.05)
+
+    def _run_supervisor(self, reuse_port):
+        supervisor = WorkerSupervisor(pid_worker, 2, '127.0.0.1', 0, 
+                                      reuse_port=reuse_port, restart_delay=0, gauges=('n_running', ))
+        supervisor.start()
+        try:
+            # With SO_REUSEPORT, connections fail until a worker binds.
+            self._wait_for(lambda: all(process.is_alive() for process in supervisor._processes.values()))
+            time.sleep(0.2)
+
+            pids = {self._request_pid(supervisor.listen_port) for _ in range(10)}
+            worker_pids = {process.pid for process in supervisor._processes.values()}
+            self.assertTrue(pids <= worker_pids)
+
+            self._wait_for(lambda: supervisor.stats().get('n_clients') == 10)
+            self.assertEqual(supervisor.stats()['n_clients'], 10)
+
+            os.kill(supervisor._processes[0].pid, signal.SIGKILL)
+            supervisor.supervise(timeout=1)
+            self.assertEqual(supervisor.stats()['n_restarts'], 1)
+            self.assertEqual(supervisor.stats()['n_workers'], 2)
+            # Counters of the killed worker are kept, its gauges are not.
+            self.assertEqual(supervisor.stats()['n_clients'], 10)
+            self._wait_for(lambda: 0 in supervisor._worker_stats)
+            self.assertEqual(supervisor.stats()['n_running'], 2)
+        finally:
+            supervisor.stop()
+
+    @unittest.skipUnless(reuse_port_supported(), 'SO_REUSEPORT not supported')
+    def test_reuse_port(self):
+        self._run_supervisor(reuse_port=True)
+
+    @unittest.skipUnless(hasattr(signal, 'SIGKILL'), 'SIGKILL not supported')
+    def test_shared_socket(self):
+        self._run_supervisor(reuse_port=False)
+
+    def test_local_workers(self):
+        ss_server = LoopbackEchoServer('password', 'AEAD_AES_128_GCM')
+        options = argparse.Namespace(server=ss_server.addr, server_port=ss_server.port,
+                                     password='password', method='AEAD_AES_128_GCM', backend=None)
+        supervisor = WorkerSupervisor(functools.partial(run_worker, functools.partial(local._new_server, options)), 
+                                      2, '127.0.0.1', 0)
+        supervisor.start()
+        try:
+            time.sleep(0.5)
+            with socket.create_connection(('127.0.0.1', supervisor.listen_port), timeout=5) as client:
+                client.sendall(b'\x05\x01\x00' + b'\x05\x01\x00\x03\x0bexample.com\x00\x50')
+                self.assertEqual(client.recv(2), b'\x05\x00')
+                self.assertEqual(client.recv(10)[1], 0x00)
+                client.sendall(b'hello')
+                self.assertEqual(client.recv(5), b'hello')
+
+            self._wait_for(lambda: supervisor.stats().get('uplink_bytes') == 5)
+            self.assertEqual(supervisor.stats()['uplink_bytes'], 5)
+        finally:
+            supervisor.stop()
+            ss_server.close()